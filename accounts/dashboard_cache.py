@@ -0,0 +1,163 @@
+"""
+Cached dashboard data with versioned keys.
+
+The data behind student_dashboard, teacher_dashboard_view and
+classroom_detail is cached through Django's cache framework under keys made
+of the version numbers of the "scopes" it depends on:
+
+  student:<user id>          the student's submissions and their feedback
+  cohort:<branch>:<batch>    assignments of the classrooms a student is in
+  classroom:<classroom id>   assignments, submission counts and jobs of a classroom
+  teacher:<user id>          the teacher's classrooms
+
+Saving or deleting a model bumps the versions of the scopes it touches (the
+receivers below), so stale entries are simply never read again and expire
+on their own. Bumps run on commit, so a reader cannot re-cache the old data
+under the new version while the write is still in flight. Writes that skip
+signals (bulk_create / bulk_update) call bump_for_submissions themselves.
+
+Hit and miss counts per dashboard are kept in `stats` (exported at /metrics
+as dashboard_cache_requests_total), and every cached response carries an
+X-Dashboard-Cache header.
+"""
+import time
+from collections import Counter
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from accounts.models import Classroom
+from assignments.metrics import register_collector
+from assignments.models import Assignment, GradingJob, QuestionFeedback, StudentSubmission
+
+stats = Counter()
+
+
+def _collect_stats():
+    samples = []
+    for key, value in sorted(stats.items()):
+        name, _, result = key.rpartition("_")
+        samples.append(({"dashboard": name, "result": result}, value))
+    return [("dashboard_cache_requests_total", "counter", "Dashboard cache lookups by dashboard and result.", samples)]
+
+
+register_collector(_collect_stats)
+
+
+def student_scope(user_id):
+    return f"student:{user_id}"
+
+
+def cohort_scope(branch, batch):
+    return f"cohort:{quote(branch)}:{batch}"
+
+
+def classroom_scope(classroom_id):
+    return f"classroom:{classroom_id}"
+
+
+def teacher_scope(user_id):
+    return f"teacher:{user_id}"
+
+
+def _version_key(scope):
+    return f"dashboard:version:{scope}"
+
+
+def get_versions(scopes):
+    """Current version of every scope; a scope seen for the first time gets a fresh one."""
+    keys = {scope: _version_key(scope) for scope in scopes}
+    found = cache.get_many(keys.values())
+    versions = {}
+    for scope, key in keys.items():
+        if key not in found:
+            # Start from the clock rather than 1, so a version key that was
+            # evicted can never point back at entries written before.
+            cache.add(key, time.time_ns(), timeout=None)
+            found[key] = cache.get(key)
+        versions[scope] = found[key]
+    return versions
+
+
+def bump(*scopes):
+    """Invalidate everything cached under `scopes`, once the current transaction commits."""
+    def run():
+        for scope in scopes:
+            key = _version_key(scope)
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, time.time_ns(), timeout=None)
+    transaction.on_commit(run)
+
+
+def bump_for_submissions(submissions):
+    """Invalidate the dashboards showing `submissions`, for writes that send no signals."""
+    scopes = set()
+    for submission in submissions:
+        scopes.add(student_scope(submission.student_id))
+        scopes.add(classroom_scope(submission.assignment.classroom_id))
+    bump(*scopes)
+
+
+def cached(name, scopes, build, timeout=None):
+    """
+    Return `build()` from the cache, keyed on `name` and the versions of
+    `scopes`, building and storing it on a miss. `timeout` may be a function
+    of the built value, for data that goes stale with the clock. Returns
+    (value, hit).
+    """
+    ttl = settings.DASHBOARD_CACHE_TTL
+    if not ttl:
+        stats[f"{name}_miss"] += 1
+        return build(), False
+
+    versions = get_versions(scopes)
+    key = f"dashboard:{name}:" + ":".join(f"{scope}={versions[scope]}" for scope in scopes)
+    value = cache.get(key)
+    if value is not None:
+        stats[f"{name}_hit"] += 1
+        return value, True
+
+    stats[f"{name}_miss"] += 1
+    value = build()
+    seconds = ttl if timeout is None else min(ttl, timeout(value))
+    if seconds > 0:
+        cache.set(key, value, seconds)
+    return value, False
+
+
+# ───────────────────────────────────────────────
+# Invalidation
+# ───────────────────────────────────────────────
+@receiver([post_save, post_delete], sender=Classroom)
+def _classroom_changed(sender, instance, **kwargs):
+    bump(teacher_scope(instance.teacher_id), classroom_scope(instance.pk),
+         cohort_scope(instance.branch, instance.batch))
+
+
+@receiver([post_save, post_delete], sender=Assignment)
+def _assignment_changed(sender, instance, **kwargs):
+    classroom = instance.classroom
+    bump(classroom_scope(classroom.pk), cohort_scope(classroom.branch, classroom.batch))
+
+
+@receiver([post_save, post_delete], sender=StudentSubmission)
+def _submission_changed(sender, instance, **kwargs):
+    bump_for_submissions([instance])
+
+
+# Feedback rows and jobs are only deleted along with their submission or
+# assignment, which bumps the same scopes.
+@receiver(post_save, sender=QuestionFeedback)
+def _feedback_changed(sender, instance, **kwargs):
+    bump(student_scope(instance.submission.student_id))
+
+
+@receiver(post_save, sender=GradingJob)
+def _grading_job_changed(sender, instance, **kwargs):
+    bump(classroom_scope(instance.assignment.classroom_id))
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='classroom',
+            index=models.Index(fields=['branch', 'batch'], name='accounts_cl_branch_e63028_idx'),
+        ),
+    ]
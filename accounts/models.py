@@ -85,6 +85,9 @@ class Classroom(models.Model):
     branch = models.CharField(max_length=50)
     batch = models.IntegerField()
 
+    class Meta:
+        indexes = [models.Index(fields=['branch', 'batch'])]
+
     def __str__(self):
         return f"{self.subject_code} - {self.subject_name}"
     
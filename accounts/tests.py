@@ -1,3 +1,223 @@
-from django.test import TestCase
+from datetime import timedelta
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils.timezone import now
+
+from accounts import dashboard_cache
+from accounts.models import Classroom, CustomUser, Student
+from assignments.models import Assignment, GradingJob, QuestionFeedback, StudentSubmission
+from assignments.utils import save_question_results
+
+LOCMEM_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+@override_settings(DASHBOARD_CACHE_TTL=0)
+class StudentDashboardTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        teacher = CustomUser.objects.create(username="teacher", user_type="teacher")
+        cls.classroom = Classroom.objects.create(
+            teacher=teacher, name="DS", subject_name="Data Structures",
+            subject_code="CS201", branch="CSE", batch=2025,
+        )
+        cls.user = CustomUser.objects.create(username="student", user_type="student")
+        Student.objects.create(
+            user=cls.user, roll_no="21CS001", first_name="Test", last_name="Student",
+            batch_year=2025, branch="CSE", college_email="student@example.com",
+        )
+        cls.teacher = teacher
+
+    def add_assignments(self, count):
+        """`count` each of open, submitted and graded assignments."""
+        for n in range(count):
+            Assignment.objects.create(
+                title=f"Open {n}", classroom=self.classroom, teacher=self.teacher,
+                question_file="q.pdf", question_solution_file="s.pdf",
+                deadline=now() + timedelta(days=7),
+            )
+            for graded in (False, True):
+                assignment = Assignment.objects.create(
+                    title=f"{'Graded' if graded else 'Submitted'} {n}", classroom=self.classroom,
+                    teacher=self.teacher, question_file="q.pdf", question_solution_file="s.pdf",
+                    deadline=now() + timedelta(days=7), total_marks=4,
+                )
+                submission = StudentSubmission.objects.create(
+                    assignment=assignment, student=self.user, submitted_file="sub.pdf",
+                    graded=graded, grade=3.5 if graded else 0,
+                )
+                if graded:
+                    QuestionFeedback.objects.bulk_create([
+                        QuestionFeedback(submission=submission, question_number="Q1",
+                                         max_marks=2, obtained_marks=2, feedback="Good"),
+                        QuestionFeedback(submission=submission, question_number="Q2",
+                                         max_marks=2, obtained_marks=1.5, feedback="Partial"),
+                    ])
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def get_dashboard(self):
+        return self.client.get(reverse("accounts:student_dashboard"))
+
+    def test_query_count_does_not_grow_with_submissions(self):
+        # session, user, student profile, assignments, submissions, feedback rows
+        self.add_assignments(1)
+        with self.assertNumQueries(6):
+            self.get_dashboard()
+
+        self.add_assignments(10)
+        with self.assertNumQueries(6):
+            response = self.get_dashboard()
+
+        self.assertEqual(len(response.context["pending_assignments"]), 11)
+        self.assertEqual(len(response.context["submitted_assignments"]), 11)
+        self.assertEqual(len(response.context["graded_assignments"]), 11)
+
+    def test_buckets_and_totals(self):
+        self.add_assignments(1)
+        Assignment.objects.create(
+            title="Closed", classroom=self.classroom, teacher=self.teacher,
+            question_file="q.pdf", question_solution_file="s.pdf", deadline=now() - timedelta(days=1),
+        )
+        response = self.get_dashboard()
+
+        self.assertEqual([a.title for a in response.context["pending_assignments"]], ["Open 0"])
+        graded = response.context["graded_assignments"]
+        self.assertEqual([s.assignment.title for s in graded], ["Graded 0"])
+        self.assertEqual(graded[0].total_obtained, 3.5)
+        self.assertContains(response, "Partial")
+
+
+@override_settings(DASHBOARD_CACHE_TTL=0)
+class ClassroomDetailTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = CustomUser.objects.create(username="teacher", user_type="teacher")
+        cls.classroom = Classroom.objects.create(
+            teacher=cls.teacher, name="DS", subject_name="Data Structures",
+            subject_code="CS201", branch="CSE", batch=2025,
+        )
+        cls.students = [CustomUser.objects.create(username=f"student{n}") for n in range(4)]
+
+    def setUp(self):
+        self.client.force_login(self.teacher)
+
+    def add_assignment(self, title, graded, ungraded):
+        assignment = Assignment.objects.create(
+            title=title, classroom=self.classroom, teacher=self.teacher,
+            question_file="q.pdf", question_solution_file="s.pdf", deadline=now(),
+        )
+        StudentSubmission.objects.bulk_create(
+            StudentSubmission(assignment=assignment, student=student, submitted_file="sub.pdf",
+                              graded=n < graded)
+            for n, student in enumerate(self.students[:graded + ungraded])
+        )
+        return assignment
+
+    def get_detail(self):
+        return self.client.get(reverse("accounts:classroom_detail", args=[self.classroom.pk]))
+
+    def test_counts_and_sections_in_bounded_queries(self):
+        self.add_assignment("Empty", graded=0, ungraded=0)
+        self.add_assignment("Waiting", graded=0, ungraded=3)
+        self.add_assignment("Partly graded", graded=1, ungraded=2)
+
+        # session, user, classroom, annotated assignments
+        with self.assertNumQueries(4):
+            response = self.get_detail()
+
+        counts = {
+            a.title: (a.submitted_count, a.graded_count, a.pending_count)
+            for a in response.context["all_assignments"]
+        }
+        self.assertEqual(counts, {"Empty": (0, 0, 0), "Waiting": (3, 0, 3), "Partly graded": (3, 1, 2)})
+        self.assertEqual([a.title for a in response.context["graded_assignments"]], ["Partly graded"])
+        self.assertEqual([a.title for a in response.context["pending_grading"]], ["Empty", "Waiting"])
+
+        for n in range(20):
+            self.add_assignment(f"More {n}", graded=2, ungraded=2)
+        with self.assertNumQueries(4):
+            self.get_detail()
+
+
+@override_settings(CACHES=LOCMEM_CACHE, DASHBOARD_CACHE_TTL=300)
+class DashboardCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = CustomUser.objects.create(username="teacher", user_type="teacher")
+        cls.classroom = Classroom.objects.create(
+            teacher=cls.teacher, name="DS", subject_name="Data Structures",
+            subject_code="CS201", branch="CSE", batch=2025,
+        )
+        cls.user = CustomUser.objects.create(username="student", user_type="student")
+        Student.objects.create(
+            user=cls.user, roll_no="21CS001", first_name="Test", last_name="Student",
+            batch_year=2025, branch="CSE", college_email="student@example.com",
+        )
+        cls.assignment = Assignment.objects.create(
+            title="A1", classroom=cls.classroom, teacher=cls.teacher,
+            question_file="q.pdf", question_solution_file="s.pdf",
+            deadline=now() + timedelta(days=7), total_marks=4,
+        )
+        cls.submission = StudentSubmission.objects.create(
+            assignment=cls.assignment, student=cls.user, submitted_file="sub.pdf",
+        )
+
+    def setUp(self):
+        cache.clear()
+        dashboard_cache.stats.clear()
+
+    def get(self, user, url):
+        self.client.force_login(user)
+        return self.client.get(url)
+
+    def test_student_dashboard_is_served_from_cache_until_graded(self):
+        url = reverse("accounts:student_dashboard")
+        self.assertEqual(self.get(self.user, url)["X-Dashboard-Cache"], "miss")
+
+        # session, user, student profile
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertEqual(response["X-Dashboard-Cache"], "hit")
+        self.assertEqual(len(response.context["submitted_assignments"]), 1)
+
+        # Feedback is bulk-upserted; the submission's post_save invalidates on commit.
+        with self.captureOnCommitCallbacks(execute=True):
+            save_question_results(self.submission, [("Q1", 4.0, 3.0, "Good")])
+        response = self.client.get(url)
+        self.assertEqual(response["X-Dashboard-Cache"], "miss")
+        self.assertEqual(response.context["graded_assignments"][0].total_obtained, 3.0)
+
+        self.assertEqual(dashboard_cache.stats["student_hit"], 1)
+        self.assertEqual(dashboard_cache.stats["student_miss"], 2)
+
+    def test_new_assignment_invalidates_the_cohort(self):
+        url = reverse("accounts:student_dashboard")
+        self.get(self.user, url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Assignment.objects.create(
+                title="A2", classroom=self.classroom, teacher=self.teacher,
+                question_file="q.pdf", question_solution_file="s.pdf",
+                deadline=now() + timedelta(days=3),
+            )
+        response = self.client.get(url)
+        self.assertEqual(response["X-Dashboard-Cache"], "miss")
+        self.assertEqual([a.title for a in response.context["pending_assignments"]], ["A2"])
+
+    def test_classroom_detail_invalidated_by_grading_job(self):
+        url = reverse("accounts:classroom_detail", args=[self.classroom.pk])
+        self.get(self.teacher, url)
+        # session, user
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get(url)["X-Dashboard-Cache"], "hit")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            GradingJob.objects.create(assignment=self.assignment)
+        response = self.client.get(url)
+        self.assertEqual(response["X-Dashboard-Cache"], "miss")
+        self.assertTrue(response.context["all_assignments"][0].active_jobs)
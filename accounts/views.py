@@ -2,17 +2,17 @@ from django.contrib.auth import authenticate, login
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.utils.timezone import now
-from django.db.models import Prefetch, Sum
+from django.db.models import Count, Exists, OuterRef, Prefetch, Q
 
 from .forms import RoleLoginForm, AdminSignUpForm, SubjectCreateForm, TeacherSignUpForm,  ClassroomCreateForm 
 from .forms import AdminUpdateForm, StudentSignUpForm, TeacherUpdateForm, StudentUpdateForm
 
 from .models import Subject, Classroom, Teacher
-from assignments.models import Assignment, StudentSubmission
-from assignments.grader import extract_text_from_pdf, parse_question_bank, grade_answer
+from .dashboard_cache import cached, classroom_scope, cohort_scope, student_scope, teacher_scope
+from assignments.models import Assignment, GradingJob, StudentSubmission
+from assignments.pdf_cache import load_question_bank
+from assignments.grading_queue import ACTIVE_STATUSES, enqueue_grading_job
 # from langchain_google_genai.chat_models import ChatGoogleGenerativeAI
-import google.generativeai as genai
-import os
 from assignments.models import Assignment, StudentSubmission, QuestionFeedback
 from assignments.models import Assignment   # or your path
 
@@ -22,8 +22,7 @@ def calculate_total_marks(assignment: Assignment, *, save=False) -> float:
     and optionally store the value on the Assignment.
     """
     try:
-        text   = extract_text_from_pdf(assignment.question_solution_file.path)
-        parsed = parse_question_bank(text)
+        parsed = load_question_bank(assignment.question_solution_file.path)
 
         total_marks = 0
         for q in parsed.values():
@@ -45,10 +44,9 @@ def calculate_total_marks(assignment: Assignment, *, save=False) -> float:
 
 
 from django.contrib.auth.decorators import login_required
-from django.db import transaction
 from django.shortcuts import get_object_or_404, redirect
 
-from assignments.models import Assignment, QuestionFeedback
+from assignments.models import Assignment
 
 
 @login_required
@@ -66,89 +64,13 @@ def grade_all_submissions(request, assignment_id):
         calculate_total_marks(assignment, save=True)
 
     # ───────────────────────────────────────────────────────────────
-    # 1. Parse teacher’s solution once and build a dict.
+    # 1. Queue every ungraded submission; `manage.py run_grading_worker`
+    #    does the actual grading (see assignments/grading_queue.py).
     # ───────────────────────────────────────────────────────────────
-    teacher_text = extract_text_from_pdf(assignment.question_solution_file.path)
-    teacher_data = parse_question_bank(teacher_text)
-
-    API_KEY = os.getenv("GOOGLE_API_KEY")
-    genai.configure(api_key=API_KEY)
-
-    model = genai.GenerativeModel("gemini-2.0-flash")
-
+    enqueue_grading_job(assignment, requested_by=request.user)
 
     # ───────────────────────────────────────────────────────────────
-    # 2. Loop over every ungraded submission.
-    # ───────────────────────────────────────────────────────────────
-    for submission in assignment.submissions.filter(graded=False):
-
-        # Parse the student PDF only once
-        student_text = extract_text_from_pdf(submission.submitted_file.path)
-        student_data = parse_question_bank(student_text)
-
-        # Reset totals for this submission
-        total_obtained = 0.0
-        per_question_results = []   # list of (qid, max_m, got_m, feedback)
-
-        # ───── Grade question by question ─────
-        for qid, q_t in teacher_data.items():
-
-            q_max = 0.0
-            q_got = 0.0
-            q_fb  = []  # feedback lines for this single question
-
-            # ——— With sub-parts ———
-            if q_t["subparts"]:
-                for sub_id, sub_t in q_t["subparts"].items():
-                    t_ans  = sub_t["answer"]
-                    s_ans  = student_data.get(qid, {}).get("subparts", {}).get(sub_id, {}).get("answer", "")
-                    is_mcq = sub_t["marks"] == 1
-
-                    marks_got, fb = grade_answer(t_ans, s_ans, sub_t["marks"], model, is_mcq)
-                    print(marks_got, fb)
-                    q_max += sub_t["marks"]
-                    q_got += marks_got
-                    q_fb.append(f"({sub_id}) {fb}")
-
-            # ——— No sub-parts ———
-            else:
-                t_ans  = q_t["answer"]
-                s_ans  = student_data.get(qid, {}).get("answer", "")
-                marks_got, fb = grade_answer(t_ans, s_ans, q_t["marks"], model)
-                q_max += q_t["marks"]
-                q_got += marks_got
-                q_fb.append(fb)
-
-            per_question_results.append((qid, q_max, q_got, " | ".join(q_fb)))
-            total_obtained += q_got
-
-        # ─────────────────────────────────────────────────────────
-        # 3. Write everything in *one* transaction per submission.
-        # ─────────────────────────────────────────────────────────
-        with transaction.atomic():
-
-            # (a) Per-question rows
-            for qid, q_max, q_got, q_fb in per_question_results:
-                QuestionFeedback.objects.update_or_create(
-                    submission      = submission,
-                    question_number = qid,
-                    defaults        = {
-                        "max_marks":      q_max,
-                        "obtained_marks": q_got,
-                        "feedback":       q_fb,
-                    },
-                )
-
-            # (b) Submission summary
-            submission.feedback = "Overall feedback auto-generated on " + now().strftime("%d %b %Y, %H:%M")
-            submission.graded   = True
-            submission.save(update_fields=["graded", "feedback"])
-
-            # (c) Recompute total (sets submission.grade)
-            submission.recompute_grade()
-
-    # ───────────────────────────────────────────────────────────────
-    # 4. Back to classroom page.
+    # 2. Back to classroom page.
     # ───────────────────────────────────────────────────────────────
     return redirect("accounts:classroom_detail", pk=assignment.classroom.id)
 
@@ -321,27 +243,44 @@ def admin_signup_view(request):
 @login_required
 @user_passes_test(lambda u: u.user_type == 'teacher')
 def classroom_detail(request, pk):
-    classroom = get_object_or_404(Classroom, pk=pk)
+    context, hit = cached('classroom', [classroom_scope(pk)], lambda: _classroom_detail_context(pk))
+    response = render(request, 'classroom_detail.html', context)
+    response['X-Dashboard-Cache'] = 'hit' if hit else 'miss'
+    return response
 
-    all_assignments = Assignment.objects.filter(classroom=classroom)
 
-    graded_assignments = Assignment.objects.filter(
-        classroom=classroom,
-        submissions__graded=True
-    ).distinct()
+def _classroom_detail_context(pk):
+    classroom = get_object_or_404(Classroom, pk=pk)
 
-    pending_grading = Assignment.objects.filter(
-        classroom=classroom
-    ).exclude(
-        submissions__graded=True
-    ).distinct()
+    # One query for every section: per-assignment submission counters from a
+    # single join on submissions, the "grading in progress" flag as an
+    # EXISTS subquery (so it cannot multiply the counted rows) and the stats
+    # row via a one-to-one join.
+    active_jobs = GradingJob.objects.filter(assignment=OuterRef('pk'), status__in=ACTIVE_STATUSES)
+    all_assignments = list(
+        Assignment.objects
+        .filter(classroom=classroom)
+        .select_related('stats')
+        .annotate(
+            submitted_count=Count('submissions'),
+            graded_count=Count('submissions', filter=Q(submissions__graded=True)),
+            active_jobs=Exists(active_jobs),
+        )
+        .order_by('id')
+    )
+    for assignment in all_assignments:
+        assignment.pending_count = assignment.submitted_count - assignment.graded_count
 
-    return render(request, 'classroom_detail.html', {
+    # An assignment counts as graded once any of its submissions is.
+    graded_assignments = [a for a in all_assignments if a.graded_count]
+    pending_grading    = [a for a in all_assignments if not a.graded_count]
+
+    return {
         'classroom': classroom,
         'all_assignments': all_assignments,
         'graded_assignments': graded_assignments,
         'pending_grading': pending_grading,
-    })
+    }
 
 
 
@@ -363,12 +302,17 @@ def teacher_dashboard_view(request):
     else:
         form = ClassroomCreateForm(teacher=teacher)
 
-    classrooms = Classroom.objects.filter(teacher=request.user)
-    return render(request, 'teacher_dashboard.html', {
+    classrooms, hit = cached(
+        'teacher', [teacher_scope(request.user.pk)],
+        lambda: list(Classroom.objects.filter(teacher=request.user)),
+    )
+    response = render(request, 'teacher_dashboard.html', {
         'form': form,
         'classrooms': classrooms,
         'teacher': teacher,
     })
+    response['X-Dashboard-Cache'] = 'hit' if hit else 'miss'
+    return response
 
 def student_signup_view(request):
     if request.method == 'POST':
@@ -388,12 +332,37 @@ def student_dashboard(request):
     branch  = student.branch
     batch   = student.batch_year
 
+    context, hit = cached(
+        "student", [student_scope(request.user.pk), cohort_scope(branch, batch)],
+        lambda: _student_dashboard_context(request.user, branch, batch),
+        timeout=_seconds_to_next_deadline,
+    )
+    response = render(request, "student_dashboard.html", context)
+    response["X-Dashboard-Cache"] = "hit" if hit else "miss"
+    return response
+
+
+def _seconds_to_next_deadline(context):
+    # A cached dashboard must not outlive the next deadline, when that
+    # assignment stops being pending.
+    deadlines = [a.deadline for a in context["pending_assignments"]]
+    if not deadlines:
+        return float("inf")
+    return (min(deadlines) - now()).total_seconds()
+
+
+def _student_dashboard_context(user, branch, batch):
+    # A fixed number of queries however many assignments/submissions there
+    # are: one for the assignments, one for the submissions and one for
+    # their feedback rows. Everything else is split up in Python.
+
     # ────────────────────────────────────────────────────────────────────
-    # 1. All assignments that belong to the student’s classrooms
+    # 1. Open assignments that belong to the student’s classrooms
+    #    (uses the Classroom(branch, batch) / Assignment(classroom, deadline) indexes)
     # ────────────────────────────────────────────────────────────────────
-    all_assignments = (
+    open_assignments = list(
         Assignment.objects
-        .filter(classroom__branch=branch, classroom__batch=batch)
+        .filter(classroom__branch=branch, classroom__batch=batch, deadline__gte=now())
         .order_by("-deadline")
     )
 
@@ -401,11 +370,10 @@ def student_dashboard(request):
     # 2. All submissions by *this* student, with pre-fetched feedback
     #    • select_related grabs the foreign-key objects in the same query
     #    • prefetch_related pulls in every QuestionFeedback row
-    #    • annotate adds total_obtained on the fly
     # ────────────────────────────────────────────────────────────────────
-    submissions_qs = (
+    submissions = list(
         StudentSubmission.objects
-        .filter(student=request.user)
+        .filter(student=user)
         .select_related("assignment", "assignment__classroom")
         .prefetch_related(
             Prefetch(
@@ -413,29 +381,29 @@ def student_dashboard(request):
                 queryset=QuestionFeedback.objects.order_by("question_number")
             )
         )
-        .annotate(total_obtained=Sum("question_feedback__obtained_marks"))
     )
 
-    submitted_ids = submissions_qs.values_list("assignment_id", flat=True)
-
     # ────────────────────────────────────────────────────────────────────
     # 3. Buckets
     # ────────────────────────────────────────────────────────────────────
-    pending_assignments   = all_assignments.exclude(id__in=submitted_ids).filter(deadline__gte=now())
-    submitted_assignments = submissions_qs.filter(graded=False)
-    graded_assignments    = submissions_qs.filter(graded=True)
+    # An upload that could not be read does not count as submitted.
+    submitted_ids         = {s.assignment_id for s in submissions if s.parse_status != "failed"}
+    pending_assignments   = [a for a in open_assignments if a.id not in submitted_ids]
+    submitted_assignments = [s for s in submissions if not s.graded]
+    graded_assignments    = [s for s in submissions if s.graded]
+
+    for submission in graded_assignments:
+        # Summed from the prefetched rows instead of a GROUP BY over the join
+        submission.total_obtained = sum(q.obtained_marks for q in submission.question_feedback.all())
 
     # ────────────────────────────────────────────────────────────────────
-    # 4. Context → template
+    # 4. Context for the template
     # ────────────────────────────────────────────────────────────────────
-    context = {
+    return {
         "pending_assignments":   pending_assignments,
         "submitted_assignments": submitted_assignments,
         "graded_assignments":    graded_assignments,
-        # total_obtained is now a property on every graded submission
-        # so you no longer need a separate total_marks dict
     }
-    return render(request, "student_dashboard.html", context)
 
 
 
@@ -0,0 +1,199 @@
+"""
+Answer-type classifier and local grading.
+
+Each teacher answer (per question or sub-part) is classified once:
+
+  mcq       an option letter: "B", "(b)", "c) Binary search", "Option D"
+  numeric   a number with an optional tolerance and unit: "9.81 m/s^2", "42 ± 0.5"
+  boolean   true / false / yes / no
+  keywords  a short list of terms: "stack, queue, deque"
+  exact     any other objective (1-mark sub-part) answer, compared as text
+  free      everything else
+
+mcq and keywords only apply to short answers worth at most MAX_LOCAL_MARKS:
+multi-mark prose such as "b) because …" or "First, sort the array; then,
+binary search" can look like them but is "free".
+
+Only "free" answers go to the model. The other types, and any blank student
+answer, are graded here in microseconds.
+"""
+import re
+from functools import lru_cache
+
+from django.conf import settings
+
+ANSWER_TYPES = ("mcq", "numeric", "boolean", "keywords", "exact", "free")
+
+# Keyword lists: 2–8 terms of at most three words each.
+MAX_KEYWORDS = 8
+MAX_KEYWORD_WORDS = 3
+
+# Option letters and keyword lists are graded locally only on questions worth
+# at most this many marks, and an option's text is at most a short phrase.
+MAX_LOCAL_MARKS = 3
+MAX_OPTION_WORDS = 6
+
+# Words that make a "term" or option text a step in an explanation.
+_CONNECTIVES = frozenset(
+    "first second third then next finally also because since so thus hence therefore and or but".split()
+)
+
+_NUMBER = r"[-+]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][-+]?\d+)?"
+_UNIT = r"%|[°a-zA-Zµμ][\w/^°·*.-]{0,11}"
+
+_MCQ = re.compile(
+    r"^(?:option\s*\(?([a-h])\)?[.):]?(?=\s|$)|\(([a-h])\)|([a-h])[.):](?=\s|$)|([a-h])(?=\s*$))\s*(.*)$",
+    re.IGNORECASE | re.DOTALL,
+)
+_NUMERIC = re.compile(
+    rf"^(?P<value>{_NUMBER})\s*(?:(?:±|\+/-|\+-)\s*(?P<tol>{_NUMBER})\s*)?(?P<unit>{_UNIT})?$"
+)
+_STUDENT_NUMBER = re.compile(rf"(?P<value>{_NUMBER})\s*(?P<unit>{_UNIT})?")
+_THOUSANDS = re.compile(r"(?<=\d),(?=\d{3}\b)")
+_KEYWORD = re.compile(r"^[\w][\w\s'-]*$")
+
+# Teacher answers must spell the word out; students may abbreviate.
+_BOOLEAN_WORDS = {"true": True, "yes": True, "false": False, "no": False}
+_BOOLEANS = {**_BOOLEAN_WORDS, "t": True, "y": True, "f": False, "n": False}
+
+
+def _norm(text):
+    return " ".join(text.lower().split()).strip(" .")
+
+
+def _mcq_option(text):
+    match = _MCQ.match(text.strip())
+    if not match:
+        return None, None
+    letter = next(group for group in match.groups()[:4] if group)
+    return letter.lower(), _norm(match.group(5))
+
+
+def _is_option(text):
+    """An option letter, optionally followed by a short option text (not an explanation)."""
+    letter, option_text = _mcq_option(text)
+    words = option_text.split() if letter else []
+    return bool(letter) and len(words) <= MAX_OPTION_WORDS and not (words and words[0] in _CONNECTIVES)
+
+
+def _is_term(term):
+    words = term.split()
+    return (bool(term) and _KEYWORD.match(term) and len(words) <= MAX_KEYWORD_WORDS
+            and not all(word in _CONNECTIVES for word in words))
+
+
+def _keywords(text):
+    terms = [_norm(term) for term in re.split(r"[,;\n]", text)]
+    if not 2 <= len(terms) <= MAX_KEYWORDS:
+        return None
+    if not all(_is_term(term) for term in terms):
+        return None
+    return terms
+
+
+@lru_cache(maxsize=4096)
+def classify_answer(teacher_answer, marks, is_objective=False):
+    """
+    The answer type of one teacher answer; see ANSWER_TYPES. Only objective
+    answers (1-mark sub-parts) fall back to "exact"; other ones are "free".
+    """
+    text = teacher_answer.strip()
+    if not text:
+        return "free"
+    if _norm(text) in _BOOLEAN_WORDS:
+        return "boolean"
+    short = marks <= MAX_LOCAL_MARKS
+    if short and _is_option(text):
+        return "mcq"
+    if _NUMERIC.match(text):
+        return "numeric"
+    if short and _keywords(text):
+        return "keywords"
+    if is_objective:
+        return "exact"
+    return "free"
+
+
+# ───────────────────────────────────────────────
+# Local graders: (teacher, student, marks) → (score, feedback)
+# ───────────────────────────────────────────────
+def _grade_mcq(teacher, student, marks):
+    letter, option_text = _mcq_option(teacher)
+    given, _ = _mcq_option(student)
+    if given is None and option_text:
+        # "Binary search" for "c) Binary search"
+        correct = _norm(student) == option_text
+    else:
+        correct = given == letter
+    return (marks if correct else 0.0), f"Option match: {'Correct' if correct else 'Incorrect'} (expected {letter.upper()})"
+
+
+def _unit(unit):
+    return re.sub(r"[\^*·]", "", unit).lower().rstrip(".") if unit else unit
+
+
+def _grade_numeric(teacher, student, marks):
+    expected = _NUMERIC.match(teacher.strip())
+    numbers = list(_STUDENT_NUMBER.finditer(_THOUSANDS.sub("", student)))
+    if not numbers:
+        return 0.0, "Numeric answer: no number found"
+    if len(numbers) > 1:
+        # Working, or "42 (see step 3)": which number is the answer is for the model.
+        return None
+    found, = numbers
+
+    value, given = float(expected["value"]), float(found["value"])
+    if expected["tol"]:
+        tolerance = abs(float(expected["tol"]))
+    else:
+        tolerance = max(abs(value) * settings.GRADING_NUMERIC_TOLERANCE, 1e-9)
+    unit, given_unit = expected["unit"], found["unit"]
+    if unit and given_unit and _unit(unit) != _unit(given_unit):
+        return 0.0, f"Numeric answer: expected a value in {unit}, got {given_unit}"
+    if abs(given - value) <= tolerance:
+        return marks, "Numeric answer: Correct"
+    return 0.0, f"Numeric answer: Incorrect (expected {teacher.strip()})"
+
+
+def _grade_boolean(teacher, student, marks):
+    words = _norm(student).split()
+    correct = bool(words) and _BOOLEANS.get(words[0].strip(".,")) == _BOOLEAN_WORDS[_norm(teacher)]
+    return (marks if correct else 0.0), f"True/false: {'Correct' if correct else 'Incorrect'}"
+
+
+def _grade_keywords(teacher, student, marks):
+    terms = _keywords(teacher)
+    words = re.findall(r"[\w'-]+", student.lower())
+    answer = f" {' '.join(words)} "
+    found = [term for term in terms if f" {term} " in answer]
+    missing = [term for term in terms if term not in found]
+    score = round(marks * len(found) / len(terms), 2)
+    feedback = f"Keywords: {len(found)}/{len(terms)} present"
+    if missing:
+        feedback += f"; missing: {', '.join(missing)}"
+    return score, feedback
+
+
+def _grade_exact(teacher, student, marks):
+    correct = teacher.strip().lower() == student.strip().lower()
+    return (marks if correct else 0.0), f"Objective match: {'Correct' if correct else 'Incorrect'}"
+
+
+_LOCAL_GRADERS = {
+    "mcq":      _grade_mcq,
+    "numeric":  _grade_numeric,
+    "boolean":  _grade_boolean,
+    "keywords": _grade_keywords,
+    "exact":    _grade_exact,
+}
+
+
+def grade_locally(teacher_answer, student_answer, marks, answer_type=None, is_objective=False):
+    """
+    (score, feedback) for an answer that needs no model: a blank student
+    answer or a non-free answer type. None means "ask the model".
+    """
+    if not student_answer.strip():
+        return 0.0, "No answer given."
+    grader = _LOCAL_GRADERS.get(answer_type or classify_answer(teacher_answer, marks, is_objective))
+    return grader(teacher_answer, student_answer, marks) if grader else None
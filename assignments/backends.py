@@ -0,0 +1,198 @@
+"""
+Grading backends.
+
+Everything that grades goes through an object with the Gemini SDK's
+generate_content(prompt, **kwargs) → response.text interface, so a backend
+is just a factory for such an object:
+
+  • "gemini" – the real google.generativeai model,
+  • "fake"   – an in-process stand-in that returns deterministic scores
+               after a configurable latency, and can inject errors and 429s,
+  • "http"   – a client for `manage.py run_fake_llm_server` (or anything
+               speaking the same tiny JSON protocol).
+
+The fake backends let the pipeline (PDF parsing, scheduling, DB writes) be
+load tested without spending quota. Pick one with GRADING_BACKEND.
+"""
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+
+BACKENDS = ("gemini", "fake", "http")
+
+_WORD = re.compile(r"\w+")
+
+
+class BackendError(Exception):
+    """Error from a fake backend; `code` follows HTTP so llm_client can classify it."""
+
+    def __init__(self, message, code=500):
+        super().__init__(message)
+        self.code = code
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+def parse_latency(spec):
+    """
+    Turn a latency spec into a function returning seconds:
+    "0.2" or "fixed:0.2", "uniform:0.1,0.5", "normal:0.3,0.1",
+    "lognormal:-1.5,0.5" (mu, sigma of the underlying normal), "exp:0.3" (mean).
+    """
+    spec = str(spec or "0").strip()
+    kind, _, args = spec.partition(":") if ":" in spec else ("fixed", "", spec)
+    values = [float(value) for value in args.split(",") if value.strip()]
+
+    if kind == "fixed" and len(values) == 1:
+        return lambda rng: values[0]
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(*values)
+    if kind == "normal" and len(values) == 2:
+        return lambda rng: max(0.0, rng.gauss(*values))
+    if kind == "lognormal" and len(values) == 2:
+        return lambda rng: rng.lognormvariate(*values)
+    if kind == "exp" and len(values) == 1:
+        return lambda rng: rng.expovariate(1 / values[0]) if values[0] > 0 else 0.0
+    raise ValueError(f"Invalid latency spec: {spec!r}")
+
+
+def _fake_score(teacher_ans, student_ans, marks):
+    """Word-overlap score rounded to 0.25: deterministic and roughly plausible."""
+    teacher_words = set(_WORD.findall((teacher_ans or "").lower()))
+    student_words = set(_WORD.findall((student_ans or "").lower()))
+    if not teacher_words or not student_words:
+        return 0.0
+    overlap = len(teacher_words & student_words) / len(teacher_words | student_words)
+    return min(float(marks), round(overlap * float(marks) * 4) / 4)
+
+
+def _section(prompt, start, end):
+    head, _, rest = prompt.partition(start)
+    return rest.partition(end)[0].strip() if head != prompt else ""
+
+
+def _json_line(prompt, marker):
+    """The JSON payload the batch prompts put on the line after `marker`."""
+    rest = prompt.partition(marker)[2].lstrip()
+    return json.loads(rest.split("\n", 1)[0])
+
+
+def fake_grade(prompt):
+    """Answer any of grader.py's prompts the way the model would, deterministically."""
+    if "Items (JSON):" in prompt:
+        items = _json_line(prompt, "Items (JSON):")
+        results = [
+            {"id": item["id"],
+             "score": _fake_score(item["teacher_answer"], item["student_answer"], item["max_marks"]),
+             "feedback": "Graded by the fake backend."}
+            for item in items
+        ]
+        return json.dumps({"results": results})
+
+    marks = float(re.search(r"Maximum marks = ([\d.]+)", prompt).group(1))
+    if "Student Answers (JSON):" in prompt:
+        teacher_ans = _section(prompt, "Teacher's Answer:", "Student Answers (JSON):")
+        answers = _json_line(prompt, "Student Answers (JSON):")
+        results = [
+            {"id": answer["id"],
+             "score": _fake_score(teacher_ans, answer["student_answer"], marks),
+             "feedback": "Graded by the fake backend."}
+            for answer in answers
+        ]
+        return json.dumps({"results": results})
+
+    teacher_ans = _section(prompt, "Teacher's Answer:", "Student's Answer:")
+    student_ans = _section(prompt, "Student's Answer:", "First line should contain")
+    return f"{_fake_score(teacher_ans, student_ans, marks)}\nGraded by the fake backend."
+
+
+class FakeModel:
+    """
+    In-process stand-in for the Gemini model. Sleeps for a latency drawn
+    from `latency` (see parse_latency), then fails with probability
+    `error_rate` (500) or `throttle_rate` (429), else returns fake_grade().
+    """
+
+    def __init__(self, latency="0", error_rate=0.0, throttle_rate=0.0, seed=None,
+                 model_name="fake"):
+        self.model_name = model_name
+        self.latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def generate_content(self, prompt, **kwargs):
+        with self.lock:
+            delay = self.latency(self.rng)
+            roll = self.rng.random()
+        time.sleep(delay)
+        if roll < self.throttle_rate:
+            raise BackendError("429 Resource has been exhausted (fake)", code=429)
+        if roll < self.throttle_rate + self.error_rate:
+            raise BackendError("500 Internal error (fake)", code=500)
+        return FakeResponse(fake_grade(prompt))
+
+
+class HttpModel:
+    """
+    Client for a grading server: POSTs {"prompt": ...} as JSON and expects
+    {"text": ...} back. Non-2xx responses raise BackendError with the status.
+    """
+
+    def __init__(self, url, timeout=60.0, model_name="http"):
+        self.url = url
+        self.timeout = timeout
+        self.model_name = model_name
+
+    def generate_content(self, prompt, **kwargs):
+        body = json.dumps({"prompt": prompt}).encode("utf-8")
+        request = urllib.request.Request(self.url, data=body, headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return FakeResponse(json.loads(response.read())["text"])
+        except urllib.error.HTTPError as exc:
+            raise BackendError(f"{exc.code} {exc.reason}", code=exc.code) from exc
+        except urllib.error.URLError as exc:
+            raise ConnectionError(str(exc.reason)) from exc
+
+
+def _fake_options():
+    from django.conf import settings
+
+    return {
+        "latency": getattr(settings, "FAKE_LLM_LATENCY", "0"),
+        "error_rate": getattr(settings, "FAKE_LLM_ERROR_RATE", 0.0),
+        "throttle_rate": getattr(settings, "FAKE_LLM_THROTTLE_RATE", 0.0),
+        "seed": getattr(settings, "FAKE_LLM_SEED", None),
+    }
+
+
+def build_model(backend, model_name):
+    """Create the raw (not yet rate-limited) model object for `backend`."""
+    from django.conf import settings
+
+    if backend == "gemini":
+        import google.generativeai as genai
+        from assignments.llm_client import ModelConfigurationError
+
+        api_key = os.getenv("GOOGLE_API_KEY")
+        if not api_key:
+            raise ModelConfigurationError("GOOGLE_API_KEY is not set; the gemini backend cannot grade")
+        genai.configure(api_key=api_key)
+        return genai.GenerativeModel(model_name)
+    if backend == "fake":
+        return FakeModel(model_name=f"fake-{model_name}", **_fake_options())
+    if backend == "http":
+        return HttpModel(getattr(settings, "GRADING_BACKEND_URL", "http://127.0.0.1:8765/"),
+                         model_name=f"http-{model_name}")
+    raise ValueError(f"Unknown grading backend {backend!r}; expected one of {', '.join(BACKENDS)}")
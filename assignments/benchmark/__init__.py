@@ -0,0 +1,4 @@
+"""
+Synthetic-data benchmarks for the grading pipeline; run them with
+`python manage.py run_pipeline_benchmark`.
+"""
@@ -0,0 +1,199 @@
+"""
+SQLite concurrency stress test.
+
+run_concurrency_stress() creates a throwaway classroom with `submissions`
+ungraded submissions, then runs together:
+
+  readers – threads that keep loading the student dashboard and the
+            teacher's submissions page, as students and teachers do
+  graders – threads that save fake grading results for their share of the
+            submissions, through one GradeWriter (writer=True) or each with
+            its own save_question_results transactions (writer=False)
+
+It reports how many reads and writes ran and how many of them failed with
+"database is locked". All rows it created are deleted afterwards.
+"""
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import OperationalError, connection
+from django.test import Client
+from django.urls import reverse
+from django.utils.timezone import now
+
+QUESTIONS = 10
+
+
+def _create_rows(tag, submissions):
+    from accounts.models import Classroom, Student
+    from assignments.grade_stats import rebuild_assignment_stats
+    from assignments.models import Assignment, StudentSubmission
+
+    User = get_user_model()
+    teacher = User.objects.create(username=f"stress-teacher-{tag}", user_type="teacher")
+    classroom = Classroom.objects.create(
+        teacher=teacher, name="Stress", subject_name="Stress", subject_code=f"ST-{tag}",
+        branch=f"ST-{tag}", batch=now().year,
+    )
+    assignment = Assignment.objects.create(
+        title=f"Stress {tag}", classroom=classroom, teacher=teacher,
+        question_file="stress.pdf", question_solution_file="stress.pdf",
+        deadline=now() + timedelta(days=1), total_marks=QUESTIONS * 2,
+    )
+    students = User.objects.bulk_create(
+        User(username=f"stress-student-{tag}-{index}", user_type="student")
+        for index in range(submissions)
+    )
+    Student.objects.bulk_create(
+        Student(user=student, roll_no=f"{tag}-{index}", first_name="Stress", last_name=str(index),
+                batch_year=classroom.batch, branch=classroom.branch,
+                college_email=f"stress-{tag}-{index}@example.com")
+        for index, student in enumerate(students)
+    )
+    rows = StudentSubmission.objects.bulk_create(
+        StudentSubmission(assignment=assignment, student=student, submitted_file="stress.pdf")
+        for student in students
+    )
+    rebuild_assignment_stats(assignment)
+    return assignment, students, rows
+
+
+def _is_lock_error(exc):
+    return isinstance(exc, OperationalError) and "locked" in str(exc)
+
+
+def _results(index):
+    return [(f"Q{n}", 2.0, float((index + n) % 3), "Stress feedback") for n in range(1, QUESTIONS + 1)]
+
+
+def run_concurrency_stress(readers=4, graders=4, submissions=200, writer=True, batch_size=None,
+                           grade_delay=0.005):
+    """
+    Run readers and graders against the default database; returns the report
+    dict. Each grader pauses `grade_delay` seconds per submission, standing
+    in for the model call, so the writes are spread out as in real grading.
+    """
+    from assignments.db_writer import GradeWriter
+    from assignments.models import AssignmentStats, StudentSubmission
+    from assignments.utils import save_question_results
+
+    tag = uuid.uuid4().hex[:8]
+    assignment, students, rows = _create_rows(tag, submissions)
+    counts = Counter()
+    counts_lock = threading.Lock()
+    done = threading.Event()
+    # Graders start once every reader has loaded its pages once.
+    readers_ready = threading.Barrier(readers + 1)
+    grade_writer = GradeWriter(batch_size) if writer else None
+
+    def count(key, amount=1):
+        with counts_lock:
+            counts[key] += amount
+
+    def read(student):
+        client = Client()
+        client.force_login(student)
+        urls = [
+            reverse("accounts:student_dashboard"),
+            reverse("assignments:view_submissions", args=[assignment.pk]),
+        ]
+        waited = False
+        try:
+            while True:
+                for url in urls:
+                    try:
+                        client.get(url)
+                        count("reads")
+                    except Exception as exc:
+                        count("read_lock_errors" if _is_lock_error(exc) else "read_errors")
+                if not waited:
+                    readers_ready.wait()
+                    waited = True
+                if done.is_set():
+                    return
+        finally:
+            connection.close()
+
+    def grade(share):
+        futures = []
+        try:
+            for index, submission in share:
+                time.sleep(grade_delay)
+                if grade_writer is not None:
+                    futures.append(grade_writer.submit(submission, _results(index)))
+                    continue
+                try:
+                    save_question_results(submission, _results(index))
+                    count("writes")
+                except Exception as exc:
+                    count("write_lock_errors" if _is_lock_error(exc) else "write_errors")
+            for future in futures:
+                try:
+                    future.result()
+                    count("writes")
+                except Exception as exc:
+                    count("write_lock_errors" if _is_lock_error(exc) else "write_errors")
+        finally:
+            connection.close()
+
+    indexed = list(enumerate(rows))
+    reader_threads = [threading.Thread(target=read, args=(students[n % len(students)],)) for n in range(readers)]
+    grader_threads = [threading.Thread(target=grade, args=(indexed[n::graders],)) for n in range(graders)]
+
+    try:
+        for thread in reader_threads:
+            thread.start()
+        readers_ready.wait()
+        started = time.perf_counter()
+        for thread in grader_threads:
+            thread.start()
+        for thread in grader_threads:
+            thread.join()
+        seconds = time.perf_counter() - started
+    finally:
+        done.set()
+        for thread in reader_threads:
+            thread.join()
+        if grade_writer is not None:
+            grade_writer.close()
+
+    graded = StudentSubmission.objects.filter(assignment=assignment, graded=True).count()
+    stats = AssignmentStats.objects.get(assignment=assignment)
+    report = {
+        "parameters": {
+            "readers": readers, "graders": graders, "submissions": submissions,
+            "writer": writer, "batch_size": grade_writer.batch_size if grade_writer else None,
+        },
+        "database": {
+            "vendor":       connection.vendor,
+            "journal_mode": _pragma("journal_mode"),
+            "synchronous":  _pragma("synchronous"),
+            "busy_timeout": _pragma("busy_timeout"),
+        },
+        "seconds":           round(seconds, 3),
+        "reads":             counts["reads"],
+        "reads_per_second":  round(counts["reads"] / seconds, 1) if seconds else None,
+        "writes":            counts["writes"],
+        "writes_per_second": round(counts["writes"] / seconds, 1) if seconds else None,
+        "read_lock_errors":  counts["read_lock_errors"],
+        "write_lock_errors": counts["write_lock_errors"],
+        "other_errors":      counts["read_errors"] + counts["write_errors"],
+        "graded":            graded,
+        "stats_count":       stats.count,
+        "writer_stats":      dict(grade_writer.stats) if grade_writer else None,
+    }
+
+    get_user_model().objects.filter(username__startswith="stress-", username__contains=tag).delete()
+    return report
+
+
+def _pragma(name):
+    if connection.vendor != "sqlite":
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(f"PRAGMA {name}")
+        return cursor.fetchone()[0]
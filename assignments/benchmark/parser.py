@@ -0,0 +1,137 @@
+"""
+Microbenchmark: the current parse_question_bank against a frozen copy of
+the original regex-per-line parser, on large generated question banks.
+
+Sub-parts are numbered i, ii, iii, iiii … so that both parsers understand
+them, and half of the sub-part answers are given as bare lines, which is
+the path where the original parser scanned every sub-part per line.
+"""
+import random
+import re
+import time
+
+from assignments.benchmark.synthetic import VOCABULARY
+from assignments.grader import parse_question_bank
+
+
+def legacy_parse_question_bank(text):
+    """parse_question_bank as it was before the single-pass tokenizer (PARSER_VERSION 1)."""
+    questions = {}
+    current_q_no = None
+    current_question = ""
+    current_marks = 0
+    subparts = {}
+    question_lines = text.strip().split('\n')
+
+    for line in question_lines:
+        line = line.strip()
+
+        main_q_match = re.match(r'^(Q\d+)\.\s*(.*?)\s*\((\d+)\s*marks\)', line, re.IGNORECASE)
+        if main_q_match:
+            if current_q_no:
+                questions[current_q_no] = {
+                    'question': current_question,
+                    'marks': current_marks,
+                    'answer': current_answer,
+                    'subparts': subparts
+                }
+                subparts = {}
+
+            current_q_no = main_q_match.group(1)
+            current_question = main_q_match.group(2).strip()
+            current_marks = int(main_q_match.group(3))
+            current_answer = ""
+            continue
+
+        subpart_match = re.match(r'^\((i+)\)\s*(.*?)\s*\((\d+)\s*marks\)', line)
+        if subpart_match:
+            roman = subpart_match.group(1)
+            sub_q = subpart_match.group(2).strip()
+            sub_m = int(subpart_match.group(3))
+            subparts[roman] = {'question': sub_q, 'marks': sub_m, 'answer': ''}
+            continue
+
+        ans_part_match = re.match(r'^Ans\s*\((i+)\)\s*:\s*(.*)', line)
+        if ans_part_match:
+            roman = ans_part_match.group(1)
+            ans_text = ans_part_match.group(2).strip()
+            if roman in subparts:
+                subparts[roman]['answer'] = ans_text
+            continue
+
+        ans_match = re.match(r'^Ans\s*:\s*(.*)', line)
+        if ans_match:
+            current_answer = ans_match.group(1).strip()
+            continue
+
+        elif current_answer != "":
+            current_answer += ' ' + line
+
+        elif any(subparts.values()) and any(p['answer'] == "" for p in subparts.values()):
+            for key in subparts:
+                if subparts[key]['answer'] == "":
+                    subparts[key]['answer'] = line
+                    break
+
+    if current_q_no:
+        questions[current_q_no] = {
+            'question': current_question,
+            'marks': current_marks,
+            'answer': current_answer,
+            'subparts': subparts
+        }
+
+    return questions
+
+
+def make_bank_text(questions=2000, subparts=20, answer_lines=5, seed=0):
+    """Question-bank text with every other question split into `subparts` sub-parts."""
+    rng = random.Random(seed)
+
+    def words(count):
+        return " ".join(rng.choice(VOCABULARY) for _ in range(count))
+
+    lines = []
+    for number in range(1, questions + 1):
+        if subparts and number % 2 == 0:
+            lines.append(f"Q{number}. Answer the following: ({subparts} marks)")
+            for k in range(1, subparts + 1):
+                lines.append(f"({'i' * k}) {words(6)}? (1 marks)")
+            for k in range(1, subparts + 1):
+                # Alternate explicit "Ans (…):" lines with bare answer lines.
+                lines.append(f"Ans ({'i' * k}): {words(5)}" if k % 2 else words(5))
+        else:
+            lines.append(f"Q{number}. {words(7)}? (5 marks)")
+            lines.append(f"Ans: {words(12)}")
+            lines.extend(words(12) for _ in range(answer_lines - 1))
+        lines.append("")
+    return "\n".join(lines)
+
+
+def _best_of(fn, text, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(text)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def run_parser_benchmark(questions=2000, subparts=20, answer_lines=5, repeat=5, seed=0):
+    """Best-of-`repeat` timings for both parsers; raises if their outputs differ."""
+    text = make_bank_text(questions, subparts, answer_lines, seed)
+    legacy_seconds, legacy_bank = _best_of(legacy_parse_question_bank, text, repeat)
+    current_seconds, current_bank = _best_of(parse_question_bank, text, repeat)
+    if legacy_bank != current_bank:
+        raise AssertionError("parse_question_bank output differs from the legacy parser")
+
+    return {
+        "questions":       questions,
+        "subparts":        subparts,
+        "lines":           text.count("\n") + 1,
+        "bytes":           len(text.encode("utf-8")),
+        "legacy_seconds":  round(legacy_seconds, 4),
+        "current_seconds": round(current_seconds, 4),
+        "speedup":         round(legacy_seconds / current_seconds, 2) if current_seconds else None,
+    }
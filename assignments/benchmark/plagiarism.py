@@ -0,0 +1,145 @@
+"""
+Timing of the incremental similarity index (assignments/plagiarism.py).
+
+run_plagiarism_benchmark() creates a throwaway assignment with
+`submissions` submissions of random answers and plants copies: every
+`copy_every`-th submission is a lightly edited copy of an earlier one, and
+every `copy_every`-th one after that (offset by half) copies a single
+answer. The submissions are then indexed one by one, in order, as ingestion
+does. The report gives the total and per-submission indexing time (early
+vs. late submissions, which stays flat if lookups are sub-linear), the
+candidates checked against the n(n-1)/2 pairs a naive comparison needs, an
+estimate of that naive comparison's time, and how many planted copies were
+found. Everything is rolled back afterwards.
+"""
+import random
+import time
+import uuid
+from collections import Counter
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils.timezone import now
+
+from assignments.benchmark.synthetic import VOCABULARY
+from assignments.clustering import word_shingles
+from assignments.plagiarism import index_submission, submission_texts
+
+
+def _create_rows(tag, count):
+    from accounts.models import Classroom
+    from assignments.models import Assignment, StudentSubmission
+
+    User = get_user_model()
+    teacher = User.objects.create(username=f"plagiarism-teacher-{tag}", user_type="teacher")
+    classroom = Classroom.objects.create(
+        teacher=teacher, name="Plagiarism", subject_name="Plagiarism", subject_code=f"PL-{tag}",
+        branch=f"PL-{tag}", batch=now().year,
+    )
+    assignment = Assignment.objects.create(
+        title=f"Plagiarism {tag}", classroom=classroom, teacher=teacher,
+        question_file="bench.pdf", question_solution_file="bench.pdf",
+        deadline=now() + timedelta(days=1),
+    )
+    students = User.objects.bulk_create(
+        User(username=f"plagiarism-student-{tag}-{index}", user_type="student") for index in range(count)
+    )
+    return assignment, StudentSubmission.objects.bulk_create(
+        StudentSubmission(assignment=assignment, student=student, submitted_file="bench.pdf",
+                          parse_status='parsed')
+        for student in students
+    )
+
+
+def _answer(rng, words):
+    return " ".join(rng.choice(VOCABULARY) for _ in range(words))
+
+
+def _edit(rng, answer):
+    """The same answer with one word replaced."""
+    words = answer.split()
+    words[rng.randrange(len(words))] = rng.choice(VOCABULARY)
+    return " ".join(words)
+
+
+def build_banks(count, questions, answer_words, copy_every, seed):
+    """Student banks with planted copies; returns (banks, {(earlier, later): scope})."""
+    rng = random.Random(seed)
+    banks, planted = [], {}
+    for index in range(count):
+        bank = {f"Q{n}": {"answer": _answer(rng, answer_words), "subparts": {}} for n in range(1, questions + 1)}
+        if index and copy_every and index % copy_every == 0:
+            source = rng.randrange(index)
+            bank = {qid: {"answer": _edit(rng, q["answer"]), "subparts": {}} for qid, q in banks[source].items()}
+            planted[(source, index)] = ""
+        elif index and copy_every and index % copy_every == copy_every // 2:
+            source = rng.randrange(index)
+            bank["Q1"] = {"answer": _edit(rng, banks[source]["Q1"]["answer"]), "subparts": {}}
+            planted[(source, index)] = "Q1"
+        banks.append(bank)
+    return banks, planted
+
+
+def _naive_pair_seconds(banks, samples=2000, seed=0):
+    """
+    Time of one naive comparison: exact Jaccard of two submissions' shingle
+    sets (computed beforehand), for every scope.
+    """
+    rng = random.Random(seed)
+    sets = [
+        {scope: word_shingles(text) for scope, text in submission_texts(bank).items()}
+        for bank in rng.sample(banks, min(len(banks), 200))
+    ]
+    pairs = [rng.sample(range(len(sets)), 2) for _ in range(samples)]
+    start = time.perf_counter()
+    for first, second in pairs:
+        for scope in sets[first].keys() & sets[second].keys():
+            a, b = sets[first][scope], sets[second][scope]
+            len(a & b) / len(a | b)
+    return (time.perf_counter() - start) / samples
+
+
+def run_plagiarism_benchmark(submissions=5000, questions=10, answer_words=40, copy_every=50, seed=0):
+    """Index `submissions` synthetic submissions one by one; returns the report dict."""
+    from assignments.models import SimilarityPair
+
+    banks, planted = build_banks(submissions, questions, answer_words, copy_every, seed)
+    stats = Counter()
+    timings = []
+    with transaction.atomic():
+        assignment, rows = _create_rows(uuid.uuid4().hex[:8], submissions)
+        position = {row.pk: index for index, row in enumerate(rows)}
+
+        start = time.perf_counter()
+        for row, bank in zip(rows, banks):
+            began = time.perf_counter()
+            index_submission(row, bank, stats=stats)
+            timings.append(time.perf_counter() - began)
+        seconds = time.perf_counter() - start
+
+        found = {
+            (position[first], position[second], scope)
+            for first, second, scope in SimilarityPair.objects
+            .filter(assignment=assignment).values_list('first_id', 'second_id', 'scope')
+        }
+        transaction.set_rollback(True)
+
+    tenth = max(1, submissions // 10)
+    naive_pairs = submissions * (submissions - 1) // 2
+    pair_seconds = _naive_pair_seconds(banks, seed=seed)
+    return {
+        "submissions": submissions,
+        "questions": questions,
+        "answer_words": answer_words,
+        "index_seconds": round(seconds, 3),
+        "ms_per_submission": round(1000 * seconds / submissions, 3),
+        "ms_per_submission_first_10pct": round(1000 * sum(timings[:tenth]) / tenth, 3),
+        "ms_per_submission_last_10pct": round(1000 * sum(timings[-tenth:]) / tenth, 3),
+        "candidates_checked": stats["candidates"],
+        "naive_pairs": naive_pairs,
+        "naive_seconds_estimate": round(pair_seconds * naive_pairs, 1),
+        "pairs_found": stats["pairs"],
+        "planted_copies": len(planted),
+        "planted_copies_found": sum((first, second, scope) in found for (first, second), scope in planted.items()),
+    }
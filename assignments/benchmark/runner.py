@@ -0,0 +1,191 @@
+"""
+End-to-end pipeline benchmark.
+
+run_benchmark() generates a synthetic dataset, then times each phase of the
+grading pipeline against it:
+
+  generate – writing the PDFs (synthetic.generate_dataset)
+  extract  – extract_text_from_pdf on every PDF
+  parse    – parse_question_bank on the extracted text
+  stream   – parse_question_bank_pdf, page-wise extraction fed to the parser
+  load     – load_question_banks, the cached / multi-process path grading uses
+  grade    – grade_submissions with the chosen backend (no grade cache)
+  save     – save_question_results for every submission
+
+For every phase the report records wall time, database queries and the
+process's peak RSS afterwards. Database rows created by the save phase are
+rolled back, so the benchmark can run against a development database.
+"""
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+
+import django
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.utils.timezone import now
+
+from assignments.benchmark.synthetic import generate_dataset
+from assignments.engine import get_grading_mode, get_max_in_flight, grade_submissions
+from assignments.grader import (
+    extract_text_from_pdf, get_grading_model, parse_question_bank, parse_question_bank_pdf,
+)
+from assignments.pdf_cache import clear_memory_cache
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MiB, or None if unknown."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KiB on Linux and bytes on macOS.
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+class _QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+@contextmanager
+def measure(phases, name, items=None):
+    """Time the block and append a phase entry to `phases`; the entry is yielded for extra fields.
+
+    ru_maxrss only ever grows, so a phase reports how far it raised the process peak
+    (`rss_growth_mb`); 0 means it fit in memory an earlier phase had already touched.
+    """
+    entry = {"name": name}
+    counter = _QueryCounter()
+    peak_before = peak_rss_mb()
+    started = time.perf_counter()
+    with connection.execute_wrapper(counter):
+        yield entry
+    seconds = time.perf_counter() - started
+    entry.update({
+        "seconds":     round(seconds, 4),
+        "queries":     counter.count,
+        "rss_growth_mb": None if peak_before is None else round(peak_rss_mb() - peak_before, 1),
+    })
+    if items is not None:
+        entry["items"] = items
+        entry["items_per_second"] = round(items / seconds, 1) if seconds else None
+    phases.append(entry)
+
+
+def _create_rows(dataset):
+    """Throwaway teacher, classroom, assignment, students and submissions for the save phase."""
+    from accounts.models import Classroom
+    from assignments.models import Assignment, StudentSubmission
+
+    User = get_user_model()
+    tag = uuid.uuid4().hex[:8]
+    teacher = User.objects.create(username=f"bench-teacher-{tag}", user_type="teacher")
+    classroom = Classroom.objects.create(
+        teacher=teacher, name="Benchmark", subject_name="Benchmark", subject_code="BENCH",
+        branch="BENCH", batch=now().year,
+    )
+    assignment = Assignment.objects.create(
+        title=f"Benchmark {tag}", classroom=classroom, teacher=teacher,
+        question_file=str(dataset["teacher_pdf"]), question_solution_file=str(dataset["teacher_pdf"]),
+        deadline=now(), total_marks=dataset["total_marks"],
+    )
+    students = User.objects.bulk_create(
+        User(username=f"bench-student-{tag}-{index}", user_type="student")
+        for index in range(len(dataset["student_pdfs"]))
+    )
+    return StudentSubmission.objects.bulk_create(
+        StudentSubmission(assignment=assignment, student=student, submitted_file=str(path))
+        for student, path in zip(students, dataset["student_pdfs"])
+    )
+
+
+def run_benchmark(questions=10, subparts=3, answer_words=60, pages=0, students=20, seed=0,
+                  backend="fake", mode=None, max_in_flight=None, parse_workers=1,
+                  work_dir=None, keep_files=False, save=True):
+    """Run every phase once and return the report as a JSON-serialisable dict."""
+    from assignments.pdf_cache import load_question_banks
+    from assignments.utils import save_question_results
+
+    mode = get_grading_mode(mode)
+    max_in_flight = get_max_in_flight(max_in_flight)
+    temp_dir = work_dir or tempfile.mkdtemp(prefix="grading-bench-")
+    phases = []
+    stats = Counter()
+
+    try:
+        with measure(phases, "generate", items=students + 1):
+            dataset = generate_dataset(temp_dir, questions, subparts, answer_words, pages, students, seed)
+        paths = [str(dataset["teacher_pdf"])] + [str(path) for path in dataset["student_pdfs"]]
+
+        with measure(phases, "extract", items=len(paths)):
+            texts = [extract_text_from_pdf(path) for path in paths]
+
+        with measure(phases, "parse", items=len(texts)):
+            banks = [parse_question_bank(text) for text in texts]
+        del texts
+
+        with measure(phases, "stream", items=len(paths)):
+            for path in paths:
+                parse_question_bank_pdf(path)
+
+        clear_memory_cache()
+        with measure(phases, "load", items=len(paths)) as entry:
+            load_question_banks(paths, parse_workers)
+            entry["workers"] = parse_workers
+
+        teacher_data, student_banks = banks[0], list(enumerate(banks[1:]))
+        model = get_grading_model(backend=backend)
+        results = []
+        with measure(phases, "grade", items=len(student_banks)) as entry:
+            for index, per_question_results in grade_submissions(
+                teacher_data, student_banks, model,
+                max_in_flight=max_in_flight, stats=stats, use_cache=False, mode=mode,
+            ):
+                results.append((index, per_question_results))
+            entry["model_calls"] = stats["llm_calls"]
+            entry["graded_items"] = stats["items"]
+
+        if save:
+            with transaction.atomic():
+                submissions = _create_rows(dataset)
+                with measure(phases, "save", items=len(results)):
+                    for index, per_question_results in results:
+                        save_question_results(submissions[index], per_question_results)
+                transaction.set_rollback(True)
+    finally:
+        if not keep_files and work_dir is None:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    return {
+        "created_at": now().isoformat(),
+        "environment": {
+            "python":   platform.python_version(),
+            "django":   django.get_version(),
+            "platform": platform.platform(),
+            "database": connection.vendor,
+        },
+        "parameters": {
+            "questions": questions, "subparts": subparts, "answer_words": answer_words,
+            "pages": pages, "students": students, "seed": seed, "backend": backend,
+            "mode": mode, "max_in_flight": max_in_flight, "parse_workers": parse_workers,
+        },
+        "dataset": {"pages": dataset["pages"], "total_marks": dataset["total_marks"]},
+        "phases": phases,
+        "total_seconds": round(sum(phase["seconds"] for phase in phases), 4),
+        "peak_rss_mb": peak_rss_mb(),
+        "engine_stats": dict(stats),
+    }
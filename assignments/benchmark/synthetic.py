@@ -0,0 +1,156 @@
+"""
+Synthetic question/answer PDFs in the Question_Answers_Teacher.pdf format:
+
+    Q1. <question> (5 marks)
+    Ans: <answer, wrapped over several lines>
+
+    Q2. <question> (3 marks)
+    (i) <sub-question> (1 marks)
+    Ans (i): <one-line answer>
+
+Student PDFs reuse the teacher's questions with answers that drop, swap and
+truncate words, so graders see a realistic spread of overlaps. Everything is
+derived from `seed`, so a dataset can be regenerated exactly.
+"""
+import random
+from pathlib import Path
+
+import fitz
+
+VOCABULARY = (
+    "array list stack queue tree graph node edge pointer heap hash table key value "
+    "insert delete search sort merge quick binary linear time space complexity order "
+    "recursion iteration memory index traversal level depth breadth balanced height "
+    "root leaf parent child cycle path weight vertex adjacency matrix bucket collision"
+).split()
+
+ROMAN = ("i", "ii", "iii", "iv", "v", "vi", "vii", "viii", "ix", "x")
+
+# A4 page, 10pt Helvetica with 14pt leading.
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842
+MARGIN = 50
+LEADING = 14
+FONT_SIZE = 10
+LINE_CHARS = 90
+LINES_PER_PAGE = (PAGE_HEIGHT - 2 * MARGIN) // LEADING
+
+
+def _sentence(rng, words):
+    return " ".join(rng.choice(VOCABULARY) for _ in range(words)).capitalize() + "."
+
+
+def _wrap(text, width=LINE_CHARS):
+    lines, current = [], ""
+    for word in text.split():
+        if current and len(current) + 1 + len(word) > width:
+            lines.append(current)
+            current = word
+        else:
+            current = f"{current} {word}" if current else word
+    if current:
+        lines.append(current)
+    return lines
+
+
+def build_question_bank(questions=10, subparts=3, answer_words=60, seed=0):
+    """
+    Random teacher bank: a list of
+    (qid, question, marks, answer, [(roman, question, marks, answer), ...]).
+    Every third question has `subparts` sub-parts (0 for none).
+    """
+    rng = random.Random(seed)
+    bank = []
+    for number in range(1, questions + 1):
+        qid = f"Q{number}"
+        if subparts and number % 3 == 0:
+            parts = [
+                (ROMAN[k], _sentence(rng, 6).rstrip(".") + "?", 1 + k % 2, _sentence(rng, 6))
+                for k in range(min(subparts, len(ROMAN)))
+            ]
+            bank.append((qid, "Answer the following:", sum(p[2] for p in parts), "", parts))
+        else:
+            marks = rng.choice((2, 3, 5))
+            bank.append((qid, _sentence(rng, 7).rstrip(".") + "?", marks,
+                         _sentence(rng, answer_words), []))
+    return bank
+
+
+def _perturb(rng, answer):
+    """A student's version of `answer`: some words dropped, replaced or cut off."""
+    words = answer.rstrip(".").split()
+    quality = rng.random()
+    kept = [
+        word if rng.random() < 0.5 + quality / 2 else rng.choice(VOCABULARY)
+        for word in words
+        if rng.random() < 0.6 + quality * 0.4
+    ]
+    kept = kept[:max(1, int(len(kept) * (0.5 + quality / 2)))]
+    return (" ".join(kept) or rng.choice(VOCABULARY)).capitalize() + "."
+
+
+def student_bank(bank, seed):
+    rng = random.Random(seed)
+    return [
+        (qid, question, marks, _perturb(rng, answer) if answer else "",
+         [(roman, sub_q, sub_m, _perturb(rng, sub_a)) for roman, sub_q, sub_m, sub_a in parts])
+        for qid, question, marks, answer, parts in bank
+    ]
+
+
+def bank_lines(bank):
+    lines = []
+    for qid, question, marks, answer, parts in bank:
+        # Headings and sub-part answers must stay on one line for the parser.
+        lines.append(f"{qid}. {question} ({marks} marks)")
+        for roman, sub_q, sub_m, sub_a in parts:
+            lines.append(f"({roman}) {sub_q} ({sub_m} marks)")
+            lines.append(f"Ans ({roman}): {sub_a}")
+        if answer:
+            lines += _wrap(f"Ans: {answer}")
+        lines.append("")
+    return lines
+
+
+def write_pdf(path, lines, min_pages=0):
+    """Lay `lines` out over at least `min_pages` pages; returns the page count."""
+    per_page = LINES_PER_PAGE
+    if min_pages and len(lines) > 0:
+        per_page = max(1, min(per_page, -(-len(lines) // min_pages)))
+
+    doc = fitz.open()
+    for start in range(0, max(len(lines), 1), per_page):
+        page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        for row, line in enumerate(lines[start:start + per_page]):
+            if line:
+                page.insert_text((MARGIN, MARGIN + (row + 1) * LEADING), line, fontsize=FONT_SIZE)
+    while len(doc) < min_pages:
+        doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+    pages = len(doc)
+    doc.save(str(path))
+    doc.close()
+    return pages
+
+
+def generate_dataset(out_dir, questions=10, subparts=3, answer_words=60, pages=0, students=20, seed=0):
+    """
+    Write teacher.pdf and student_NNNN.pdf to `out_dir`, each at least
+    `pages` pages long (0 packs pages full). Returns a dict with the paths,
+    the teacher's total marks and page count.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    bank = build_question_bank(questions, subparts, answer_words, seed)
+    teacher_pdf = out_dir / "teacher.pdf"
+    dataset = {
+        "teacher_pdf":  teacher_pdf,
+        "student_pdfs": [],
+        "total_marks":  float(sum(marks for _, _, marks, _, _ in bank)),
+        "pages":        write_pdf(teacher_pdf, bank_lines(bank), pages),
+    }
+
+    for index in range(students):
+        path = out_dir / f"student_{index:04d}.pdf"
+        write_pdf(path, bank_lines(student_bank(bank, seed * 1000003 + index)), pages)
+        dataset["student_pdfs"].append(path)
+    return dataset
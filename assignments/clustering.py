@@ -0,0 +1,187 @@
+"""
+Near-duplicate clustering of student answers.
+
+Students often hand in lightly reworded copies of the same answer. Each
+answer is reduced to a MinHash signature of its character shingles, and
+locality-sensitive hashing (the signature cut into bands, answers sharing a
+band bucket become candidates) finds likely near-duplicates without
+comparing every pair. Clusters are formed greedily in submission order: the
+first unclustered answer becomes the representative, and every candidate
+whose estimated Jaccard similarity to it is at least CLUSTER_SIMILARITY
+joins it. Members are therefore all close to the representative, not only
+to each other.
+
+Shingle overlap barely moves when a long answer gains a "not", so only
+answers of at most CLUSTER_MAX_WORDS words are clustered, and a member must
+use exactly the representative's negations ("not", "never", "can't" …).
+
+The grading engine grades one representative per cluster and gives its
+score and feedback to the members; store_answer_clusters records who was
+graded with whom on the StudentAnswer rows, for view_submissions.
+"""
+import re
+import zlib
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from assignments.models import StudentAnswer
+
+NUM_PERM = 128
+# 32 bands of 4 rows: pairs above ~0.42 Jaccard are likely candidates.
+BANDS = 32
+SHINGLE_CHARS = 5
+
+_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(20240917)
+_A = _rng.integers(1, _PRIME, NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, _PRIME, NUM_PERM, dtype=np.uint64)
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+# "t" is what _WORD leaves of "n't" in "can't", "isn't" …
+_NEGATIONS = frozenset("not no never none nothing neither nor cannot t".split())
+
+
+def shingles(text, size=SHINGLE_CHARS):
+    """Hashed character shingles of the normalised text (lower-case words joined by spaces)."""
+    text = " ".join(_WORD.findall(text.lower()))
+    if not text:
+        return set()
+    if len(text) <= size:
+        return {zlib.crc32(text.encode()) & _PRIME}
+    return {zlib.crc32(text[start:start + size].encode()) & _PRIME for start in range(len(text) - size + 1)}
+
+
+def word_shingles(text, size=3):
+    """Hashed word n-grams of the normalised text; coarser than `shingles`, for long texts."""
+    words = _WORD.findall(text.lower())
+    if len(words) <= size:
+        return {zlib.crc32(" ".join(words).encode()) & _PRIME} if words else set()
+    return {zlib.crc32(" ".join(words[start:start + size]).encode()) & _PRIME
+            for start in range(len(words) - size + 1)}
+
+
+def minhash_signatures(texts, shingler=shingles):
+    """
+    A (len(texts), NUM_PERM) array of MinHash signatures of the `shingler`
+    sets, and a boolean mask of the texts that had no shingles at all (their
+    rows are meaningless).
+    """
+    signatures = np.full((len(texts), NUM_PERM), _PRIME, dtype=np.uint64)
+    empty = np.zeros(len(texts), dtype=bool)
+    for row, text in enumerate(texts):
+        hashes = shingler(text)
+        if not hashes:
+            empty[row] = True
+            continue
+        values = np.fromiter(hashes, dtype=np.uint64, count=len(hashes))
+        signatures[row] = ((_A[:, None] * values[None, :] + _B[:, None]) % _PRIME).min(axis=1)
+    return signatures, empty
+
+
+def band_keys(signature, bands=BANDS):
+    """The LSH bucket key of each band of one signature."""
+    rows = len(signature) // bands
+    return [(band, signature[band * rows:(band + 1) * rows].tobytes()) for band in range(bands)]
+
+
+def estimated_similarity(signatures, rows, other):
+    """Estimated Jaccard similarity of each of `rows` to the signature `other`."""
+    return (signatures[rows] == other).mean(axis=1)
+
+
+def negations(text):
+    """The negation words of `text`, in order."""
+    return tuple(word for word in _WORD.findall(text.lower()) if word in _NEGATIONS)
+
+
+def cluster_texts(texts, threshold=None, max_words=None):
+    """
+    Representative index for every text: its own index if it starts (or is
+    alone in) a cluster, else the index of the earlier text it was clustered
+    with. Empty texts and texts of more than `max_words` words are never
+    clustered.
+    """
+    if threshold is None:
+        threshold = settings.CLUSTER_SIMILARITY
+    if max_words is None:
+        max_words = settings.CLUSTER_MAX_WORDS
+    signatures, empty = minhash_signatures(texts)
+    negated = [negations(text) for text in texts]
+
+    keys = [
+        None if empty[row] or len(_WORD.findall(text.lower())) > max_words else band_keys(signatures[row])
+        for row, text in enumerate(texts)
+    ]
+    buckets = {}
+    for row, row_keys in enumerate(keys):
+        for key in row_keys or ():
+            buckets.setdefault(key, []).append(row)
+
+    labels = [-1] * len(texts)
+    for row, row_keys in enumerate(keys):
+        if labels[row] >= 0:
+            continue
+        labels[row] = row
+        if row_keys is None:
+            continue
+        candidates = {
+            other for key in row_keys for other in buckets[key]
+            if labels[other] < 0 and negated[other] == negated[row]
+        }
+        if not candidates:
+            continue
+        candidates = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        close = candidates[estimated_similarity(signatures, candidates, signatures[row]) >= threshold]
+        for other in close.tolist():
+            labels[other] = row
+    return labels
+
+
+def store_answer_clusters(submission_ids, clusters):
+    """
+    Record on the StudentAnswer rows of `submission_ids` which submission's
+    answer each one was graded with. `clusters` maps (qid, sub_id) to
+    {member submission id: representative submission id}; answers not in it
+    are cleared.
+    """
+    with transaction.atomic():
+        StudentAnswer.objects.filter(
+            submission_id__in=submission_ids, cluster_representative__isnull=False,
+        ).update(cluster_representative=None)
+        for (qid, sub_id), members in clusters.items():
+            by_representative = {}
+            for member, representative in members.items():
+                by_representative.setdefault(representative, []).append(member)
+            for representative, member_ids in by_representative.items():
+                StudentAnswer.objects.filter(
+                    submission_id__in=member_ids, question_number=qid, subpart=sub_id or '',
+                ).update(cluster_representative_id=representative)
+
+
+def assignment_clusters(assignment, limit=None):
+    """
+    Clusters recorded for `assignment`, for display: a list of
+    (question label, representative student, [member students]), built from
+    at most `limit` member answers (the last cluster may be cut short).
+    """
+    rows = (
+        StudentAnswer.objects
+        .filter(submission__assignment=assignment, cluster_representative__isnull=False)
+        .select_related('submission__student', 'cluster_representative__student')
+        .order_by('question_number', 'subpart', 'cluster_representative_id', 'submission_id')
+    )
+    if limit is not None:
+        rows = rows[:limit]
+    clusters = []
+    current = None
+    for row in rows:
+        key = (row.question_number, row.subpart, row.cluster_representative_id)
+        if current is None or current[0] != key:
+            label = f"{row.question_number}({row.subpart})" if row.subpart else row.question_number
+            current = (key, label, row.cluster_representative.student, [])
+            clusters.append(current)
+        current[3].append(row.submission.student)
+    return [(label, representative, members) for _, label, representative, members in clusters]
@@ -0,0 +1,154 @@
+"""
+Serialized writer for grading results.
+
+SQLite allows one writer at a time. When several grading threads commit
+their own small transactions, they queue up on the database lock and, past
+the busy timeout, fail with "database is locked". Instead, every grading
+path in a process hands its results to one GradeWriter thread. The thread
+takes whatever has queued up while the previous commit ran (up to
+GRADING_WRITER_BATCH submissions) and writes it with
+save_many_question_results in a single transaction, so commits get larger
+rather than more frequent as grading speeds up.
+
+submit() returns a Future that resolves once the submission is committed;
+callers wait on it before treating the submission as saved. Code already
+inside a transaction saves inline: the writer's own connection could not
+see that transaction's rows and would wait on its lock.
+"""
+import queue
+import threading
+from collections import Counter
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import connection
+
+from assignments.metrics import register_collector
+
+_STOP = object()
+
+
+class GradeWriter:
+    """One thread that commits queued (submission, per_question_results) pairs in batches."""
+
+    def __init__(self, batch_size=None):
+        self.batch_size = max(1, batch_size or settings.GRADING_WRITER_BATCH)
+        self.stats = Counter()
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, submission, per_question_results):
+        future = Future()
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="grade-writer", daemon=True)
+                self._thread.start()
+            self._queue.put((submission, per_question_results, future))
+        return future
+
+    def save(self, graded):
+        """Submit every pair and wait until all of them are committed."""
+        futures = [self.submit(submission, results) for submission, results in graded]
+        for future in futures:
+            future.result()
+
+    def close(self):
+        """Write what is queued, then stop the thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is None:
+                return
+            self._queue.put(_STOP)
+        thread.join()
+
+    def _run(self):
+        try:
+            while True:
+                item = self._queue.get()
+                if item is _STOP:
+                    return
+                batch = [item]
+                stop = False
+                while len(batch) < self.batch_size:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stop = True
+                        break
+                    batch.append(item)
+                self._write(batch)
+                if stop:
+                    return
+        finally:
+            connection.close()
+
+    def _write(self, batch):
+        from assignments.utils import save_many_question_results
+
+        try:
+            save_many_question_results((submission, results) for submission, results, _ in batch)
+        except Exception as exc:
+            print(f"[grade_writer] batch of {len(batch)} failed: {exc}")
+            self.stats["failed"] += len(batch)
+            for _, _, future in batch:
+                future.set_exception(exc)
+            return
+
+        self.stats["batches"] += 1
+        self.stats["submissions"] += len(batch)
+        for _, _, future in batch:
+            future.set_result(None)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_grade_writer():
+    """
+    The process-wide GradeWriter, or None if GRADING_SERIAL_WRITER is off or
+    the caller is inside a transaction (then results must be saved inline).
+    """
+    global _writer
+    if not settings.GRADING_SERIAL_WRITER or connection.in_atomic_block:
+        return None
+    with _writer_lock:
+        if _writer is None:
+            _writer = GradeWriter()
+        return _writer
+
+
+def _collect_writer_stats():
+    writer = _writer
+    if writer is None:
+        return []
+    return [
+        ("grading_writer_batches_total", "counter", "Transactions committed by the grade writer.",
+         [({}, writer.stats["batches"])]),
+        ("grading_writer_queue_depth", "gauge", "Graded submissions waiting for the grade writer.",
+         [({}, writer._queue.qsize())]),
+    ]
+
+
+register_collector(_collect_writer_stats)
+
+
+def submit_graded(submission, per_question_results):
+    """Queue one graded submission on the shared writer, or save it inline; returns a Future."""
+    writer = get_grade_writer()
+    if writer is not None:
+        return writer.submit(submission, per_question_results)
+
+    from assignments.utils import save_question_results
+
+    future = Future()
+    try:
+        save_question_results(submission, per_question_results)
+    except Exception as exc:
+        future.set_exception(exc)
+    else:
+        future.set_result(None)
+    return future
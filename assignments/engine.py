@@ -0,0 +1,485 @@
+"""
+Concurrent grading engine.
+
+A submission is flattened into independent grading items (one per question,
+or one per sub-part), and the model calls for every item of every submission
+are fanned out over a bounded thread pool. Results are always handed back in
+the original order, so callers can rebuild exactly the same per-question rows
+the old serial loop produced.
+
+Items whose teacher answer has a checkable type (MCQ letter, number,
+true/false, keyword list; see assignments/answer_types.py), and blank student
+answers, are graded locally. The free-form answers to each question are then
+prescreened together by TF-IDF similarity to the teacher answer
+(assignments/prescreen.py), which settles near-verbatim copies and answers
+with no overlap. Near-duplicate answers among the rest are clustered
+(assignments/clustering.py) and graded once per cluster. Before any model
+call, the remaining answers are checked against the persistent grade cache
+(assignments/grade_cache.py), and identical answers within one run are
+graded once.
+"""
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from assignments.answer_types import classify_answer, grade_locally
+from assignments.clustering import cluster_texts
+from assignments.grade_cache import (
+    get_model_name, grade_cache_key, lookup_grades, prune_grade_cache, store_grades, touch_grades,
+)
+from assignments.grader import (
+    GradingError, estimate_tokens, grade_answer, grade_question_batch, grade_submission_batch,
+)
+from assignments.metrics import ENGINE_EVENTS
+from assignments.prescreen import prescreen_answers
+
+GRADING_MODES = ("question", "submission", "class")
+
+# The prompt each mode grades with (grader.call_model's `kind`); part of the
+# grade cache key, so batched and single verdicts are cached apart.
+PROMPT_KINDS = {"question": "single", "submission": "submission_batch", "class": "question_batch"}
+
+_stats_lock = threading.Lock()
+
+
+def get_max_in_flight(max_in_flight=None):
+    """Resolve the concurrency limit (argument → settings → 8)."""
+    if max_in_flight is None:
+        max_in_flight = getattr(settings, "GRADING_MAX_IN_FLIGHT", 8)
+    return max(1, int(max_in_flight))
+
+
+def get_grading_mode(mode=None):
+    """
+    Resolve how uncached items are sent to the model (argument → settings):
+
+      • "question"   – one call per question / sub-part (default)
+      • "submission" – one structured call per submission, with per-item
+                       fallback for anything that fails validation
+      • "class"      – one structured call per question for a batch of
+                       students (see plan_question_batches)
+    """
+    if mode is None:
+        mode = getattr(settings, "GRADING_MODE", "question")
+    if mode not in GRADING_MODES:
+        raise ValueError(f"Unknown grading mode {mode!r}; expected one of {', '.join(GRADING_MODES)}")
+    return mode
+
+
+def get_batch_limits(batch_size=None, token_budget=None):
+    """Resolve the "class" mode batch size and token budget (argument → settings)."""
+    if batch_size is None:
+        batch_size = getattr(settings, "GRADING_BATCH_SIZE", 10)
+    if token_budget is None:
+        token_budget = getattr(settings, "GRADING_BATCH_TOKEN_BUDGET", 6000)
+    return max(1, int(batch_size)), max(1, int(token_budget))
+
+
+def plan_question_batches(items, batch_size, token_budget):
+    """
+    Split items that share one teacher answer into batches of at most
+    `batch_size` students whose estimated prompt size (teacher answer sent
+    once + every student answer) stays within `token_budget`. A single answer
+    larger than the budget still gets a batch of its own.
+    """
+    if not items:
+        return []
+    base = estimate_tokens(items[0]["teacher_answer"])
+
+    batches = []
+    current, used = [], base
+    for item in items:
+        cost = estimate_tokens(item["student_answer"])
+        if current and (len(current) >= batch_size or used + cost > token_budget):
+            batches.append(current)
+            current, used = [], base
+        current.append(item)
+        used += cost
+    batches.append(current)
+    return batches
+
+
+def build_grading_items(teacher_data, student_data):
+    """
+    Turn a parsed teacher bank and a parsed student bank into a flat list of
+    grading items, in teacher order.
+    """
+    items = []
+    for qid, q_t in teacher_data.items():
+        s_q = student_data.get(qid, {})
+
+        # ——— With sub-parts ———
+        if q_t["subparts"]:
+            for sub_id, sub_t in q_t["subparts"].items():
+                items.append({
+                    "qid":            qid,
+                    "sub_id":         sub_id,
+                    "teacher_answer": sub_t["answer"],
+                    "student_answer": s_q.get("subparts", {}).get(sub_id, {}).get("answer", ""),
+                    "marks":          sub_t["marks"],
+                    "is_objective":   sub_t["marks"] == 1,
+                    "answer_type":    classify_answer(sub_t["answer"], sub_t["marks"], sub_t["marks"] == 1),
+                })
+
+        # ——— No sub-parts ———
+        else:
+            items.append({
+                "qid":            qid,
+                "sub_id":         None,
+                "teacher_answer": q_t["answer"],
+                "student_answer": s_q.get("answer", ""),
+                "marks":          q_t["marks"],
+                "is_objective":   False,
+                "answer_type":    classify_answer(q_t["answer"], q_t["marks"]),
+            })
+    return items
+
+
+def collect_question_results(items, results):
+    """
+    Fold item-level (score, feedback) pairs back into per-question rows:
+    a list of (qid, max_marks, obtained_marks, feedback).
+    """
+    per_question = {}
+    for item, (score, fb) in zip(items, results):
+        row = per_question.setdefault(item["qid"], [0.0, 0.0, []])
+        row[0] += item["marks"]
+        row[1] += score
+        row[2].append(fb if item["sub_id"] is None else f"({item['sub_id']}) {fb}")
+
+    return [
+        (qid, q_max, q_got, " | ".join(q_fb))
+        for qid, (q_max, q_got, q_fb) in per_question.items()
+    ]
+
+
+def item_id(item):
+    """Stable id of an item within one submission, e.g. "Q3" or "Q3(ii)"."""
+    return item["qid"] if item["sub_id"] is None else f"{item['qid']}({item['sub_id']})"
+
+
+def _bump(stats, key, amount=1):
+    with _stats_lock:
+        stats[key] += amount
+    ENGINE_EVENTS.inc(amount, event=key)
+
+
+def _count_reuse(stats, item):
+    """An item graded by an earlier item's lookup or call; cluster members are already clustered_items."""
+    if not item.get("clustered"):
+        _bump(stats, "duplicate_items")
+
+
+def _grade_item(item, model):
+    return grade_answer(
+        item["teacher_answer"],
+        item["student_answer"],
+        item["marks"],
+        model,
+        item["is_objective"],
+    )
+
+
+def _grade_submission_items(items, model, stats):
+    """
+    Grade all `items` of one submission in a single structured call and
+    re-grade one by one only the items the model got wrong or left out.
+    """
+    batch = [dict(item, id=item_id(item)) for item in items]
+    graded = grade_submission_batch(batch, model)
+
+    results = []
+    for item in batch:
+        result = graded.get(item["id"])
+        if result is None:
+            _bump(stats, "batch_fallbacks")
+            _bump(stats, "llm_calls")
+            result = _grade_item(item, model)
+        results.append(result)
+    return results
+
+
+def _grade_question_items(items, model, stats):
+    """
+    Grade one question for several students in a single call (the items
+    share a teacher answer) and re-grade one by one any the model dropped.
+    """
+    answers = [(f"s{n}", item["student_answer"]) for n, item in enumerate(items, 1)]
+    graded = grade_question_batch(items[0]["teacher_answer"], items[0]["marks"], answers, model)
+
+    results = []
+    for (answer_id, _), item in zip(answers, items):
+        result = graded.get(answer_id)
+        if result is None:
+            _bump(stats, "batch_fallbacks")
+            _bump(stats, "llm_calls")
+            try:
+                result = _grade_item(item, model)
+            except GradingError as exc:
+                # Only this student's submission fails; see _Pending.result.
+                result = exc
+        results.append(result)
+    return results
+
+
+class _Pending:
+    """
+    A result slot backed by a Future (or by one entry of a Future's list).
+    A list entry may be a GradingError, raised for that slot alone.
+    """
+
+    def __init__(self, future, index=None):
+        self.future = future
+        self.index = index
+
+    def result(self):
+        value = self.future.result()
+        if self.index is None:
+            return value
+        if isinstance(value[self.index], GradingError):
+            raise value[self.index]
+        return value[self.index]
+
+
+def _allow_concurrency(model, workers):
+    allow = getattr(model, "allow_concurrency", None)
+    if allow:
+        allow(workers)
+
+
+def _client_snapshot(model):
+    snapshot = getattr(model, "stats_snapshot", None)
+    return snapshot() if snapshot else None
+
+
+def _merge_client_stats(stats, model, before):
+    """Add the rate-limited client's retry / throttle counters for this run."""
+    if before is None:
+        return
+    after = _client_snapshot(model)
+    for key in ("retries", "throttled", "throttle_seconds", "breaker_trips"):
+        _bump(stats, key, after[key] - before[key])
+
+
+def format_run_stats(stats):
+    """One-line summary of a grading run, e.g. for print() or command output."""
+    lookups = stats["cache_hits"] + stats["cache_misses"]
+    hit_rate = 100.0 * stats["cache_hits"] / lookups if lookups else 0.0
+    local_rate = 100.0 * stats["local_items"] / stats["items"] if stats["items"] else 0.0
+    return (
+        f"{stats['items']} items ({stats['local_items']} = {local_rate:.1f}% graded locally, "
+        f"{stats['duplicate_items']} repeated, {stats['clustered_items']} with a near-duplicate), "
+        f"{stats['llm_calls']} model calls "
+        f"({stats['batch_fallbacks']} batch fallbacks), "
+        f"cache hit-rate {hit_rate:.1f}% ({stats['cache_hits']}/{lookups}), "
+        f"{stats['retries']} retries, {stats['throttle_seconds']:.1f}s throttled"
+        + (f", {stats['failed_submissions']} left ungraded after grading errors"
+           if stats['failed_submissions'] else "")
+    )
+
+
+def grade_submissions(teacher_data, student_banks, model, max_in_flight=None, stats=None,
+                      use_cache=True, mode=None, batch_size=None, token_budget=None, clusters=None,
+                      failures=None):
+    """
+    Grade many submissions against one teacher bank.
+
+    `student_banks` is a list of (submission, parsed student data) pairs.
+    Non-objective items are first looked up in the grade cache; identical
+    answers within the run share a single lookup or model call (counted as
+    duplicate_items, not cache hits). The remaining calls are
+    queued on the thread pool up front, and this generator then yields
+    (submission, per_question_results) in the original submission order as
+    soon as that submission's items have finished, so the caller can persist
+    early submissions while later ones are still in flight.
+
+    In "submission" mode (see get_grading_mode) all uncached items of one
+    submission go to the model in a single structured call; in "class" mode
+    the uncached answers to each question are batched across students.
+
+    If the model becomes unavailable (llm_client.GradingUnavailable) the
+    generator raises instead of yielding zero marks; submissions already
+    yielded are unaffected. A submission with an answer the model gave no
+    usable grade for (grader.GradingError) is not yielded at all; pass a
+    dict as `failures` to receive {submission: error message} for those.
+
+    Pass a Counter as `stats` to collect item / call / cache / retry counts,
+    and use_cache=False to bypass the persistent grade cache (benchmarks).
+    Pass a dict as `clusters` to receive the near-duplicate clusters, as
+    {(qid, sub_id): {member submission: representative submission}}; it is
+    filled before the first submission is yielded.
+    """
+    if stats is None:
+        stats = Counter()
+    workers = get_max_in_flight(max_in_flight)
+    mode = get_grading_mode(mode)
+    batch_size, token_budget = get_batch_limits(batch_size, token_budget)
+    model_name = get_model_name(model)
+
+    local_fast_path = settings.GRADING_LOCAL_FAST_PATH
+    planned = []
+    free_form = {}    # (qid, sub_id) → [(submission, item), ...] left for the model
+    for submission, student_data in student_banks:
+        items = build_grading_items(teacher_data, student_data)
+        for item in items:
+            local = None
+            if local_fast_path:
+                local = grade_locally(
+                    item["teacher_answer"], item["student_answer"], item["marks"], item["answer_type"]
+                )
+            if local is not None:
+                item["local_result"] = local
+                item["local_kind"] = item["answer_type"] if item["student_answer"].strip() else "blank"
+            elif not item["is_objective"]:
+                free_form.setdefault((item["qid"], item["sub_id"]), []).append((submission, item))
+        planned.append((submission, items))
+
+    for question, question_items in free_form.items():
+        # One vectorised similarity pass per question over the whole class.
+        results = [None] * len(question_items)
+        if settings.GRADING_PRESCREEN:
+            results = prescreen_answers(
+                question_items[0][1]["teacher_answer"],
+                [item["student_answer"] for _, item in question_items],
+                question_items[0][1]["marks"],
+            )
+        remaining = []
+        for (submission, item), result in zip(question_items, results):
+            if result is not None:
+                item["local_result"] = result
+                item["local_kind"] = "prescreen_full" if result[0] else "prescreen_zero"
+            else:
+                item["cache_key"] = grade_cache_key(
+                    item["teacher_answer"], item["student_answer"], item["marks"], model_name, PROMPT_KINDS[mode]
+                )
+                remaining.append((submission, item))
+
+        # Members of a near-duplicate cluster share their representative's
+        # key, so they are graded by its lookup or model call.
+        if settings.GRADING_CLUSTERING and len(remaining) > 1:
+            labels = cluster_texts([item["student_answer"] for _, item in remaining])
+            for (submission, item), label in zip(remaining, labels):
+                representative, rep_item = remaining[label]
+                if rep_item is item:
+                    continue
+                _bump(stats, "clustered_items")
+                item["cache_key"] = rep_item["cache_key"]
+                item["clustered"] = True
+                if clusters is not None:
+                    clusters.setdefault(question, {})[submission] = representative
+
+    cached = {}
+    if use_cache:
+        cached = lookup_grades({
+            item["cache_key"] for _, items in planned for item in items if "cache_key" in item
+        })
+    hit_keys = set()
+    stored_keys = set()
+
+    _allow_concurrency(model, workers)
+    client_before = _client_snapshot(model)
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        in_flight = {}    # cache key → _Pending, once dispatched
+        queued = {}       # cache key → (slots, position), until dispatched
+        by_question = {}  # "class" mode: (qid, sub_id) → [item, ...]
+        pending = []
+        for submission, items in planned:
+            slots = [None] * len(items)
+            misses = []       # positions that need the model
+            aliases = []      # (position, slots, position) of an identical queued answer
+
+            for pos, item in enumerate(items):
+                _bump(stats, "items")
+                key = item.get("cache_key")
+                if "local_result" in item:
+                    _bump(stats, "local_items")
+                    _bump(stats, f"local_{item['local_kind']}")
+                    slots[pos] = item["local_result"]
+                elif key is None:
+                    slots[pos] = _grade_item(item, model)
+                elif key in cached:
+                    # One lookup per distinct answer: repeats are duplicates, not hits.
+                    if key in hit_keys:
+                        _count_reuse(stats, item)
+                    else:
+                        _bump(stats, "cache_hits")
+                    hit_keys.add(key)
+                    slots[pos] = cached[key]
+                elif key in in_flight:
+                    _count_reuse(stats, item)
+                    slots[pos] = in_flight[key]
+                elif key in queued:
+                    _count_reuse(stats, item)
+                    aliases.append((pos, *queued[key]))
+                else:
+                    _bump(stats, "cache_misses")
+                    queued[key] = (slots, pos)
+                    misses.append(pos)
+            pending.append((submission, items, slots, aliases))
+
+            # ——— Dispatch the misses ———
+            if mode == "class":
+                for pos in misses:
+                    by_question.setdefault((items[pos]["qid"], items[pos]["sub_id"]), []).append(items[pos])
+                continue
+            if mode == "submission" and len(misses) > 1:
+                _bump(stats, "llm_calls")
+                future = pool.submit(_grade_submission_items, [items[pos] for pos in misses], model, stats)
+                for index, pos in enumerate(misses):
+                    slots[pos] = _Pending(future, index)
+            else:
+                for pos in misses:
+                    _bump(stats, "llm_calls")
+                    slots[pos] = _Pending(pool.submit(_grade_item, items[pos], model))
+
+            for pos in misses:
+                in_flight[items[pos]["cache_key"]] = slots[pos]
+
+        # ——— "class" mode: one call per question per batch of students ———
+        for question_items in by_question.values():
+            for batch in plan_question_batches(question_items, batch_size, token_budget):
+                _bump(stats, "llm_calls")
+                if len(batch) == 1:
+                    future, indexed = pool.submit(_grade_item, batch[0], model), False
+                else:
+                    future, indexed = pool.submit(_grade_question_items, batch, model, stats), True
+                for index, item in enumerate(batch):
+                    slots, pos = queued[item["cache_key"]]
+                    slots[pos] = _Pending(future, index if indexed else None)
+
+        for submission, items, slots, aliases in pending:
+            for pos, other_slots, other_pos in aliases:
+                slots[pos] = other_slots[other_pos]
+            try:
+                results = [slot.result() if isinstance(slot, _Pending) else slot for slot in slots]
+            except GradingError as exc:
+                _bump(stats, "failed_submissions")
+                if failures is not None:
+                    failures[submission] = str(exc)
+                continue
+
+            fresh = []
+            for item, (score, fb) in zip(items, results):
+                key = item.get("cache_key")
+                if key is not None and key not in cached and key not in stored_keys:
+                    stored_keys.add(key)
+                    fresh.append((key, item["marks"], score, fb))
+            if use_cache:
+                store_grades(fresh, model_name)
+
+            yield submission, collect_question_results(items, results)
+
+    except BaseException:
+        # Model unavailable, or the caller stopped early: drop queued calls.
+        pool.shutdown(wait=True, cancel_futures=True)
+        raise
+    finally:
+        pool.shutdown(wait=True)
+        _merge_client_stats(stats, model, client_before)
+
+    if use_cache:
+        touch_grades(hit_keys)
+        prune_grade_cache()
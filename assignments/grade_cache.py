@@ -0,0 +1,102 @@
+"""
+Persistent cache of model grades.
+
+Many students give the same short answer, so before calling the model the
+grading engine looks each (teacher answer, student answer, max marks) tuple
+up here. Keys are a SHA-256 over whitespace-normalised answers, the max
+marks, the model name, the prompt kind (single or batched, see
+engine.PROMPT_KINDS) and PROMPT_VERSION, so changing any of them misses.
+"""
+import hashlib
+import json
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils.timezone import now
+
+from assignments.grader import PROMPT_VERSION
+from assignments.models import GradeCache
+
+_WHITESPACE = re.compile(r"\s+")
+
+# Keep IN (...) lists well below SQLite's bound-parameter limit.
+_CHUNK = 500
+
+
+def _normalise(text):
+    return _WHITESPACE.sub(" ", text or "").strip()
+
+
+def get_model_name(model):
+    """Best-effort name of a model object, used as part of the cache key."""
+    return str(getattr(model, "model_name", None) or getattr(model, "model", None) or type(model).__name__)
+
+
+def grade_cache_key(teacher_ans, student_ans, marks, model_name, prompt_kind="single"):
+    payload = json.dumps(
+        [PROMPT_VERSION, prompt_kind, model_name, float(marks), _normalise(teacher_ans), _normalise(student_ans)],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _ttl_cutoff():
+    return now() - timedelta(days=getattr(settings, "GRADE_CACHE_TTL_DAYS", 30))
+
+
+def _chunks(seq):
+    seq = list(seq)
+    for start in range(0, len(seq), _CHUNK):
+        yield seq[start:start + _CHUNK]
+
+
+def lookup_grades(keys):
+    """Return {key: (score, feedback)} for every key with a live cache entry."""
+    found = {}
+    cutoff = _ttl_cutoff()
+    for chunk in _chunks(keys):
+        rows = GradeCache.objects.filter(key__in=chunk, created_at__gte=cutoff)
+        for key, score, feedback in rows.values_list("key", "score", "feedback"):
+            found[key] = (score, feedback)
+    return found
+
+
+def store_grades(entries, model_name):
+    """
+    Save freshly computed grades. `entries` is an iterable of
+    (key, max_marks, score, feedback). An expired row with the same key is
+    replaced, so the new grade is live.
+    """
+    rows = [
+        GradeCache(key=key, model_name=model_name, max_marks=marks, score=score, feedback=feedback)
+        for key, marks, score, feedback in entries
+    ]
+    if rows:
+        GradeCache.objects.bulk_create(
+            rows, update_conflicts=True, unique_fields=["key"],
+            update_fields=["model_name", "max_marks", "score", "feedback", "hits", "created_at", "last_used_at"],
+        )
+
+
+def touch_grades(keys):
+    """Record hits so that eviction keeps frequently reused grades."""
+    stamp = now()
+    for chunk in _chunks(keys):
+        GradeCache.objects.filter(key__in=chunk).update(hits=F("hits") + 1, last_used_at=stamp)
+
+
+def prune_grade_cache():
+    """Drop expired rows, then the least recently used ones beyond the size limit."""
+    GradeCache.objects.filter(created_at__lt=_ttl_cutoff()).delete()
+
+    limit = getattr(settings, "GRADE_CACHE_MAX_ENTRIES", 100000)
+    boundary = (
+        GradeCache.objects.order_by("-last_used_at", "-id")
+        .values_list("last_used_at", "id")[limit:limit + 1]
+    )
+    for last_used_at, row_id in boundary:
+        GradeCache.objects.filter(
+            Q(last_used_at__lt=last_used_at) | Q(last_used_at=last_used_at, id__lte=row_id)
+        ).delete()
@@ -0,0 +1,84 @@
+"""
+Incremental per-assignment grade statistics (AssignmentStats).
+
+Every write that grades or re-marks submissions reports the change to
+record_grade_changes() in the same transaction. Each change removes the old
+grade (if the submission was already graded) from the running count, sum,
+sum of squares and histogram, then adds the new one. Min/max are recomputed
+with one aggregate only when the removed grade was an extreme. A missing row,
+or a change in the assignment's total marks (which moves the histogram
+buckets), triggers a full rebuild instead.
+"""
+from django.db.models import Max, Min
+
+from assignments.models import AssignmentStats, StudentSubmission
+
+
+def bucket_index(grade, max_marks, buckets=AssignmentStats.HISTOGRAM_BUCKETS):
+    if max_marks <= 0:
+        return 0
+    return min(buckets - 1, max(0, int(grade / max_marks * buckets)))
+
+
+def _add(stats, grade, sign):
+    stats.count += sign
+    stats.total += sign * grade
+    stats.total_squares += sign * grade * grade
+    stats.histogram[bucket_index(grade, stats.max_marks)] += sign
+
+
+def rebuild_assignment_stats(assignment):
+    """Recompute an assignment's stats from its graded submissions."""
+    stats = AssignmentStats(assignment=assignment, max_marks=assignment.total_marks or 0)
+    stats.histogram = [0] * AssignmentStats.HISTOGRAM_BUCKETS
+    grades = StudentSubmission.objects.filter(assignment=assignment, graded=True).values_list('grade', flat=True)
+    for grade in grades:
+        _add(stats, grade, 1)
+        stats.min_grade = grade if stats.min_grade is None else min(stats.min_grade, grade)
+        stats.max_grade = grade if stats.max_grade is None else max(stats.max_grade, grade)
+
+    AssignmentStats.objects.update_or_create(
+        assignment=assignment,
+        defaults={
+            field: getattr(stats, field)
+            for field in ('count', 'total', 'total_squares', 'min_grade', 'max_grade', 'max_marks', 'histogram')
+        },
+    )
+    return stats
+
+
+def record_grade_changes(changes):
+    """
+    Fold grade changes into the stats rows. `changes` is a list of
+    (submission, old_grade) pairs, where old_grade is None if the submission
+    was not graded before, and submission.grade is the saved new grade.
+    Must run inside the transaction that wrote the submissions, after the
+    writes, so a rebuild sees the new grades and the row lock holds.
+    """
+    by_assignment = {}
+    for submission, old_grade in changes:
+        by_assignment.setdefault(submission.assignment_id, (submission.assignment, []))[1].append(
+            (old_grade, submission.grade)
+        )
+
+    for assignment, grade_changes in by_assignment.values():
+        stats = AssignmentStats.objects.select_for_update().filter(assignment=assignment).first()
+        if stats is None or stats.max_marks != (assignment.total_marks or 0):
+            rebuild_assignment_stats(assignment)
+            continue
+
+        stale_extremes = False
+        for old_grade, new_grade in grade_changes:
+            if old_grade is not None:
+                _add(stats, old_grade, -1)
+                stale_extremes |= old_grade in (stats.min_grade, stats.max_grade)
+            _add(stats, new_grade, 1)
+            stats.min_grade = new_grade if stats.min_grade is None else min(stats.min_grade, new_grade)
+            stats.max_grade = new_grade if stats.max_grade is None else max(stats.max_grade, new_grade)
+
+        if stale_extremes:
+            extremes = StudentSubmission.objects.filter(assignment=assignment, graded=True).aggregate(
+                low=Min('grade'), high=Max('grade'),
+            )
+            stats.min_grade, stats.max_grade = extremes['low'], extremes['high']
+        stats.save()
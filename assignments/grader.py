@@ -1,4 +1,5 @@
 import fitz
+import json
 import re
 import time
 import random
@@ -6,97 +7,271 @@ import random
 import google.generativeai as genai
 import os
 
+from assignments.llm_client import (
+    GradingUnavailable, ModelConfigurationError, get_shared_client, is_configuration_error,
+)
+from assignments.metrics import MODEL_CALL_SECONDS, MODEL_CALLS, MODEL_TOKENS, PDF_SECONDS
+
+GRADING_MODEL_NAME = "gemini-2.0-flash"
+
+# Bump whenever parse_question_bank's output changes, so cached banks
+# (see assignments/pdf_cache.py) are not reused across parser versions.
+PARSER_VERSION = 2
+
+# Bump whenever the grading prompt changes, so cached grades
+# (see assignments/grade_cache.py) are not reused across prompts.
+PROMPT_VERSION = 1
+
+
+def get_grading_model(model_name=GRADING_MODEL_NAME, backend=None):
+    """
+    Return the model used for grading from the GRADING_BACKEND backend
+    (see assignments/backends.py), wrapped in the process-wide rate-limited
+    client (see assignments/llm_client.py).
+    """
+    from django.conf import settings
+    from assignments.backends import build_model
+
+    backend = backend or getattr(settings, "GRADING_BACKEND", "gemini")
+    return get_shared_client(f"{backend}:{model_name}", lambda: build_model(backend, model_name))
+
+
 def extract_text_from_pdf(pdf_path):
-    doc = fitz.open(pdf_path)
-    text = ''
-    for page in doc:
-        text += page.get_text()
-    return text
+    with PDF_SECONDS.time(phase="extract"), fitz.open(pdf_path) as doc:
+        return ''.join(page.get_text() for page in doc)
 
 
-def parse_question_bank(text):
-    questions = {}
-    current_q_no = None
-    current_question = ""
-    current_marks = 0
-    subparts = {}
-    question_lines = text.strip().split('\n')
-
-    for line in question_lines:
+def iter_pdf_lines(pdf_path, timings=None):
+    """
+    Yield the lines of extract_text_from_pdf(pdf_path).split('\n') one page
+    at a time, without holding the whole document's text. A page that does
+    not end with a newline carries its last partial line over to the next.
+    Seconds spent in PyMuPDF are added to timings["extract"] if given.
+    """
+    started = time.perf_counter()
+    with fitz.open(pdf_path) as doc:
+        carry = ''
+        for page in doc:
+            text = page.get_text()
+            if timings is not None:
+                timings["extract"] = timings.get("extract", 0.0) + time.perf_counter() - started
+            lines = (carry + text).split('\n')
+            carry = lines.pop()
+            yield from lines
+            started = time.perf_counter()
+        yield carry
+
+
+# Sub-part numerals: i, ii, iii, iv, v … xxxix, plus the legacy i+ form (iiii).
+_ROMAN = r'(?=[ivx])x{0,3}(?:ix|iv|v?i{0,3})|i+'
+
+# One anchored alternation per line, tried in priority order:
+# "Q3. text (5 marks)", "(ii) text (2 marks)", "Ans (ii): text", "Ans: text".
+_LINE_TOKEN = re.compile(
+    r'(?i:(?P<q_no>Q\d+)\.\s*(?P<q_text>.*?)\s*\((?P<q_marks>\d+)\s*marks\))'
+    rf'|\((?P<sub_no>{_ROMAN})\)\s*(?P<sub_text>.*?)\s*\((?P<sub_marks>\d+)\s*marks\)'
+    rf'|Ans\s*\((?P<ans_no>{_ROMAN})\)\s*:\s*(?P<ans_part>.*)'
+    r'|Ans\s*:\s*(?P<ans>.*)'
+)
+
+
+class QuestionBankParser:
+    """
+    Line-at-a-time state machine behind parse_question_bank: feed() lines
+    in order, then close() returns the questions dict.
+
+    A line that matches no token continues the main answer if one has
+    started, and otherwise fills the first sub-part still without an
+    answer. That sub-part is tracked with a cursor into the sub-parts in
+    definition order, so finding it is amortised O(1) instead of a scan.
+    """
+
+    def __init__(self):
+        self.questions = {}
+        self.current_q_no = None
+        self.current_question = ""
+        self.current_marks = 0
+        self.current_answer = ""
+        self._reset_subparts()
+
+    def _reset_subparts(self):
+        self.subparts = {}
+        self.subpart_order = []     # sub-part dicts in definition order
+        self.subpart_pos = {}       # roman → index in subpart_order
+        self.open_pos = 0           # no sub-part before this index is empty
+
+    def _flush_question(self):
+        self.questions[self.current_q_no] = {
+            'question': self.current_question,
+            'marks': self.current_marks,
+            'answer': self.current_answer,
+            'subparts': self.subparts
+        }
+
+    def _set_subpart_answer(self, roman, answer):
+        pos = self.subpart_pos[roman]
+        self.subpart_order[pos]['answer'] = answer
+        if answer == "":
+            self.open_pos = min(self.open_pos, pos)
+
+    def _open_subpart(self):
+        order = self.subpart_order
+        while self.open_pos < len(order) and order[self.open_pos]['answer'] != "":
+            self.open_pos += 1
+        return order[self.open_pos] if self.open_pos < len(order) else None
+
+    def feed(self, line):
         line = line.strip()
+        token = _LINE_TOKEN.match(line)
+
+        if token is None:
+            if self.current_answer != "":
+                self.current_answer += ' ' + line
+            else:
+                subpart = self._open_subpart()
+                if subpart is not None:
+                    subpart['answer'] = line
+
+        elif token['q_no'] is not None:
+            if self.current_q_no:
+                self._flush_question()
+                self._reset_subparts()
+            self.current_q_no = token['q_no']
+            self.current_question = token['q_text'].strip()
+            self.current_marks = int(token['q_marks'])
+            self.current_answer = ""
+
+        elif token['sub_no'] is not None:
+            roman = token['sub_no']
+            subpart = {'question': token['sub_text'].strip(), 'marks': int(token['sub_marks']), 'answer': ''}
+            if roman not in self.subpart_pos:
+                self.subpart_pos[roman] = len(self.subpart_order)
+                self.subpart_order.append(subpart)
+            else:
+                # Redefinition keeps the sub-part's original place, as dict assignment does.
+                self.subpart_order[self.subpart_pos[roman]] = subpart
+            self.subparts[roman] = subpart
+            self._set_subpart_answer(roman, '')
+
+        elif token['ans_no'] is not None:
+            roman = token['ans_no']
+            if roman in self.subparts:
+                self._set_subpart_answer(roman, token['ans_part'].strip())
 
-        main_q_match = re.match(r'^(Q\d+)\.\s*(.*?)\s*\((\d+)\s*marks\)', line, re.IGNORECASE)
-        if main_q_match:
-            if current_q_no:
-                questions[current_q_no] = {
-                    'question': current_question,
-                    'marks': current_marks,
-                    'answer': current_answer,
-                    'subparts': subparts
-                }
-                subparts = {}
-
-            current_q_no = main_q_match.group(1)
-            current_question = main_q_match.group(2).strip()
-            current_marks = int(main_q_match.group(3))
-            current_answer = ""
-            continue
+        else:
+            self.current_answer = token['ans'].strip()
 
-        subpart_match = re.match(r'^\((i+)\)\s*(.*?)\s*\((\d+)\s*marks\)', line)
-        if subpart_match:
-            roman = subpart_match.group(1)
-            sub_q = subpart_match.group(2).strip()
-            sub_m = int(subpart_match.group(3))
-            subparts[roman] = {'question': sub_q, 'marks': sub_m, 'answer': ''}
-            continue
+    def close(self):
+        if self.current_q_no:
+            self._flush_question()
+        return self.questions
 
-        ans_part_match = re.match(r'^Ans\s*\((i+)\)\s*:\s*(.*)', line)
-        if ans_part_match:
-            roman = ans_part_match.group(1)
-            ans_text = ans_part_match.group(2).strip()
-            if roman in subparts:
-                subparts[roman]['answer'] = ans_text
-            continue
 
-        ans_match = re.match(r'^Ans\s*:\s*(.*)', line)
-        if ans_match:
-            current_answer = ans_match.group(1).strip()
+def parse_question_lines(lines):
+    """
+    Parse an iterable of lines (e.g. iter_pdf_lines()) incrementally. Blank
+    lines at either end are ignored, exactly as parse_question_bank strips
+    its text: leading ones are skipped and blank runs are only fed once a
+    non-blank line follows them.
+    """
+    parser = QuestionBankParser()
+    started = False
+    pending_blanks = []
+    for line in lines:
+        if not line.strip():
+            if started:
+                pending_blanks.append(line)
             continue
+        started = True
+        for blank in pending_blanks:
+            parser.feed(blank)
+        pending_blanks.clear()
+        parser.feed(line)
+    return parser.close()
 
-        elif current_answer != "":
-            current_answer += ' ' + line
-
-        elif any(subparts.values()) and any(p['answer'] == "" for p in subparts.values()):
-            for key in subparts:
-                if subparts[key]['answer'] == "":
-                    subparts[key]['answer'] = line
-                    break
-
-    if current_q_no:
-        questions[current_q_no] = {
-            'question': current_question,
-            'marks': current_marks,
-            'answer': current_answer,
-            'subparts': subparts
-        }
 
-    return questions
+def parse_question_bank(text):
+    with PDF_SECONDS.time(phase="parse"):
+        return parse_question_lines(text.split('\n'))
 
 
-def grade_answer(teacher_ans, student_ans, marks, model, is_objective=False):
-    if is_objective:
-        return (marks if teacher_ans.strip().lower() == student_ans.strip().lower() else 0.0, f"Objective match: {'Correct' if teacher_ans.strip().lower() == student_ans.strip().lower() else 'Incorrect'}")
+def parse_question_bank_pdf(pdf_path):
+    """
+    Streaming equivalent of parse_question_bank(extract_text_from_pdf(pdf_path)).
+    Extraction and parsing are interleaved, and timed separately.
+    """
+    timings = {}
+    started = time.perf_counter()
+    try:
+        return parse_question_lines(iter_pdf_lines(pdf_path, timings))
+    finally:
+        extract = timings.get("extract", 0.0)
+        PDF_SECONDS.observe(extract, phase="extract")
+        PDF_SECONDS.observe(max(0.0, time.perf_counter() - started - extract), phase="parse")
 
-    prompt = f"""
-    You are an extremely strict grader.
 
-    Grade the student's answer compared to the teacher's answer. Maximum marks = {marks}. You may award partial marks (like 2.5 or 3.75). Use the scale below:
+def _usage(response, field):
+    usage = getattr(response, "usage_metadata", None)
+    return getattr(usage, field, None) if usage is not None else None
+
+
+class GradingError(Exception):
+    """The model gave no usable grade for an answer; it stays ungraded rather than scored zero."""
+
+
+def call_model(model, prompt, kind, **kwargs):
+    """
+    model.generate_content(prompt, **kwargs), recording the call's latency,
+    outcome and tokens under `kind` (single, submission_batch, question_batch).
+    Authentication and configuration errors raise ModelConfigurationError.
+    """
+    outcome = "error"
+    try:
+        with MODEL_CALL_SECONDS.time(kind=kind):
+            response = model.generate_content(prompt, **kwargs)
+        outcome = "ok"
+    except GradingUnavailable:
+        outcome = "unavailable"
+        raise
+    except Exception as exc:
+        if not is_configuration_error(exc):
+            raise
+        outcome = "unavailable"
+        raise ModelConfigurationError(f"Grading model rejected the request: {exc}") from exc
+    finally:
+        MODEL_CALLS.inc(kind=kind, outcome=outcome)
+
+    prompt_tokens = _usage(response, "prompt_token_count") or estimate_tokens(prompt)
+    response_tokens = _usage(response, "candidates_token_count")
+    if response_tokens is None:
+        try:
+            response_tokens = estimate_tokens(response.text)
+        except (AttributeError, ValueError):
+            # No text, e.g. a blocked response; the caller decides what that means.
+            response_tokens = 0
+    MODEL_TOKENS.inc(prompt_tokens, kind=kind, direction="prompt")
+    MODEL_TOKENS.inc(response_tokens, kind=kind, direction="response")
+    return response
+
+
+# Shared by every grading prompt, so single and batched grades cannot drift apart.
+GRADING_RUBRIC = """You may award partial marks (like 2.5 or 3.75). Use the scale below:
 
     - Full marks: Perfectly matches teacher's answer in content and depth.
     - Slightly less: Minor deviations but mostly correct.
     - Half marks: Basic understanding but missing minor elements.
     - Low marks: Many inaccuracies, shallow understanding and missing major elements.
-    - Zero: Completely wrong or irrelevant.
+    - Zero: Completely wrong or irrelevant."""
+
+
+def grade_answer(teacher_ans, student_ans, marks, model, is_objective=False):
+    if is_objective:
+        return (marks if teacher_ans.strip().lower() == student_ans.strip().lower() else 0.0, f"Objective match: {'Correct' if teacher_ans.strip().lower() == student_ans.strip().lower() else 'Incorrect'}")
+
+    prompt = f"""
+    You are an extremely strict grader.
+
+    Grade the student's answer compared to the teacher's answer. Maximum marks = {marks}. {GRADING_RUBRIC}
 
     Teacher's Answer:
     {teacher_ans}
@@ -110,22 +285,188 @@ def grade_answer(teacher_ans, student_ans, marks, model, is_objective=False):
     Good explanation but lacks depth on edge cases.
     """
 
+    # Rate limited, model down or misconfigured (GradingUnavailable), or no
+    # usable grade (GradingError): never turn that into a zero.
     try:
-        response = model.generate_content(prompt)
+        response = call_model(model, prompt, "single")
         # response = model.invoke(prompt)
         raw = response.text.strip()
-        score_line = raw.split('\n')[0]
-        feedback = '\n'.join(raw.split('\n')[1:])
-        score = float(score_line.strip())
-        if score < 0 or score > marks:
-            score = 0.0
-            feedback = f"Invalid score parsed. Raw response:\n{raw}"
+    except GradingUnavailable:
+        raise
     except Exception as e:
-        score = 0.0
-        feedback = f"Error grading answer: {str(e)}"
+        raise GradingError(f"Error grading answer: {e}") from e
+
+    score_line = raw.split('\n')[0]
+    feedback = '\n'.join(raw.split('\n')[1:])
+    try:
+        score = float(score_line.strip())
+    except ValueError:
+        raise GradingError(f"No score in the model's response:\n{raw}") from None
+    if score < 0 or score > marks:
+        raise GradingError(f"Score {score} is outside 0–{marks}. Raw response:\n{raw}")
     return score, feedback
 
 
+# ───────────────────────────────────────────────
+# Batched (structured JSON) grading
+# ───────────────────────────────────────────────
+BATCH_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "results": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "id":       {"type": "string"},
+                    "score":    {"type": "number"},
+                    "feedback": {"type": "string"},
+                },
+                "required": ["id", "score", "feedback"],
+            },
+        },
+    },
+    "required": ["results"],
+}
+
+
+def _batch_generation_config():
+    return {
+        "response_mime_type": "application/json",
+        "response_schema": BATCH_RESPONSE_SCHEMA,
+    }
+
+
+def _parse_batch_response(raw, expected):
+    """
+    Validate a batched JSON response. `expected` maps item id → max marks.
+    Returns {id: (score, feedback)} for the entries that are well-formed;
+    missing, duplicated, unknown or out-of-range entries are dropped so the
+    caller can re-grade them one by one.
+    """
+    raw = raw.strip()
+    if raw.startswith("```"):
+        raw = raw.strip("`")
+        raw = raw[raw.find("{"):]
+
+    try:
+        results = json.loads(raw)["results"]
+    except (ValueError, KeyError, TypeError):
+        return {}
+    if not isinstance(results, list):
+        return {}
+
+    graded = {}
+    seen = set()
+    for entry in results:
+        if not isinstance(entry, dict):
+            continue
+        item_id = entry.get("id")
+        if item_id not in expected:
+            continue
+        if item_id in seen:
+            graded.pop(item_id, None)
+            continue
+        seen.add(item_id)
+        try:
+            score = float(entry.get("score"))
+        except (TypeError, ValueError):
+            continue
+        feedback = entry.get("feedback")
+        if not isinstance(feedback, str) or not 0 <= score <= expected[item_id]:
+            continue
+        graded[item_id] = (score, feedback.strip())
+    return graded
+
+
+def _grade_batch(model, prompt, kind, expected):
+    """
+    Send a batched prompt and validate the reply (see _parse_batch_response).
+    A failed call raises as in grade_answer; a reply that is not the JSON
+    asked for grades nothing, so every item is re-graded one by one.
+    """
+    try:
+        response = call_model(model, prompt, kind, generation_config=_batch_generation_config())
+    except GradingUnavailable:
+        raise
+    except Exception as e:
+        raise GradingError(f"Error grading batch: {e}") from e
+    try:
+        raw = response.text
+    except ValueError as e:
+        # Blocked, or no candidates: the SDK has no text to give.
+        print(f"[{kind}] {e}")
+        return {}
+    return _parse_batch_response(raw, expected)
+
+
+def grade_submission_batch(items, model):
+    """
+    Grade several answers of one submission with a single model call.
+
+    `items` is a list of dicts with keys id, teacher_answer, student_answer
+    and marks. Returns {id: (score, feedback)} for every item the model
+    graded validly; anything missing from the result should be re-graded
+    with grade_answer().
+    """
+    payload = [
+        {
+            "id":             item["id"],
+            "max_marks":      item["marks"],
+            "teacher_answer": item["teacher_answer"],
+            "student_answer": item["student_answer"],
+        }
+        for item in items
+    ]
+
+    prompt = f"""
+    You are an extremely strict grader.
+
+    Grade each student answer below against its teacher answer. Each item has its own maximum marks. {GRADING_RUBRIC}
+
+    Items (JSON):
+    {json.dumps(payload, ensure_ascii=False)}
+
+    Respond with JSON only: {{"results": [{{"id": <item id>, "score": <number between 0 and max_marks>, "feedback": <detailed feedback>}}]}}
+    Return exactly one result per item id.
+    """
+
+    return _grade_batch(model, prompt, "submission_batch", {item["id"]: item["marks"] for item in items})
+
+
+def estimate_tokens(text):
+    """Rough token count (≈4 characters per token) used for batch budgeting."""
+    return len(text or "") // 4 + 1
+
+
+def grade_question_batch(teacher_ans, marks, student_answers, model):
+    """
+    Grade the same question for several students with a single model call.
+
+    The teacher answer is sent once; `student_answers` is a list of
+    (id, answer) pairs. Returns {id: (score, feedback)} for every answer the
+    model graded validly; the rest should be re-graded with grade_answer().
+    """
+    payload = [{"id": answer_id, "student_answer": answer} for answer_id, answer in student_answers]
+
+    prompt = f"""
+    You are an extremely strict grader.
+
+    Grade every student's answer below compared to the teacher's answer, each student independently. Maximum marks = {marks} for each student. {GRADING_RUBRIC}
+
+    Teacher's Answer:
+    {teacher_ans}
+
+    Student Answers (JSON):
+    {json.dumps(payload, ensure_ascii=False)}
+
+    Respond with JSON only: {{"results": [{{"id": <student id>, "score": <number between 0 and {marks}>, "feedback": <detailed feedback>}}]}}
+    Return exactly one result per student id.
+    """
+
+    return _grade_batch(model, prompt, "question_batch", {answer_id: marks for answer_id, _ in student_answers})
+
+
 def main():
     teacher_pdf = "Question_Answers_Teacher.pdf"
     student_pdf = "Question_Answers_Student.pdf"
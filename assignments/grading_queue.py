@@ -0,0 +1,323 @@
+"""
+Database-backed grading queue.
+
+The "Grade Now" button only enqueues a GradingJob with one GradingTask per
+ungraded submission; `manage.py run_grading_worker` processes drain the
+queue. Tasks are claimed inside a transaction with
+select_for_update(skip_locked=True) where the database supports it (a single
+UPDATE … WHERE id IN (…) on SQLite). Either way the claim is a conditional
+UPDATE … WHERE status='pending', so two workers can never both run the same
+task. Failed tasks go back on the queue until MAX_ATTEMPTS is reached. A
+model that rejects the worker's configuration (bad API key) stops the
+worker instead, with its tasks released for a correctly configured one.
+
+A worker holds its running tasks on a lease: a heartbeat thread renews
+heartbeat_at while the batch runs, however long backoff or an open circuit
+breaker keeps it waiting, and only tasks whose lease has lapsed (crashed
+workers) are requeued. Finishing a task is conditional on the worker still
+owning it, so a task that was requeued anyway is never finished twice.
+"""
+import os
+import socket
+import threading
+import time
+import traceback
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils.timezone import now
+
+from assignments.clustering import store_answer_clusters
+from assignments.db_writer import submit_graded
+from assignments.engine import grade_submissions
+from assignments.ingest import solution_bank, stored_answer_banks, submission_bank
+from assignments.llm_client import GradingUnavailable, ModelConfigurationError
+from assignments.metrics import write_metrics
+from assignments.models import GradingJob, GradingTask
+
+ACTIVE_STATUSES = ('pending', 'running')
+
+# A task that fails is put back on the queue until it has been tried this often.
+MAX_ATTEMPTS = 3
+
+
+def make_worker_name():
+    """Unique name for one worker process, stored on the tasks it claims."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+def enqueue_grading_job(assignment, requested_by=None):
+    """
+    Create a job with one task per ungraded submission that is not already
+    queued or being graded. Returns the job, or None if there was nothing to do.
+    """
+    submissions = (
+        assignment.submissions
+        .filter(graded=False)
+        .exclude(grading_tasks__status__in=ACTIVE_STATUSES)
+        .values_list('id', flat=True)
+    )
+    with transaction.atomic():
+        submission_ids = list(submissions)
+        if not submission_ids:
+            return None
+        job = GradingJob.objects.create(assignment=assignment, requested_by=requested_by)
+        GradingTask.objects.bulk_create(
+            GradingTask(job=job, submission_id=submission_id) for submission_id in submission_ids
+        )
+    return job
+
+
+def claim_tasks(worker_name, limit=10):
+    """Atomically move up to `limit` pending tasks to running for this worker."""
+    pending = GradingTask.objects.filter(status='pending').order_by('created_at', 'id')
+    stamp = now()
+    claim = {
+        'status': 'running',
+        'worker': worker_name,
+        'started_at': stamp,
+        'heartbeat_at': stamp,
+        'attempts': F('attempts') + 1,
+        'finished_at': None,
+    }
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            candidate_ids = list(
+                pending.select_for_update(skip_locked=True).values_list('id', flat=True)[:limit]
+            )
+            if not candidate_ids:
+                return []
+            GradingTask.objects.filter(id__in=candidate_ids, status='pending').update(**claim)
+    else:
+        # SQLite: a SELECT followed by an UPDATE in one transaction makes
+        # concurrent workers fail with "database is locked" while upgrading
+        # their read lock, so claim with a single UPDATE … WHERE id IN (…).
+        GradingTask.objects.filter(
+            id__in=pending.values('id')[:limit], status='pending',
+        ).update(**claim)
+        candidate_ids = None
+
+    claimed = GradingTask.objects.filter(status='running', worker=worker_name, finished_at__isnull=True)
+    if candidate_ids is not None:
+        claimed = claimed.filter(id__in=candidate_ids)
+    return list(
+        claimed
+        .select_related('job', 'submission', 'submission__assignment')
+        .order_by('created_at', 'id')
+    )
+
+
+def renew_leases(worker_name):
+    """Mark this worker's running tasks as still alive."""
+    return GradingTask.objects.filter(status='running', worker=worker_name).update(heartbeat_at=now())
+
+
+@contextmanager
+def heartbeat(worker_name, interval):
+    """Renew the worker's leases every `interval` seconds while the block runs."""
+    stop = threading.Event()
+
+    def beat():
+        try:
+            while not stop.wait(interval):
+                try:
+                    renew_leases(worker_name)
+                except Exception as exc:
+                    print(f"[grading_queue] heartbeat failed: {exc}")
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=beat, name=f"heartbeat-{worker_name}", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def requeue_stale_tasks(older_than_seconds):
+    """Hand tasks whose lease lapsed `older_than_seconds` ago (crashed workers) back to the queue."""
+    cutoff = now() - timedelta(seconds=older_than_seconds)
+    return GradingTask.objects.filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff),
+        status='running',
+    ).update(status='pending', worker='', finished_at=None)
+
+
+def _owned(task):
+    """The task's row, as long as this worker's claim on it still stands."""
+    return GradingTask.objects.filter(id=task.id, status='running', worker=task.worker)
+
+
+def _finish(task, status, error=''):
+    """
+    Record the outcome and return it for the run stats: 'done', 'failed',
+    'retried' (failed, but back on the queue for another attempt) or 'lost'
+    (the task was requeued and is no longer ours).
+    """
+    outcome = status
+    finished_at = now()
+    duration = (finished_at - task.started_at).total_seconds() if task.started_at else None
+    if status == 'failed' and task.attempts < MAX_ATTEMPTS:
+        # Back on the queue, unowned and unfinished, as _release leaves it.
+        outcome, status, worker, finished_at = 'retried', 'pending', '', None
+    else:
+        worker = task.worker
+    if not _owned(task).update(status=status, worker=worker, error=error, finished_at=finished_at,
+                               duration_seconds=duration):
+        print(f"[grading_queue] task {task.id} was requeued while {task.worker} ran it; not finishing it")
+        return 'lost'
+    task.status, task.worker, task.error = status, worker, error
+    task.finished_at, task.duration_seconds = finished_at, duration
+    return outcome
+
+
+def _release(task, error):
+    """Put a task back on the queue without counting the attempt."""
+    attempts = max(0, task.attempts - 1)
+    if not _owned(task).update(status='pending', worker='', error=error, attempts=attempts):
+        return False
+    task.status, task.worker, task.error, task.attempts = 'pending', '', error, attempts
+    return True
+
+
+def run_tasks(tasks, model, stats=None, **engine_options):
+    """
+    Grade a batch of claimed tasks, grouped by assignment so that batching
+    modes can span submissions, and record each task's outcome. If the model
+    is unavailable (rate limited / circuit open) the unfinished tasks are
+    released back to the queue untouched. If it rejects the configuration
+    (ModelConfigurationError) they are released too and the error is
+    re-raised, since no retry can succeed. Returns the stats Counter.
+    """
+    if stats is None:
+        stats = Counter()
+
+    by_assignment = {}
+    for task in tasks:
+        by_assignment.setdefault(task.submission.assignment, []).append(task)
+
+    for assignment, assignment_tasks in by_assignment.items():
+        remaining = {task.id: task for task in assignment_tasks}
+        try:
+            teacher_data = solution_bank(assignment)
+            stored = stored_answer_banks([task.submission for task in assignment_tasks])
+
+            banks = []
+            for task in assignment_tasks:
+                if task.submission.graded:
+                    _finish(task, 'done', error='Already graded; skipped.')
+                    remaining.pop(task.id)
+                    continue
+                try:
+                    bank = stored.get(task.submission_id)
+                    banks.append((task, bank if bank is not None else submission_bank(task.submission)))
+                except Exception as exc:
+                    stats[f"tasks_{_finish(task, 'failed', error=f'Could not read submission: {exc}')}"] += 1
+                    remaining.pop(task.id)
+
+            # Results are queued on the grade writer as they arrive; each task
+            # is finished once its submission is committed, even if grading
+            # stops midway.
+            submitted = []
+            clusters = {}
+            failures = {}
+            try:
+                for task, per_question_results in grade_submissions(
+                    teacher_data, banks, model, stats=stats, clusters=clusters, failures=failures,
+                    **engine_options
+                ):
+                    submitted.append((task, submit_graded(task.submission, per_question_results)))
+                for task, error in failures.items():
+                    stats[f"tasks_{_finish(task, 'failed', error=error)}"] += 1
+                    remaining.pop(task.id)
+                store_answer_clusters([task.submission_id for task, _ in banks], {
+                    question: {task.submission_id: rep.submission_id for task, rep in members.items()}
+                    for question, members in clusters.items()
+                })
+            finally:
+                for task, future in submitted:
+                    try:
+                        future.result()
+                        outcome, error = 'done', ''
+                    except Exception:
+                        outcome, error = 'failed', traceback.format_exc()
+                    stats[f"tasks_{_finish(task, outcome, error=error)}"] += 1
+                    remaining.pop(task.id)
+
+        except ModelConfigurationError as exc:
+            # A bad key fails every attempt; leave the tasks for a worker that works.
+            for task in remaining.values():
+                stats['tasks_released' if _release(task, error=str(exc)) else 'tasks_lost'] += 1
+            for job in {task.job for task in tasks}:
+                job.refresh_status()
+            raise
+
+        except GradingUnavailable as exc:
+            for task in remaining.values():
+                stats['tasks_released' if _release(task, error=str(exc)) else 'tasks_lost'] += 1
+
+        except Exception:
+            error = traceback.format_exc()
+            for task in remaining.values():
+                stats[f"tasks_{_finish(task, 'failed', error=error)}"] += 1
+
+    for job in {task.job for task in tasks}:
+        job.refresh_status()
+
+    return stats
+
+
+def run_worker(model, worker_name=None, batch_size=10, poll_interval=5.0, once=False,
+               stale_after=900, heartbeat_interval=None, stdout=None, metrics_file=None, **engine_options):
+    """
+    Claim and run tasks until the queue is empty (once=True) or forever,
+    sleeping `poll_interval` seconds whenever there is nothing to do. Leases
+    are renewed every `heartbeat_interval` seconds (default: a third of
+    `stale_after`). With `metrics_file`, the process's metrics are written
+    there after every batch.
+    """
+    worker_name = worker_name or make_worker_name()
+    if heartbeat_interval is None:
+        heartbeat_interval = max(1.0, stale_after / 3) if stale_after else 60.0
+    totals = Counter()
+
+    while True:
+        if stale_after:
+            requeued = requeue_stale_tasks(stale_after)
+            if requeued and stdout:
+                stdout.write(f"[{worker_name}] requeued {requeued} stale task(s)")
+
+        tasks = claim_tasks(worker_name, batch_size)
+        if not tasks:
+            if once:
+                return totals
+            time.sleep(poll_interval)
+            continue
+
+        started = time.perf_counter()
+        with heartbeat(worker_name, heartbeat_interval):
+            stats = run_tasks(tasks, model, **engine_options)
+        totals.update(stats)
+        if stdout:
+            stdout.write(
+                f"[{worker_name}] {len(tasks)} task(s) in {time.perf_counter() - started:.1f}s: "
+                f"{stats['tasks_done']} done, {stats['tasks_failed']} failed, {stats['tasks_retried']} retried, "
+                f"{stats['tasks_released']} released, {stats['tasks_lost']} lost"
+            )
+        if metrics_file:
+            write_metrics(metrics_file)
+
+        # Pause the whole worker while the model's circuit breaker is open.
+        breaker = getattr(model, "breaker", None)
+        pause = breaker.retry_after() if breaker else 0.0
+        if pause:
+            if stdout:
+                stdout.write(f"[{worker_name}] model unavailable, pausing {pause:.0f}s")
+            time.sleep(pause)
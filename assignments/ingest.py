@@ -0,0 +1,269 @@
+"""
+Eager ingestion of uploaded PDFs.
+
+When a student uploads a submission, or a teacher saves an assignment's
+solution PDF, the PDF is extracted and parsed once, in a background thread
+after the upload's transaction commits, and stored as rows:
+
+  • ParsedQuestion – one per question / sub-part of the solution, and
+  • StudentAnswer  – one per answer of a submission.
+
+parse_status / parse_error on the Assignment or StudentSubmission record the
+outcome, so a PDF that cannot be read is reported to the student right after
+upload instead of turning into zero marks at grading time.
+
+Stored answers are also added to the assignment's similarity index
+(assignments/plagiarism.py), which reports likely copied submissions.
+
+Grading reads the rows (solution_bank, stored_answer_banks, submission_banks)
+and rebuilds the same question-bank dicts the parser returns. Uploads that
+were not ingested yet are parsed on the spot and stored as they go;
+`manage.py ingest_uploads` backfills them ahead of time.
+"""
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from assignments.models import Assignment, ParsedQuestion, StudentAnswer, StudentSubmission
+from assignments.pdf_cache import load_question_bank, load_question_banks
+from assignments.plagiarism import index_submission
+
+
+class IngestError(Exception):
+    """An uploaded PDF could not be turned into questions or answers."""
+
+
+def bank_total_marks(bank):
+    """Sum of the marks of every question, counting sub-parts instead of their question."""
+    return sum(
+        sum(sub["marks"] for sub in q["subparts"].values()) if q["subparts"] else q["marks"]
+        for q in bank.values()
+    )
+
+
+def _parse(path, what):
+    try:
+        bank = load_question_bank(path)
+    except Exception as exc:
+        raise IngestError(f"Could not read the PDF: {exc}") from exc
+    if not bank:
+        raise IngestError(f"No {what} found. Number each question like \"Q1. … (5 marks)\".")
+    return bank
+
+
+def _mark_failed(obj, exc):
+    print(f"[ingest] {obj.__class__.__name__} {obj.pk}: {exc}")
+    obj.parse_status = 'failed'
+    obj.parse_error = str(exc)
+    obj.save(update_fields=['parse_status', 'parse_error'])
+
+
+# ───────────────────────────────────────────────
+# Solutions
+# ───────────────────────────────────────────────
+def _question_rows(assignment, bank):
+    rows = []
+    for qid, q in bank.items():
+        rows.append(ParsedQuestion(
+            assignment=assignment, question_number=qid, question=q["question"],
+            marks=q["marks"], answer=q["answer"],
+        ))
+        rows += [
+            ParsedQuestion(
+                assignment=assignment, question_number=qid, subpart=sub_id,
+                question=sub["question"], marks=sub["marks"], answer=sub["answer"],
+            )
+            for sub_id, sub in q["subparts"].items()
+        ]
+    return rows
+
+
+def _bank_from_questions(rows):
+    bank = {}
+    for row in rows:
+        entry = {"question": row.question, "marks": row.marks, "answer": row.answer}
+        if row.subpart:
+            bank[row.question_number]["subparts"][row.subpart] = entry
+        else:
+            bank[row.question_number] = {**entry, "subparts": {}}
+    return bank
+
+
+def ingest_solution(assignment):
+    """
+    Parse the solution PDF into ParsedQuestion rows, store total_marks and
+    mark the assignment parsed. Returns the bank, or None if it failed.
+    """
+    try:
+        bank = _parse(assignment.question_solution_file.path, "questions")
+    except IngestError as exc:
+        _mark_failed(assignment, exc)
+        return None
+
+    with transaction.atomic():
+        ParsedQuestion.objects.filter(assignment=assignment).delete()
+        ParsedQuestion.objects.bulk_create(_question_rows(assignment, bank))
+        assignment.total_marks = bank_total_marks(bank)
+        assignment.parse_status = 'parsed'
+        assignment.parse_error = ''
+        assignment.save(update_fields=['total_marks', 'parse_status', 'parse_error'])
+    return bank
+
+
+def solution_bank(assignment):
+    """The assignment's solution as a question bank; raises IngestError if it cannot be read."""
+    if assignment.parse_status == 'parsed':
+        return _bank_from_questions(assignment.parsed_questions.all())
+    bank = ingest_solution(assignment)
+    if bank is None:
+        raise IngestError(f"Solution PDF of \"{assignment.title}\": {assignment.parse_error}")
+    return bank
+
+
+# ───────────────────────────────────────────────
+# Submissions
+# ───────────────────────────────────────────────
+def _answer_rows(submission, bank):
+    rows = []
+    for qid, q in bank.items():
+        rows.append(StudentAnswer(submission=submission, question_number=qid, answer=q["answer"]))
+        rows += [
+            StudentAnswer(submission=submission, question_number=qid, subpart=sub_id, answer=sub["answer"])
+            for sub_id, sub in q["subparts"].items()
+        ]
+    return rows
+
+
+def _bank_from_answers(rows):
+    # Only the answers are stored; grading reads nothing else from a student bank.
+    bank = {}
+    for row in rows:
+        if row.subpart:
+            bank[row.question_number]["subparts"][row.subpart] = {"answer": row.answer}
+        else:
+            bank[row.question_number] = {"answer": row.answer, "subparts": {}}
+    return bank
+
+
+def _store_answers(submission, bank):
+    with transaction.atomic():
+        StudentAnswer.objects.filter(submission=submission).delete()
+        StudentAnswer.objects.bulk_create(_answer_rows(submission, bank))
+        submission.parse_status = 'parsed'
+        submission.parse_error = ''
+        submission.save(update_fields=['parse_status', 'parse_error'])
+        if settings.PLAGIARISM_INDEX:
+            index_submission(submission, bank)
+
+
+def ingest_submission(submission):
+    """
+    Parse a submission PDF into StudentAnswer rows and mark it parsed.
+    Returns the student bank, or None if it failed.
+    """
+    try:
+        bank = _parse(submission.submitted_file.path, "answers")
+    except IngestError as exc:
+        _mark_failed(submission, exc)
+        return None
+    _store_answers(submission, bank)
+    return _bank_from_answers(_answer_rows(submission, bank))
+
+
+def stored_answer_banks(submissions):
+    """{submission id: student bank} for the ingested ones among `submissions`, in one query."""
+    ids = [submission.pk for submission in submissions if submission.parse_status == 'parsed']
+    by_submission = {}
+    for row in StudentAnswer.objects.filter(submission_id__in=ids).order_by('submission_id', 'id'):
+        by_submission.setdefault(row.submission_id, []).append(row)
+    return {pk: _bank_from_answers(rows) for pk, rows in by_submission.items()}
+
+
+def submission_bank(submission):
+    """One submission's answers; raises IngestError if its PDF cannot be read."""
+    if submission.parse_status == 'parsed':
+        return _bank_from_answers(submission.answers.all())
+    bank = ingest_submission(submission)
+    if bank is None:
+        raise IngestError(submission.parse_error)
+    return bank
+
+
+def submission_banks(submissions, parse_workers=None):
+    """
+    Student banks for `submissions`, in order: stored rows where ingested,
+    otherwise parsed now (over `parse_workers` processes) and stored. A
+    submission whose PDF cannot be read gets None.
+    """
+    submissions = list(submissions)
+    banks = stored_answer_banks(submissions)
+    missing = [submission for submission in submissions if submission.pk not in banks]
+    if missing:
+        try:
+            parsed = load_question_banks((s.submitted_file.path for s in missing), parse_workers)
+        except Exception:
+            # Find out which ones fail, one at a time.
+            parsed = [None] * len(missing)
+        for submission, bank in zip(missing, parsed):
+            if bank:
+                _store_answers(submission, bank)
+                banks[submission.pk] = _bank_from_answers(_answer_rows(submission, bank))
+            else:
+                banks[submission.pk] = ingest_submission(submission)
+    return [banks[submission.pk] for submission in submissions]
+
+
+# ───────────────────────────────────────────────
+# Background scheduling
+# ───────────────────────────────────────────────
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.INGEST_WORKERS, thread_name_prefix="ingest")
+        return _executor
+
+
+def _ingest_solution_by_id(pk):
+    assignment = Assignment.objects.filter(pk=pk).first()
+    if assignment is not None:
+        ingest_solution(assignment)
+
+
+def _ingest_submission_by_id(pk):
+    submission = StudentSubmission.objects.filter(pk=pk).first()
+    if submission is not None:
+        ingest_submission(submission)
+
+
+def _run_in_background(fn, pk):
+    try:
+        fn(pk)
+    except Exception:
+        print(f"[ingest] {fn.__name__}({pk}) crashed:\n{traceback.format_exc()}")
+    finally:
+        connection.close()
+
+
+def _schedule(fn, pk):
+    if settings.INGEST_IN_BACKGROUND:
+        transaction.on_commit(lambda: _get_executor().submit(_run_in_background, fn, pk))
+    else:
+        transaction.on_commit(lambda: fn(pk))
+
+
+def schedule_solution_ingest(assignment):
+    """Parse the solution PDF once the current transaction commits."""
+    _schedule(_ingest_solution_by_id, assignment.pk)
+
+
+def schedule_submission_ingest(submission):
+    """Parse the submission PDF once the current transaction commits."""
+    _schedule(_ingest_submission_by_id, submission.pk)
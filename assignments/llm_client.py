@@ -0,0 +1,318 @@
+"""
+Shared, rate-limited wrapper around the grading model.
+
+RateLimitedModel exposes the same generate_content() as the Gemini model it
+wraps, and adds:
+
+  • token buckets for requests and (estimated) tokens per minute,
+  • retries with exponential backoff and full jitter on retryable errors
+    (429, 5xx, timeouts),
+  • AIMD concurrency: the number of concurrent calls grows by one per
+    window of successes and halves on every 429,
+  • a circuit breaker that, after GRADING_BREAKER_THRESHOLD calls in a row
+    have exhausted their retries, fails fast with CircuitOpenError for
+    GRADING_BREAKER_COOLDOWN seconds.
+
+When a call cannot be completed it raises GradingUnavailable instead of
+returning, so callers leave the submission ungraded (and workers put their
+tasks back on the queue) rather than writing a zero. Errors no retry can fix
+are not retried: authentication and configuration errors (401 / 403, a
+missing or invalid API key) raise ModelConfigurationError, a kind of
+GradingUnavailable, and anything else (400, a blocked prompt) is re-raised
+for the grader to report.
+"""
+import random
+import threading
+import time
+from collections import Counter
+
+from assignments.metrics import register_collector
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+RETRYABLE_ERROR_NAMES = {
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "InternalServerError",
+    "DeadlineExceeded", "GatewayTimeout", "BadGateway",
+}
+CONFIGURATION_STATUS_CODES = {401, 403}
+CONFIGURATION_ERROR_NAMES = {
+    "Unauthenticated", "Unauthorized", "PermissionDenied", "Forbidden", "DefaultCredentialsError",
+}
+
+
+class GradingUnavailable(Exception):
+    """The model could not be reached; the answer must not be graded as zero."""
+
+
+class ModelConfigurationError(GradingUnavailable):
+    """The model rejected our credentials or setup; every call would fail the same way."""
+
+
+class CircuitOpenError(GradingUnavailable):
+    """Raised without calling the model while the circuit breaker is open."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Grading model circuit is open; retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+def _status_code(exc):
+    code = getattr(exc, "code", None)
+    code = getattr(code, "value", code)  # grpc StatusCode-style enums
+    return code if isinstance(code, int) else None
+
+
+def is_throttle_error(exc):
+    return _status_code(exc) == 429 or type(exc).__name__ in ("ResourceExhausted", "TooManyRequests")
+
+
+def is_retryable_error(exc):
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    return _status_code(exc) in RETRYABLE_STATUS_CODES or type(exc).__name__ in RETRYABLE_ERROR_NAMES
+
+
+def is_configuration_error(exc):
+    """Authentication / API key errors: no answer can be graded until someone fixes the setup."""
+    return _status_code(exc) in CONFIGURATION_STATUS_CODES or type(exc).__name__ in CONFIGURATION_ERROR_NAMES
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at `per_minute` / 60 per second."""
+
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, amount=1.0):
+        """Block until `amount` tokens are available; returns seconds waited."""
+        if self.rate <= 0:
+            return 0.0
+        amount = min(float(amount), self.capacity)
+        waited = 0.0
+        while True:
+            with self.lock:
+                current = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (current - self.updated) * self.rate)
+                self.updated = current
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                delay = (amount - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class AdaptiveLimiter:
+    """Concurrency limit with additive increase / multiplicative decrease."""
+
+    def __init__(self, initial, minimum=1, maximum=None):
+        self.minimum = max(1, minimum)
+        self.maximum = maximum or initial
+        self.limit = float(initial)
+        self.in_flight = 0
+        self.cond = threading.Condition()
+
+    def __enter__(self):
+        with self.cond:
+            while self.in_flight >= int(self.limit):
+                self.cond.wait()
+            self.in_flight += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        with self.cond:
+            self.in_flight -= 1
+            self.cond.notify_all()
+
+    def on_success(self):
+        with self.cond:
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self.cond.notify_all()
+
+    def on_throttle(self):
+        with self.cond:
+            self.limit = max(self.minimum, self.limit / 2)
+
+    def raise_ceiling(self, maximum):
+        """Allow up to `maximum` concurrent calls, starting there if the limit is lower."""
+        with self.cond:
+            if maximum > self.maximum:
+                self.maximum = maximum
+                self.limit = max(self.limit, float(maximum))
+                self.cond.notify_all()
+
+
+class CircuitBreaker:
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    def retry_after(self):
+        """Seconds until the breaker lets a trial call through (0 when closed)."""
+        with self.lock:
+            if self.opened_at is None:
+                return 0.0
+            return max(0.0, self.opened_at + self.cooldown - time.monotonic())
+
+    def before_call(self):
+        with self.lock:
+            if self.opened_at is None:
+                return
+            remaining = self.opened_at + self.cooldown - time.monotonic()
+            if remaining > 0:
+                raise CircuitOpenError(remaining)
+            # Half-open: let this call through as a trial; a failure re-opens.
+            self.opened_at = None
+            self.failures = self.threshold - 1
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+
+    def record_failure(self):
+        """Returns True if this failure tripped the breaker."""
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.threshold and self.opened_at is None:
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+
+class RateLimitedModel:
+    """Drop-in replacement for a model object with generate_content()."""
+
+    def __init__(self, model, requests_per_minute=0, tokens_per_minute=0, max_retries=5,
+                 backoff_base=1.0, backoff_max=60.0, max_concurrency=8, breaker_threshold=5,
+                 breaker_cooldown=60.0):
+        self.model = model
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.limiter = AdaptiveLimiter(max_concurrency)
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_cooldown)
+        self.stats = Counter()
+        self.stats_lock = threading.Lock()
+
+    @property
+    def model_name(self):
+        return getattr(self.model, "model_name", None) or type(self.model).__name__
+
+    def _count(self, key, amount=1):
+        with self.stats_lock:
+            self.stats[key] += amount
+
+    def stats_snapshot(self):
+        with self.stats_lock:
+            return Counter(self.stats)
+
+    def allow_concurrency(self, max_in_flight):
+        """
+        Make room for a run that keeps `max_in_flight` calls in flight. The
+        limiter starts at GRADING_MAX_IN_FLIGHT; a run asking for more (e.g.
+        --llm-concurrency) raises the ceiling for the rest of the process.
+        """
+        self.limiter.raise_ceiling(max_in_flight)
+
+    def _backoff(self, attempt):
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def generate_content(self, prompt, **kwargs):
+        from assignments.grader import estimate_tokens
+
+        self.breaker.before_call()
+        for attempt in range(self.max_retries + 1):
+            with self.limiter:
+                waited = self.request_bucket.acquire(1)
+                waited += self.token_bucket.acquire(estimate_tokens(prompt))
+                if waited:
+                    self._count("throttle_seconds", waited)
+                try:
+                    self._count("requests")
+                    response = self.model.generate_content(prompt, **kwargs)
+                except Exception as exc:
+                    if is_configuration_error(exc):
+                        if self.breaker.record_failure():
+                            self._count("breaker_trips")
+                        raise ModelConfigurationError(f"Grading model rejected the request: {exc}") from exc
+                    if not is_retryable_error(exc):
+                        raise
+                    error = exc
+                else:
+                    self.limiter.on_success()
+                    self.breaker.record_success()
+                    return response
+
+            if is_throttle_error(error):
+                self._count("throttled")
+                self.limiter.on_throttle()
+            if attempt == self.max_retries:
+                break
+            self._count("retries")
+            delay = self._backoff(attempt)
+            self._count("throttle_seconds", delay)
+            time.sleep(delay)
+
+        if self.breaker.record_failure():
+            self._count("breaker_trips")
+        raise GradingUnavailable(f"Model call failed after {self.max_retries} retries: {error}") from error
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def _collect_client_stats():
+    with _shared_lock:
+        clients = dict(_shared)
+    counters = {
+        "requests": "Requests sent to the model, including retries.",
+        "retries": "Model requests retried after a retryable error.",
+        "throttled": "Model requests rejected as rate limited.",
+        "breaker_trips": "Times the circuit breaker opened.",
+        "throttle_seconds": "Seconds spent waiting on rate limits and backoff.",
+    }
+    families = []
+    for key, help_text in counters.items():
+        samples = [({"model": name}, client.stats_snapshot()[key]) for name, client in sorted(clients.items())]
+        families.append((f"grading_llm_client_{key}_total", "counter", help_text, samples))
+    families.append(("grading_llm_client_breaker_open", "gauge", "1 while the circuit breaker is open.", [
+        ({"model": name}, int(client.breaker.retry_after() > 0)) for name, client in sorted(clients.items())
+    ]))
+    return families
+
+
+register_collector(_collect_client_stats)
+
+
+def get_shared_client(model_name, factory):
+    """
+    One RateLimitedModel per model name and process, so every grading run
+    in the process shares the same limits and breaker.
+    """
+    from django.conf import settings
+
+    with _shared_lock:
+        client = _shared.get(model_name)
+        if client is None:
+            client = RateLimitedModel(
+                factory(),
+                requests_per_minute=getattr(settings, "GRADING_REQUESTS_PER_MINUTE", 0),
+                tokens_per_minute=getattr(settings, "GRADING_TOKENS_PER_MINUTE", 0),
+                max_retries=getattr(settings, "GRADING_MAX_RETRIES", 5),
+                backoff_base=getattr(settings, "GRADING_BACKOFF_BASE", 1.0),
+                backoff_max=getattr(settings, "GRADING_BACKOFF_MAX", 60.0),
+                max_concurrency=getattr(settings, "GRADING_MAX_IN_FLIGHT", 8),
+                breaker_threshold=getattr(settings, "GRADING_BREAKER_THRESHOLD", 5),
+                breaker_cooldown=getattr(settings, "GRADING_BREAKER_COOLDOWN", 60.0),
+            )
+            _shared[model_name] = client
+        return client
@@ -0,0 +1,71 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from assignments.backends import BACKENDS
+from assignments.engine import GRADING_MODES, get_max_in_flight, grade_submissions
+from assignments.grader import get_grading_model
+from assignments.pdf_cache import load_question_bank
+from assignments.models import Assignment
+
+
+class Command(BaseCommand):
+    help = ('Compare wall-clock time of the legacy per-answer loop (grade_single_submission) against '
+            'the concurrent engine (the legacy loop\'s writes are rolled back)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('assignment_id', type=int)
+        parser.add_argument('--max-in-flight', type=int, default=None,
+                            help='Concurrency for the engine run (defaults to GRADING_MAX_IN_FLIGHT)')
+        parser.add_argument('--mode', choices=GRADING_MODES, default=None,
+                            help='Grading mode for the engine run (defaults to GRADING_MODE)')
+        parser.add_argument('--limit', type=int, default=None,
+                            help='Only use the first N submissions')
+        parser.add_argument('--backend', choices=BACKENDS, default=None,
+                            help='Grading backend (defaults to GRADING_BACKEND; "fake" needs no API quota)')
+
+    def handle(self, *args, **options):
+        from assignments.utils import grade_single_submission
+
+        try:
+            assignment = Assignment.objects.get(pk=options['assignment_id'])
+        except Assignment.DoesNotExist:
+            raise CommandError(f"Assignment {options['assignment_id']} does not exist")
+
+        teacher_data = load_question_bank(assignment.question_solution_file.path)
+
+        submissions = assignment.submissions.all()
+        if options['limit']:
+            submissions = submissions[:options['limit']]
+        student_banks = [
+            (submission, load_question_bank(submission.submitted_file.path))
+            for submission in submissions
+        ]
+        if not student_banks:
+            raise CommandError("Assignment has no submissions to grade")
+
+        model = get_grading_model(backend=options['backend'])
+        max_in_flight = get_max_in_flight(options['max_in_flight'])
+
+        timings = {}
+
+        # The code the engine replaced: one submission, one answer, one call at a time.
+        started = time.perf_counter()
+        with transaction.atomic():
+            for submission, _ in student_banks:
+                grade_single_submission(submission, model=model, teacher_data=teacher_data)
+            transaction.set_rollback(True)
+        timings['legacy loop'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for _ in grade_submissions(teacher_data, student_banks, model,
+                                   max_in_flight=max_in_flight, use_cache=False, mode=options['mode']):
+            pass
+        timings[f'engine x{max_in_flight}'] = time.perf_counter() - started
+
+        for label, seconds in timings.items():
+            self.stdout.write(f"{label:>14}: {seconds:.2f}s for {len(student_banks)} submissions")
+        legacy, concurrent = timings.values()
+        if concurrent > 0:
+            self.stdout.write(self.style.SUCCESS(f"Speed-up: {legacy / concurrent:.1f}x"))
@@ -0,0 +1,38 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Compare parse_question_bank against the original parser on large generated question banks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--questions', type=int, default=2000)
+        parser.add_argument('--subparts', type=int, nargs='+', default=[3, 20, 60],
+                            help='Sub-parts per split question; one run per value')
+        parser.add_argument('--answer-lines', type=int, default=5)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+
+    def handle(self, *args, **options):
+        from assignments.benchmark.parser import run_parser_benchmark
+
+        results = [
+            run_parser_benchmark(
+                questions=options['questions'],
+                subparts=subparts,
+                answer_lines=options['answer_lines'],
+                repeat=options['repeat'],
+            )
+            for subparts in options['subparts']
+        ]
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for result in results:
+            self.stdout.write(
+                f"{result['questions']} questions x {result['subparts']:>3} sub-parts "
+                f"({result['lines']} lines): legacy {result['legacy_seconds']:.3f}s, "
+                f"current {result['current_seconds']:.3f}s, {result['speedup']}x"
+            )
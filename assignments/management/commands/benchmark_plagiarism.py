@@ -0,0 +1,27 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Time the incremental similarity index on synthetic submissions with planted copies'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--submissions', type=int, default=5000)
+        parser.add_argument('--questions', type=int, default=10)
+        parser.add_argument('--answer-words', type=int, default=40)
+        parser.add_argument('--copy-every', type=int, default=50,
+                            help='Plant a copied submission (and a copied answer) every N submissions')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        from assignments.benchmark.plagiarism import run_plagiarism_benchmark
+
+        report = run_plagiarism_benchmark(
+            submissions=options['submissions'],
+            questions=options['questions'],
+            answer_words=options['answer_words'],
+            copy_every=options['copy_every'],
+            seed=options['seed'],
+        )
+        self.stdout.write(json.dumps(report, indent=2))
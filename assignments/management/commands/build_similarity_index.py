@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Add ingested submissions to the similarity index and report the pairs found'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--assignment', type=int, default=None,
+                            help='Only this assignment id')
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Re-index submissions that are already indexed')
+
+    def handle(self, *args, **options):
+        from collections import Counter
+
+        from assignments.ingest import stored_answer_banks
+        from assignments.models import StudentSubmission
+        from assignments.plagiarism import index_submission
+
+        submissions = StudentSubmission.objects.filter(parse_status='parsed').order_by('assignment_id', 'submitted_at', 'id')
+        if options['assignment']:
+            submissions = submissions.filter(assignment_id=options['assignment'])
+        if not options['rebuild']:
+            submissions = submissions.filter(similarity_signatures__isnull=True).distinct()
+
+        stats = Counter()
+        submissions = list(submissions)
+        for start in range(0, len(submissions), 200):
+            chunk = submissions[start:start + 200]
+            banks = stored_answer_banks(chunk)
+            for submission in chunk:
+                index_submission(submission, banks.get(submission.pk, {}), stats=stats)
+        self.stdout.write(
+            f"{stats['indexed']} submissions indexed, {stats['candidates']} candidates checked, "
+            f"{stats['pairs']} similar pairs"
+        )
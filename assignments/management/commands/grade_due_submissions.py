@@ -1,26 +1,106 @@
-from django.core.management.base import BaseCommand
+import time
+
+from django.core.management.base import BaseCommand, CommandError
 from django.utils.timezone import now
 from assignments.models import Assignment
+from assignments.engine import GRADING_MODES, format_run_stats
 
 class Command(BaseCommand):
     help = 'Auto-grade all ungraded submissions for assignments whose deadline passed'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', choices=GRADING_MODES, default=None,
+                            help='How answers are sent to the model (defaults to GRADING_MODE)')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Students per call in "class" mode (implies --mode class)')
+        parser.add_argument('--token-budget', type=int, default=None,
+                            help='Upper bound on estimated prompt tokens per "class" batch')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Processes used to extract and parse student PDFs')
+        parser.add_argument('--llm-concurrency', type=int, default=None,
+                            help='Model calls kept in flight at once (defaults to GRADING_MAX_IN_FLIGHT)')
+        parser.add_argument('--save-batch', type=int, default=None,
+                            help='Graded submissions written per database transaction '
+                                 '(only with GRADING_SERIAL_WRITER off; the writer batches by itself)')
+        parser.add_argument('--metrics-file', default=None,
+                            help='Write metrics (Prometheus text format) here when done, "-" for stdout')
+
     def handle(self, *args, **options):
+        from django.conf import settings
+        from assignments.grader import get_grading_model
+        from assignments.llm_client import GradingUnavailable
+        from assignments.ingest import IngestError, solution_bank
+        from assignments.metrics import dump_metrics
+        from assignments.utils import grade_assignment_submissions
+
+        if options['save_batch'] is not None and settings.GRADING_SERIAL_WRITER:
+            raise CommandError(
+                "--save-batch has no effect while GRADING_SERIAL_WRITER is on: the grade writer "
+                "commits up to GRADING_WRITER_BATCH submissions per transaction. Set "
+                "GRADING_SERIAL_WRITER=0 to choose the batch size here."
+            )
+
+        mode = options['mode']
+        if options['batch_size'] and mode is None:
+            mode = 'class'
+        engine_options = {
+            'mode': mode,
+            'batch_size': options['batch_size'],
+            'token_budget': options['token_budget'],
+            'max_in_flight': options['llm_concurrency'],
+        }
+
         current_time = now()
         assignments_due = Assignment.objects.filter(deadline__lte=current_time)
+        model = None
+        throughput = []   # (assignment, submissions graded, seconds)
 
         for assignment in assignments_due:
-            ungraded_submissions = assignment.submissions.filter(graded=False)
-            if not ungraded_submissions.exists():
+            ungraded_submissions = list(assignment.submissions.filter(graded=False))
+            if not ungraded_submissions:
                 continue
             self.stdout.write(f"Grading submissions for assignment '{assignment.title}' (ID: {assignment.id})...")
 
-            for submission in ungraded_submissions:
-                grade_single_submission(submission)
+            started = time.perf_counter()
+            # One parsed teacher bank per assignment, shared by every submission.
+            try:
+                teacher_data = solution_bank(assignment)
+            except IngestError as exc:
+                self.stderr.write(f"Skipping '{assignment.title}': {exc}")
+                continue
+            try:
+                if model is None:
+                    model = get_grading_model()
+                stats = grade_assignment_submissions(
+                    assignment,
+                    ungraded_submissions,
+                    model=model,
+                    teacher_data=teacher_data,
+                    parse_workers=options['workers'],
+                    save_batch_size=options['save_batch'] or 1,
+                    **engine_options,
+                )
+            except GradingUnavailable as exc:
+                self.stderr.write(
+                    f"Model unavailable while grading '{assignment.title}': {exc}. "
+                    "Ungraded submissions were left as they are; run the command again later."
+                )
+                break
+            # Unreadable and failed submissions take time but are not throughput.
+            throughput.append((assignment, stats['graded_submissions'], time.perf_counter() - started))
 
-            self.stdout.write(f"Completed grading assignment '{assignment.title}'.")
+            self.stdout.write(f"Completed grading assignment '{assignment.title}': {format_run_stats(stats)}")
+            if stats['unreadable_submissions']:
+                self.stderr.write(f"  {stats['unreadable_submissions']} submission(s) skipped: PDF could not be read")
 
+        if throughput:
+            self.stdout.write("\nThroughput:")
+            for assignment, count, seconds in throughput:
+                per_minute = count / seconds * 60 if seconds else 0.0
+                self.stdout.write(
+                    f"  {assignment.title} (ID: {assignment.id}): {count} submissions in {seconds:.1f}s "
+                    f"= {per_minute:.1f} submissions/min"
+                )
 
-def grade_single_submission(submission):
-    from assignments.utils import grade_single_submission as grade_func
-    grade_func(submission)
+        if options['metrics_file']:
+            dump_metrics(options['metrics_file'], self.stdout)
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Parse solution and submission PDFs that have not been ingested into rows yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retry-failed', action='store_true',
+                            help='Also retry uploads whose last parse failed')
+        parser.add_argument('--metrics-file', default=None,
+                            help='Write metrics (Prometheus text format) here when done, "-" for stdout')
+
+    def handle(self, *args, **options):
+        from assignments.ingest import ingest_solution, ingest_submission
+        from assignments.metrics import dump_metrics
+        from assignments.models import Assignment, StudentSubmission
+
+        statuses = ['pending', 'failed'] if options['retry_failed'] else ['pending']
+        for label, queryset, ingest in (
+            ('solutions', Assignment.objects.filter(parse_status__in=statuses).exclude(question_solution_file=''),
+             ingest_solution),
+            ('submissions', StudentSubmission.objects.filter(parse_status__in=statuses), ingest_submission),
+        ):
+            parsed = failed = 0
+            for obj in queryset.iterator():
+                if ingest(obj) is None:
+                    failed += 1
+                else:
+                    parsed += 1
+            self.stdout.write(f"{label}: {parsed} parsed, {failed} failed")
+
+        if options['metrics_file']:
+            dump_metrics(options['metrics_file'], self.stdout)
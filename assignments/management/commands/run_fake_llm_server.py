@@ -0,0 +1,61 @@
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Serve the fake grading model over HTTP (use with GRADING_BACKEND=http)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency', default=settings.FAKE_LLM_LATENCY,
+                            help='Latency spec, e.g. "0.2", "uniform:0.1,0.5", "lognormal:-1.5,0.5"')
+        parser.add_argument('--error-rate', type=float, default=settings.FAKE_LLM_ERROR_RATE,
+                            help='Fraction of requests answered with HTTP 500')
+        parser.add_argument('--throttle-rate', type=float, default=settings.FAKE_LLM_THROTTLE_RATE,
+                            help='Fraction of requests answered with HTTP 429')
+        parser.add_argument('--seed', default=settings.FAKE_LLM_SEED)
+
+    def handle(self, *args, **options):
+        from assignments.backends import BackendError, FakeModel
+
+        model = FakeModel(
+            latency=options['latency'],
+            error_rate=options['error_rate'],
+            throttle_rate=options['throttle_rate'],
+            seed=options['seed'],
+        )
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                try:
+                    prompt = json.loads(self.rfile.read(length))['prompt']
+                    status, body = 200, {'text': model.generate_content(prompt).text}
+                except BackendError as exc:
+                    status, body = exc.code, {'error': str(exc)}
+                except Exception as exc:
+                    status, body = 400, {'error': str(exc)}
+
+                payload = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((options['host'], options['port']), Handler)
+        server.daemon_threads = True
+        self.stdout.write(f"Fake grading model listening on http://{options['host']}:{options['port']}/")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from assignments.engine import GRADING_MODES, format_run_stats
+
+
+class Command(BaseCommand):
+    help = 'Claim and run queued grading tasks (start several to drain the queue in parallel)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, default=10,
+                            help='Tasks to claim at a time')
+        parser.add_argument('--sleep', type=float, default=5.0,
+                            help='Seconds to wait when the queue is empty')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit as soon as the queue is empty')
+        parser.add_argument('--stale-after', type=int, default=900,
+                            help='Requeue tasks whose worker has not renewed their lease for this many seconds (0 disables)')
+        parser.add_argument('--worker-name', default=None)
+        parser.add_argument('--mode', choices=GRADING_MODES, default=None)
+        parser.add_argument('--max-in-flight', type=int, default=None)
+        parser.add_argument('--metrics-file', default=None,
+                            help='Write metrics (Prometheus text format) here after every batch')
+
+    def handle(self, *args, **options):
+        from assignments.grader import get_grading_model
+        from assignments.grading_queue import make_worker_name, run_worker
+        from assignments.llm_client import ModelConfigurationError
+
+        try:
+            model = get_grading_model()
+        except ModelConfigurationError as exc:
+            raise CommandError(str(exc))
+
+        worker_name = options['worker_name'] or make_worker_name()
+        self.stdout.write(f"Grading worker {worker_name} started.")
+
+        try:
+            totals = run_worker(
+                model,
+                worker_name=worker_name,
+                batch_size=options['batch'],
+                poll_interval=options['sleep'],
+                once=options['once'],
+                stale_after=options['stale_after'],
+                stdout=self.stdout,
+                mode=options['mode'],
+                max_in_flight=options['max_in_flight'],
+                metrics_file=options['metrics_file'],
+            )
+        except KeyboardInterrupt:
+            self.stdout.write(f"Grading worker {worker_name} stopped.")
+            return
+        except ModelConfigurationError as exc:
+            raise CommandError(f"Grading worker {worker_name} stopped: {exc}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Queue drained: {totals['tasks_done']} done, {totals['tasks_failed']} failed, "
+            f"{totals['tasks_retried']} retried; "
+            f"{format_run_stats(totals)}"
+        ))
@@ -0,0 +1,70 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from assignments.backends import BACKENDS
+from assignments.engine import GRADING_MODES
+
+
+class Command(BaseCommand):
+    help = 'Benchmark extraction, parsing, grading and DB writes on synthetic PDFs and write a JSON report'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--questions', type=int, default=10)
+        parser.add_argument('--subparts', type=int, default=3,
+                            help='Sub-parts on every third question (0 for none)')
+        parser.add_argument('--answer-words', type=int, default=60)
+        parser.add_argument('--pages', type=int, default=0,
+                            help='Minimum pages per PDF (0 packs pages full)')
+        parser.add_argument('--students', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--backend', choices=BACKENDS, default='fake')
+        parser.add_argument('--mode', choices=GRADING_MODES, default=None)
+        parser.add_argument('--max-in-flight', type=int, default=None)
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Processes for the cached load phase')
+        parser.add_argument('--no-save', action='store_true',
+                            help='Skip the database write phase')
+        parser.add_argument('--work-dir', default=None,
+                            help='Write the PDFs here and keep them (default: a temporary directory)')
+        parser.add_argument('--output', default=None,
+                            help='Write the JSON report to this file (default: print it)')
+        parser.add_argument('--metrics-file', default=None,
+                            help='Write metrics (Prometheus text format) here when done, "-" for stdout')
+
+    def handle(self, *args, **options):
+        from assignments.benchmark.runner import run_benchmark
+        from assignments.metrics import dump_metrics
+
+        report = run_benchmark(
+            questions=options['questions'],
+            subparts=options['subparts'],
+            answer_words=options['answer_words'],
+            pages=options['pages'],
+            students=options['students'],
+            seed=options['seed'],
+            backend=options['backend'],
+            mode=options['mode'],
+            max_in_flight=options['max_in_flight'],
+            parse_workers=options['workers'],
+            work_dir=options['work_dir'],
+            save=not options['no_save'],
+        )
+
+        for phase in report['phases']:
+            rate = phase.get('items_per_second')
+            self.stdout.write(
+                f"{phase['name']:>9}: {phase['seconds']:8.3f}s  {phase['queries']:6d} queries  "
+                f"peak RSS +{phase['rss_growth_mb']} MiB" + (f"  ({rate}/s)" if rate else "")
+            )
+        self.stdout.write(f"Peak RSS for the whole run: {report['peak_rss_mb']} MiB")
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as fh:
+                json.dump(report, fh, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+        else:
+            self.stdout.write(json.dumps(report, indent=2))
+
+        if options['metrics_file']:
+            dump_metrics(options['metrics_file'], self.stdout)
@@ -0,0 +1,34 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Run dashboard readers and graders against the database together and report lock errors'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--graders', type=int, default=4)
+        parser.add_argument('--submissions', type=int, default=200)
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Grade writer batch size (default: GRADING_WRITER_BATCH)')
+        parser.add_argument('--no-writer', action='store_true',
+                            help='Let every grader commit its own transactions instead of using the grade writer')
+
+    def handle(self, *args, **options):
+        from assignments.benchmark.concurrency import run_concurrency_stress
+
+        report = run_concurrency_stress(
+            readers=options['readers'],
+            graders=options['graders'],
+            submissions=options['submissions'],
+            writer=not options['no_writer'],
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(json.dumps(report, indent=2))
+
+        errors = report['read_lock_errors'] + report['write_lock_errors']
+        if errors:
+            self.stderr.write(f"{errors} lock error(s)")
+        else:
+            self.stdout.write(self.style.SUCCESS("No lock errors"))
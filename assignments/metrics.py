@@ -0,0 +1,240 @@
+"""
+Grading metrics in the Prometheus text format.
+
+Counters and histograms live in this process. The web process serves them
+at /metrics. The grading commands take --metrics-file and write them there
+when done (run_grading_worker: after every batch), for node_exporter's
+textfile collector or anything else that reads the format.
+
+What is measured (names below):
+
+  grading_pdf_seconds{phase}        PyMuPDF text extraction / question-bank parsing
+  grading_pdf_cache_total{result}   question-bank lookups: memory, disk or miss
+  grading_model_call_seconds{kind}  every model call, including client retries
+  grading_model_calls_total         … by outcome: ok, error, unavailable
+  grading_model_tokens_total        prompt / response tokens (as reported, else estimated)
+  grading_engine_events_total       the grading engine's run stats (items, cache_hits, …)
+  grading_db_write_seconds{path}    committing graded submissions
+  grading_db_written_submissions_total, grading_db_write_errors_total
+
+Modules with counters of their own (the dashboard cache, the rate-limited
+model clients) add them at render time through register_collector.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry = []
+_collectors = []
+_registry_lock = threading.Lock()
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r'\"'))
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames) or set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key, extra=()):
+        return tuple(zip(self.labelnames, key)) + tuple(extra)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield self.name, self._labels(key), value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # cumulative bucket counts, sum, count
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the `with` block, even if it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels):
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return state[2] if state else 0
+
+    def samples(self):
+        with self._lock:
+            values = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items())
+        for key, (counts, total, count) in values:
+            for bound, bucket_count in zip(self.buckets, counts):
+                yield f"{self.name}_bucket", self._labels(key, [("le", _format_value(float(bound)))]), bucket_count
+            yield f"{self.name}_bucket", self._labels(key, [("le", "+Inf")]), count
+            yield f"{self.name}_sum", self._labels(key), total
+            yield f"{self.name}_count", self._labels(key), count
+
+
+def _register(metric):
+    with _registry_lock:
+        if any(existing.name == metric.name for existing in _registry):
+            raise ValueError(f"Metric {metric.name} is already registered")
+        _registry.append(metric)
+    return metric
+
+
+def counter(name, help_text, labelnames=()):
+    return _register(Counter(name, help_text, labelnames))
+
+
+def histogram(name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+    return _register(Histogram(name, help_text, labelnames, buckets))
+
+
+def register_collector(collect):
+    """
+    Add a function called at render time that returns
+    [(name, kind, help, [(labels dict, value), ...]), ...].
+    """
+    with _registry_lock:
+        _collectors.append(collect)
+
+
+def render():
+    """Every metric in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    with _registry_lock:
+        metrics, collectors = list(_registry), list(_collectors)
+
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines += [f"{name}{_format_labels(labels)} {_format_value(value)}" for name, labels, value in metric.samples()]
+
+    for collect in collectors:
+        try:
+            families = collect()
+        except Exception as exc:
+            print(f"[metrics] collector {collect.__name__} failed: {exc}")
+            continue
+        for name, kind, help_text, samples in families:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines += [
+                f"{name}{_format_labels(sorted(labels.items()))} {_format_value(value)}"
+                for labels, value in samples
+            ]
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics(path):
+    """Write render() to `path`, replacing it atomically so readers never see half a file."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        fh.write(render())
+    os.replace(tmp, path)
+
+
+def dump_metrics(destination, stdout):
+    """For the management commands' --metrics-file: write to a file, or to `stdout` for "-"."""
+    if destination == "-":
+        stdout.write(render())
+    else:
+        write_metrics(destination)
+
+
+# ───────────────────────────────────────────────
+# Grading metrics
+# ───────────────────────────────────────────────
+PDF_SECONDS = histogram(
+    "grading_pdf_seconds", "Seconds per PDF spent extracting text (PyMuPDF) or parsing the question bank.",
+    ["phase"],
+)
+PDF_CACHE = counter(
+    "grading_pdf_cache_total", "Question-bank lookups by where they were found (memory, disk, miss).",
+    ["result"],
+)
+MODEL_CALL_SECONDS = histogram(
+    "grading_model_call_seconds", "Seconds per model call, including rate limiting and retries.",
+    ["kind"], buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0),
+)
+MODEL_CALLS = counter(
+    "grading_model_calls_total", "Model calls by kind and outcome (ok, error, unavailable).",
+    ["kind", "outcome"],
+)
+MODEL_TOKENS = counter(
+    "grading_model_tokens_total", "Model tokens by direction (prompt, response); estimated when not reported.",
+    ["kind", "direction"],
+)
+ENGINE_EVENTS = counter(
+    "grading_engine_events_total", "Grading engine run counters (items, local_items, cache_hits, llm_calls, ...).",
+    ["event"],
+)
+DB_WRITE_SECONDS = histogram(
+    "grading_db_write_seconds", "Seconds per transaction committing graded submissions.",
+    ["path"],
+)
+DB_WRITTEN = counter(
+    "grading_db_written_submissions_total", "Graded submissions committed.",
+    ["path"],
+)
+DB_WRITE_ERRORS = counter(
+    "grading_db_write_errors_total", "Transactions committing graded submissions that failed.",
+    ["path"],
+)
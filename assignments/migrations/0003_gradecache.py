@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assignments', '0002_alter_questionfeedback_question_number'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GradeCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('model_name', models.CharField(max_length=100)),
+                ('max_marks', models.FloatField()),
+                ('score', models.FloatField()),
+                ('feedback', models.TextField(blank=True)),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+    ]
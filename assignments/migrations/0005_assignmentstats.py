@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_existing_stats(apps, schema_editor):
+    Assignment = apps.get_model('assignments', 'Assignment')
+    AssignmentStats = apps.get_model('assignments', 'AssignmentStats')
+    StudentSubmission = apps.get_model('assignments', 'StudentSubmission')
+    buckets = 10
+
+    for assignment in Assignment.objects.all():
+        max_marks = assignment.total_marks or 0
+        grades = list(
+            StudentSubmission.objects.filter(assignment=assignment, graded=True).values_list('grade', flat=True)
+        )
+        histogram = [0] * buckets
+        for grade in grades:
+            index = min(buckets - 1, max(0, int(grade / max_marks * buckets))) if max_marks > 0 else 0
+            histogram[index] += 1
+        AssignmentStats.objects.create(
+            assignment=assignment,
+            count=len(grades),
+            total=sum(grades),
+            total_squares=sum(grade * grade for grade in grades),
+            min_grade=min(grades, default=None),
+            max_grade=max(grades, default=None),
+            max_marks=max_marks,
+            histogram=histogram,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assignments', '0004_gradingjob_gradingtask'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssignmentStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total', models.FloatField(default=0)),
+                ('total_squares', models.FloatField(default=0)),
+                ('min_grade', models.FloatField(blank=True, null=True)),
+                ('max_grade', models.FloatField(blank=True, null=True)),
+                ('max_marks', models.FloatField(default=0)),
+                ('histogram', models.JSONField(default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('assignment', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='assignments.assignment')),
+            ],
+        ),
+        migrations.RunPython(build_existing_stats, migrations.RunPython.noop),
+    ]
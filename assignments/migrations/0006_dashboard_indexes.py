@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:37
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_classroom_branch_batch_index'),
+        ('assignments', '0005_assignmentstats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='assignment',
+            index=models.Index(fields=['classroom', 'deadline'], name='assignments_classro_27ba21_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studentsubmission',
+            index=models.Index(fields=['student', 'graded'], name='assignments_student_f050a5_idx'),
+        ),
+    ]
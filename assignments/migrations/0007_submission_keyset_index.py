@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:39
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assignments', '0006_dashboard_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='studentsubmission',
+            index=models.Index(fields=['assignment', 'submitted_at', 'id'], name='assignments_assignm_5dee37_idx'),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assignments', '0007_submission_keyset_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assignment',
+            name='parse_error',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='assignment',
+            name='parse_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('parsed', 'Parsed'), ('failed', 'Failed')], default='pending', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='studentsubmission',
+            name='parse_error',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='studentsubmission',
+            name='parse_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('parsed', 'Parsed'), ('failed', 'Failed')], default='pending', max_length=10),
+        ),
+        migrations.CreateModel(
+            name='ParsedQuestion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('question_number', models.CharField(max_length=10)),
+                ('subpart', models.CharField(blank=True, default='', max_length=10)),
+                ('question', models.TextField(blank=True)),
+                ('marks', models.IntegerField(default=0)),
+                ('answer', models.TextField(blank=True)),
+                ('assignment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='parsed_questions', to='assignments.assignment')),
+            ],
+            options={
+                'ordering': ['id'],
+                'unique_together': {('assignment', 'question_number', 'subpart')},
+            },
+        ),
+        migrations.CreateModel(
+            name='StudentAnswer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('question_number', models.CharField(max_length=10)),
+                ('subpart', models.CharField(blank=True, default='', max_length=10)),
+                ('answer', models.TextField(blank=True)),
+                ('submission', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='answers', to='assignments.studentsubmission')),
+            ],
+            options={
+                'ordering': ['id'],
+                'unique_together': {('submission', 'question_number', 'subpart')},
+            },
+        ),
+    ]
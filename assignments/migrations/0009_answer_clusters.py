@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assignments', '0008_ingestion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentanswer',
+            name='cluster_representative',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='assignments.studentsubmission'),
+        ),
+    ]
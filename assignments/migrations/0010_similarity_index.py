@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assignments', '0009_answer_clusters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarityBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.BigIntegerField()),
+                ('assignment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='assignments.assignment')),
+                ('submission', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='assignments.studentsubmission')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['assignment', 'key'], name='assignments_assignm_7101b7_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SimilarityPair',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(blank=True, default='', max_length=25)),
+                ('similarity', models.FloatField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('assignment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similarity_pairs', to='assignments.assignment')),
+                ('first', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='assignments.studentsubmission')),
+                ('second', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='assignments.studentsubmission')),
+            ],
+            options={
+                'ordering': ['-similarity', 'id'],
+                'unique_together': {('first', 'second', 'scope')},
+            },
+        ),
+        migrations.CreateModel(
+            name='SimilaritySignature',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(blank=True, default='', max_length=25)),
+                ('signature', models.BinaryField()),
+                ('submission', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similarity_signatures', to='assignments.studentsubmission')),
+            ],
+            options={
+                'unique_together': {('submission', 'scope')},
+            },
+        ),
+    ]
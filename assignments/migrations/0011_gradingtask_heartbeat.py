@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assignments', '0010_similarity_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gradingtask',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,7 +1,15 @@
 from django.db import models
 from django.conf import settings
+from django.utils.timezone import now
 from accounts.models import Classroom  # assuming Classroom is in the 'accounts' app
 
+# Outcome of extracting and parsing an uploaded PDF (assignments/ingest.py).
+PARSE_STATUS_CHOICES = [
+    ('pending', 'Pending'),
+    ('parsed', 'Parsed'),
+    ('failed', 'Failed'),
+]
+
 # ───────────────────────────────────────────────
 # Assignment Model (Unchanged except comments)
 # ───────────────────────────────────────────────
@@ -17,6 +25,13 @@ class Assignment(models.Model):
     # This can be used to show full score possible
     total_marks = models.FloatField(default=0)
 
+    # Solution PDF ingestion into ParsedQuestion rows
+    parse_status = models.CharField(max_length=10, choices=PARSE_STATUS_CHOICES, default='pending')
+    parse_error = models.TextField(blank=True, default='')
+
+    class Meta:
+        indexes = [models.Index(fields=['classroom', 'deadline'])]
+
     def __str__(self):
         return f"{self.title} - {self.classroom.name}"
     
@@ -35,6 +50,17 @@ class StudentSubmission(models.Model):
     feedback = models.TextField(blank=True, default='')  # General comment if needed
     graded = models.BooleanField(default=False)
 
+    # Submission PDF ingestion into StudentAnswer rows
+    parse_status = models.CharField(max_length=10, choices=PARSE_STATUS_CHOICES, default='pending')
+    parse_error = models.TextField(blank=True, default='')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['student', 'graded']),
+            # keyset pagination in view_submissions
+            models.Index(fields=['assignment', 'submitted_at', 'id']),
+        ]
+
     def __str__(self):
         return f"{self.student.username} - {self.assignment.title}"
 
@@ -49,6 +75,93 @@ class StudentSubmission(models.Model):
         return total
 
 
+# ───────────────────────────────────────────────
+# Parsed uploads (see assignments/ingest.py)
+# ───────────────────────────────────────────────
+class ParsedQuestion(models.Model):
+    """
+    One question of an assignment's solution PDF, or one sub-part of it
+    (subpart is the roman numeral, '' for the question itself). Rows are
+    stored in document order.
+    """
+    assignment = models.ForeignKey(Assignment, related_name='parsed_questions', on_delete=models.CASCADE)
+    question_number = models.CharField(max_length=10)
+    subpart = models.CharField(max_length=10, blank=True, default='')
+    question = models.TextField(blank=True)
+    marks = models.IntegerField(default=0)
+    answer = models.TextField(blank=True)
+
+    class Meta:
+        unique_together = ('assignment', 'question_number', 'subpart')
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.question_number}{f'({self.subpart})' if self.subpart else ''} ({self.marks} marks)"
+
+
+class StudentAnswer(models.Model):
+    """One answer of a submission, per question or sub-part, as parsed from its PDF."""
+    submission = models.ForeignKey(StudentSubmission, related_name='answers', on_delete=models.CASCADE)
+    question_number = models.CharField(max_length=10)
+    subpart = models.CharField(max_length=10, blank=True, default='')
+    answer = models.TextField(blank=True)
+    # Set when this answer was graded as a near-duplicate of another
+    # submission's answer (see assignments/clustering.py).
+    cluster_representative = models.ForeignKey(
+        StudentSubmission, null=True, blank=True, related_name='+', on_delete=models.SET_NULL,
+    )
+
+    class Meta:
+        unique_together = ('submission', 'question_number', 'subpart')
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.submission_id} {self.question_number}{f'({self.subpart})' if self.subpart else ''}"
+
+
+# ───────────────────────────────────────────────
+# Similarity index for copied submissions (see assignments/plagiarism.py)
+# ───────────────────────────────────────────────
+class SimilaritySignature(models.Model):
+    """
+    MinHash signature of a submission's answers: scope '' for the whole
+    submission, else one answer ("Q3", "Q3(ii)").
+    """
+    submission = models.ForeignKey(StudentSubmission, related_name='similarity_signatures', on_delete=models.CASCADE)
+    scope = models.CharField(max_length=25, blank=True, default='')
+    signature = models.BinaryField()
+
+    class Meta:
+        unique_together = ('submission', 'scope')
+
+
+class SimilarityBucket(models.Model):
+    """One LSH band bucket a signature falls in; key hashes the scope, band and band values."""
+    assignment = models.ForeignKey(Assignment, related_name='+', on_delete=models.CASCADE)
+    key = models.BigIntegerField()
+    submission = models.ForeignKey(StudentSubmission, related_name='+', on_delete=models.CASCADE)
+
+    class Meta:
+        indexes = [models.Index(fields=['assignment', 'key'])]
+
+
+class SimilarityPair(models.Model):
+    """Two submissions, or one answer of each, similar enough to suggest copying."""
+    assignment = models.ForeignKey(Assignment, related_name='similarity_pairs', on_delete=models.CASCADE)
+    first = models.ForeignKey(StudentSubmission, related_name='+', on_delete=models.CASCADE)
+    second = models.ForeignKey(StudentSubmission, related_name='+', on_delete=models.CASCADE)
+    scope = models.CharField(max_length=25, blank=True, default='')
+    similarity = models.FloatField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('first', 'second', 'scope')
+        ordering = ['-similarity', 'id']
+
+    def __str__(self):
+        return f"{self.first_id} ~ {self.second_id} {self.scope or 'submission'} ({self.similarity:.2f})"
+
+
 # ───────────────────────────────────────────────
 # NEW: Per-Question Feedback
 # ───────────────────────────────────────────────
@@ -65,3 +178,150 @@ class QuestionFeedback(models.Model):
 
     def __str__(self):
         return f"Q{self.question_number}: {self.obtained_marks}/{self.max_marks}"
+
+
+# ───────────────────────────────────────────────
+# Cached LLM grades for identical answers
+# ───────────────────────────────────────────────
+class GradeCache(models.Model):
+    """
+    One model verdict, keyed on a hash of the normalised teacher answer,
+    student answer, max marks, model name and prompt version.
+    See assignments/grade_cache.py.
+    """
+    key = models.CharField(max_length=64, unique=True)
+    model_name = models.CharField(max_length=100)
+    max_marks = models.FloatField()
+    score = models.FloatField()
+    feedback = models.TextField(blank=True)
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.key[:12]}… {self.score}/{self.max_marks} ({self.model_name})"
+
+# ───────────────────────────────────────────────
+# Background grading queue
+# ───────────────────────────────────────────────
+class GradingJob(models.Model):
+    """One "Grade Now" request for an assignment; owns a task per submission."""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    assignment = models.ForeignKey(Assignment, related_name='grading_jobs', on_delete=models.CASCADE)
+    requested_by = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Job #{self.id} - {self.assignment.title} ({self.status})"
+
+    def refresh_status(self):
+        """Derive the job status from its tasks and save it."""
+        counts = dict(
+            self.tasks.order_by().values_list('status').annotate(n=models.Count('id'))
+        )
+        if counts.get('pending') or counts.get('running'):
+            started = counts.get('running') or counts.get('done') or counts.get('failed')
+            self.status = 'running' if started else 'pending'
+            self.finished_at = None
+        else:
+            self.status = 'failed' if counts.get('failed') else 'done'
+            self.finished_at = self.finished_at or now()
+        if self.status != 'pending' and self.started_at is None:
+            self.started_at = now()
+        self.save(update_fields=['status', 'started_at', 'finished_at'])
+        return self.status
+
+
+class GradingTask(models.Model):
+    """Grading of one submission, claimed and run by `manage.py run_grading_worker`."""
+    STATUS_CHOICES = GradingJob.STATUS_CHOICES
+
+    job = models.ForeignKey(GradingJob, related_name='tasks', on_delete=models.CASCADE)
+    submission = models.ForeignKey(StudentSubmission, related_name='grading_tasks', on_delete=models.CASCADE)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    worker = models.CharField(max_length=100, blank=True, default='')
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # renewed by the worker while it runs the task; see grading_queue.heartbeat
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    duration_seconds = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'created_at'])]
+
+    def __str__(self):
+        return f"Task #{self.id} - {self.submission} ({self.status})"
+
+
+# ───────────────────────────────────────────────
+# Running grade statistics per assignment
+# ───────────────────────────────────────────────
+class AssignmentStats(models.Model):
+    """
+    Grade statistics for the graded submissions of one assignment, kept up
+    to date incrementally by assignments/grade_stats.py so pages can show
+    them without scanning the submissions.
+    """
+    HISTOGRAM_BUCKETS = 10
+
+    assignment = models.OneToOneField(Assignment, related_name='stats', on_delete=models.CASCADE)
+    count = models.PositiveIntegerField(default=0)
+    total = models.FloatField(default=0)
+    total_squares = models.FloatField(default=0)
+    min_grade = models.FloatField(null=True, blank=True)
+    max_grade = models.FloatField(null=True, blank=True)
+    # assignment.total_marks the histogram was bucketed against
+    max_marks = models.FloatField(default=0)
+    # submissions per equal-width bucket of 0 … max_marks
+    histogram = models.JSONField(default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Stats for {self.assignment.title}: {self.count} graded"
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    @property
+    def stddev(self):
+        if not self.count:
+            return None
+        variance = self.total_squares / self.count - self.mean ** 2
+        return max(variance, 0.0) ** 0.5
+
+    @property
+    def median(self):
+        """Median estimated from the histogram (linear within the middle bucket)."""
+        if not self.count or not self.histogram:
+            return None
+        width = self.max_marks / len(self.histogram) if self.max_marks > 0 else 0.0
+        half = self.count / 2
+        seen = 0
+        for index, bucket_count in enumerate(self.histogram):
+            if bucket_count and seen + bucket_count >= half:
+                estimate = width * (index + (half - seen) / bucket_count)
+                return min(max(estimate, self.min_grade), self.max_grade)
+            seen += bucket_count
+        return self.max_grade
+
+    def histogram_rows(self):
+        """(label, count, percent of graded) per bucket, for templates."""
+        width = self.max_marks / len(self.histogram) if self.histogram and self.max_marks > 0 else 0.0
+        return [
+            (f"{index * width:g}–{(index + 1) * width:g}", bucket_count,
+             round(100.0 * bucket_count / self.count) if self.count else 0)
+            for index, bucket_count in enumerate(self.histogram)
+        ]
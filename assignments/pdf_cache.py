@@ -0,0 +1,199 @@
+"""
+Content-addressed cache for parsed question banks.
+
+Entries are keyed on the SHA-256 of the file plus PARSER_VERSION, so a
+re-uploaded file with the same bytes is a hit and a parser change invalidates
+everything. There are two tiers:
+
+  • an in-process LRU (PDF_CACHE_MEMORY_ENTRIES entries), and
+  • JSON files under PDF_CACHE_DIR, evicted oldest-first once the directory
+    grows past PDF_CACHE_MAX_BYTES.
+
+Once warm, neither tier touches PyMuPDF. File hashes are themselves memoised
+on (path, size, mtime) so warm lookups don't re-read the PDF either.
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+
+from assignments.grader import PARSER_VERSION, parse_question_bank_pdf
+from assignments.metrics import PDF_CACHE
+
+_lock = threading.Lock()
+_memory = OrderedDict()      # cache key → {"bank": ...}
+_hashes = {}                 # (path, size, mtime_ns) → sha256 hex digest
+
+
+def _cache_dir():
+    return Path(getattr(settings, "PDF_CACHE_DIR", Path(settings.BASE_DIR) / "cache" / "pdf"))
+
+
+def _memory_limit():
+    return getattr(settings, "PDF_CACHE_MEMORY_ENTRIES", 256)
+
+
+def _disk_limit():
+    return getattr(settings, "PDF_CACHE_MAX_BYTES", 50 * 1024 * 1024)
+
+
+def file_sha256(path):
+    """SHA-256 of a file, memoised on its size and modification time."""
+    stat = os.stat(path)
+    stamp = (str(path), stat.st_size, stat.st_mtime_ns)
+    with _lock:
+        digest = _hashes.get(stamp)
+    if digest is None:
+        # Hash outside the lock; two threads may hash the same file, harmlessly.
+        sha = hashlib.sha256()
+        with open(path, "rb") as fh:
+            for chunk in iter(lambda: fh.read(1 << 16), b""):
+                sha.update(chunk)
+        digest = sha.hexdigest()
+        with _lock:
+            if len(_hashes) > 4096:
+                _hashes.clear()
+            _hashes[stamp] = digest
+    return digest
+
+
+def cache_key(path):
+    return f"{file_sha256(path)}-v{PARSER_VERSION}"
+
+
+# ───────────────────────────────────────────────
+# Memory tier
+# ───────────────────────────────────────────────
+def _memory_get(key):
+    with _lock:
+        entry = _memory.get(key)
+        if entry is not None:
+            _memory.move_to_end(key)
+        return entry
+
+
+def _memory_put(key, entry):
+    with _lock:
+        _memory[key] = entry
+        _memory.move_to_end(key)
+        while len(_memory) > _memory_limit():
+            _memory.popitem(last=False)
+
+
+# ───────────────────────────────────────────────
+# Disk tier
+# ───────────────────────────────────────────────
+def _disk_get(key):
+    path = _cache_dir() / f"{key}.json"
+    try:
+        with open(path, encoding="utf-8") as fh:
+            entry = json.load(fh)
+    except (OSError, ValueError):
+        return None
+    try:
+        os.utime(path)  # mark as recently used for eviction
+    except OSError:
+        pass
+    return entry
+
+
+def _disk_put(key, entry):
+    directory = _cache_dir()
+    try:
+        directory.mkdir(parents=True, exist_ok=True)
+        tmp = directory / f"{key}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(entry, fh)
+        os.replace(tmp, directory / f"{key}.json")
+        _evict_disk(directory)
+    except OSError as exc:
+        print(f"[pdf_cache] could not write {key}: {exc}")
+
+
+def _evict_disk(directory):
+    files = []
+    total = 0
+    for path in directory.glob("*.json"):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        files.append((stat.st_mtime, stat.st_size, path))
+        total += stat.st_size
+
+    limit = _disk_limit()
+    for _, size, path in sorted(files):
+        if total <= limit:
+            break
+        try:
+            path.unlink()
+            total -= size
+        except OSError:
+            pass
+
+
+# ───────────────────────────────────────────────
+# Public API
+# ───────────────────────────────────────────────
+def _load(path):
+    key = cache_key(path)
+
+    entry = _memory_get(key)
+    if entry is not None:
+        PDF_CACHE.inc(result="memory")
+        return entry
+
+    entry = _disk_get(key)
+    if entry is None:
+        PDF_CACHE.inc(result="miss")
+        # Stream page by page into the parser; the full text is never built.
+        entry = {"bank": parse_question_bank_pdf(path)}
+        _disk_put(key, entry)
+    else:
+        PDF_CACHE.inc(result="disk")
+
+    _memory_put(key, entry)
+    return entry
+
+
+def load_question_bank(path):
+    """
+    Cached equivalent of parse_question_bank(extract_text_from_pdf(path)).
+    The returned dict is shared between callers – treat it as read-only.
+    """
+    return _load(path)["bank"]
+
+
+def _init_parse_worker():
+    # Worker processes are spawned; make sure Django (settings for the PDF
+    # cache) is ready before parsing.
+    import django
+    django.setup()
+
+
+def load_question_banks(paths, workers=None):
+    """
+    Cached extract + parse for many PDFs, in order. With workers > 1 the
+    PyMuPDF work is spread over a process pool. Its processes are spawned,
+    not forked: the caller may already run the grade writer, model client
+    and heartbeat threads, whose locks a fork would copy mid-use.
+    """
+    paths = list(paths)
+    if not workers or workers <= 1 or len(paths) <= 1:
+        return [load_question_bank(path) for path in paths]
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_parse_worker,
+                             mp_context=multiprocessing.get_context("spawn")) as pool:
+        return list(pool.map(load_question_bank, paths, chunksize=max(1, len(paths) // (workers * 4))))
+
+
+def clear_memory_cache():
+    with _lock:
+        _memory.clear()
+        _hashes.clear()
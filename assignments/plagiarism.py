@@ -0,0 +1,129 @@
+"""
+Incremental similarity index for spotting copied submissions.
+
+Comparing every pair of submissions of an assignment is O(n²). Instead,
+when a submission's answers are ingested, index_submission:
+
+  1. computes MinHash signatures (assignments/clustering.py) of word
+     3-gram shingles, as copied text keeps runs of words, of the whole
+     submission (its answers joined, scope '') and of every answer of at
+     least PLAGIARISM_MIN_WORDS words (scope "Q3" / "Q3(ii)"),
+  2. looks up the LSH buckets of those signatures among the submissions
+     indexed before it, in one indexed query, and
+  3. checks only those candidates against their stored signatures, storing
+     each pair with an estimated Jaccard similarity of at least
+     PLAGIARISM_SIMILARITY as a SimilarityPair.
+
+Each new submission costs a constant number of queries plus its candidates,
+so the report stays current as submissions arrive. view_submissions lists
+the pairs; `manage.py build_similarity_index` backfills older submissions.
+"""
+import hashlib
+from collections import Counter
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from assignments.clustering import band_keys, minhash_signatures, word_shingles
+from assignments.models import SimilarityBucket, SimilarityPair, SimilaritySignature
+
+# 20 bands of 6 rows: pairs above ~0.6 similarity become candidates, and
+# copies at 0.75 are found with probability > 0.98.
+BANDS = 20
+
+
+def bucket_key(scope, band, values):
+    """Signed 64-bit hash of one band of a signature, so it fits a BigIntegerField."""
+    digest = hashlib.blake2b(f"{scope}:{band}:".encode() + values, digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def submission_texts(bank):
+    """{scope: text} for a student bank: the whole submission, and every long enough answer."""
+    answers = {}
+    for qid, q in bank.items():
+        answers[qid] = q["answer"]
+        for sub_id, sub in q["subparts"].items():
+            answers[f"{qid}({sub_id})"] = sub["answer"]
+
+    texts = {}
+    whole = "\n".join(answer for answer in answers.values() if answer.strip())
+    if whole:
+        texts[""] = whole
+    for scope, answer in answers.items():
+        if len(answer.split()) >= settings.PLAGIARISM_MIN_WORDS:
+            texts[scope] = answer
+    return texts
+
+
+def forget_submission(submission):
+    """Drop a submission from the index, along with every pair it is part of."""
+    SimilaritySignature.objects.filter(submission=submission).delete()
+    SimilarityBucket.objects.filter(submission=submission).delete()
+    SimilarityPair.objects.filter(Q(first=submission) | Q(second=submission)).delete()
+
+
+def index_submission(submission, bank, stats=None):
+    """
+    Add a submission to its assignment's index and store the pairs it forms
+    with other students' submissions indexed earlier; a resubmission is never
+    paired with the same student's earlier uploads. Returns the new SimilarityPair rows.
+    """
+    if stats is None:
+        stats = Counter()
+    threshold = settings.PLAGIARISM_SIMILARITY
+    texts = submission_texts(bank)
+    scopes = list(texts)
+
+    with transaction.atomic():
+        forget_submission(submission)
+        if not scopes:
+            return []
+        signatures, _ = minhash_signatures([texts[scope] for scope in scopes], word_shingles)
+        by_scope = dict(zip(scopes, signatures))
+
+        keys = {}  # bucket key → scope
+        for scope, signature in by_scope.items():
+            for band, values in band_keys(signature, BANDS):
+                keys[bucket_key(scope, band, values)] = scope
+
+        candidates = {}  # scope → submission ids
+        for key, other in (
+            SimilarityBucket.objects
+            .filter(assignment_id=submission.assignment_id, key__in=list(keys))
+            .exclude(submission__student_id=submission.student_id)
+            .values_list('key', 'submission_id')
+        ):
+            candidates.setdefault(keys[key], set()).add(other)
+
+        pairs = []
+        if candidates:
+            stored = SimilaritySignature.objects.filter(
+                submission_id__in=set().union(*candidates.values()), scope__in=list(candidates),
+            ).values_list('submission_id', 'scope', 'signature')
+            for other, scope, blob in stored:
+                if other not in candidates[scope]:
+                    continue
+                stats['candidates'] += 1
+                similarity = float((np.frombuffer(blob, dtype=np.uint64) == by_scope[scope]).mean())
+                if similarity >= threshold:
+                    pairs.append(SimilarityPair(
+                        assignment_id=submission.assignment_id, first_id=other, second=submission,
+                        scope=scope, similarity=similarity,
+                    ))
+
+        SimilaritySignature.objects.bulk_create(
+            SimilaritySignature(submission=submission, scope=scope, signature=signature.tobytes())
+            for scope, signature in by_scope.items()
+        )
+        SimilarityBucket.objects.bulk_create(
+            SimilarityBucket(assignment_id=submission.assignment_id, key=key, submission=submission)
+            for key in keys
+        )
+        SimilarityPair.objects.bulk_create(pairs)
+
+    stats['indexed'] += 1
+    stats['pairs'] += len(pairs)
+    return pairs
@@ -0,0 +1,93 @@
+"""
+Lexical-similarity prescreen for free-form answers.
+
+For one question, the teacher answer and every student answer to it are
+turned into TF-IDF vectors in a single sparse pass (the IDF is learned from
+that class's answers), and each student's cosine similarity to the teacher
+answer is one sparse matrix-vector product. The extremes are decided
+without the model:
+
+  • similarity ≥ PRESCREEN_FULL_SIMILARITY, with a comparable length:
+    a near-verbatim copy of the teacher answer → full marks
+  • similarity ≤ PRESCREEN_ZERO_SIMILARITY, or an empty answer:
+    no overlap with the teacher answer at all → zero
+
+Everything in between still goes to the model.
+"""
+import re
+
+import numpy as np
+from django.conf import settings
+from scipy import sparse
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+# Near-verbatim also needs about as many words as the teacher answer.
+MIN_LENGTH_RATIO = 0.8
+
+
+def _tokens(text):
+    return _TOKEN.findall(text.lower())
+
+
+def tfidf_matrix(documents):
+    """
+    L2-normalised TF-IDF rows (sublinear tf, smoothed idf) for `documents`,
+    as a CSR matrix, plus each document's token count.
+    """
+    vocabulary = {}
+    indptr, indices, data, lengths = [0], [], [], []
+    for document in documents:
+        tokens = _tokens(document)
+        lengths.append(len(tokens))
+        counts = {}
+        for token in tokens:
+            column = vocabulary.setdefault(token, len(vocabulary))
+            counts[column] = counts.get(column, 0) + 1
+        indices.extend(counts)
+        data.extend(counts.values())
+        indptr.append(len(indices))
+
+    matrix = sparse.csr_matrix(
+        (np.asarray(data, dtype=np.float64), np.asarray(indices, dtype=np.int64), np.asarray(indptr)),
+        shape=(len(documents), max(1, len(vocabulary))),
+    )
+    if matrix.nnz:
+        matrix.data = 1.0 + np.log(matrix.data)
+        document_frequency = np.bincount(matrix.indices, minlength=matrix.shape[1])
+        idf = np.log((1.0 + len(documents)) / (1.0 + document_frequency)) + 1.0
+        matrix = matrix.multiply(idf).tocsr()
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        matrix = sparse.diags(1.0 / norms) @ matrix
+    return matrix.tocsr(), np.asarray(lengths)
+
+
+def similarities(teacher_answer, student_answers):
+    """Cosine similarity of every student answer to the teacher answer, and the token counts."""
+    matrix, lengths = tfidf_matrix([teacher_answer, *student_answers])
+    scores = (matrix[1:] @ matrix[0].T).toarray().ravel()
+    return scores, lengths[1:], lengths[0]
+
+
+def prescreen_answers(teacher_answer, student_answers, marks):
+    """
+    One entry per student answer: (score, feedback) when the similarity is
+    decisive, else None. Does nothing for an empty teacher answer.
+    """
+    if not student_answers or not _tokens(teacher_answer):
+        return [None] * len(student_answers)
+
+    full = settings.PRESCREEN_FULL_SIMILARITY
+    zero = settings.PRESCREEN_ZERO_SIMILARITY
+    scores, lengths, teacher_length = similarities(teacher_answer, student_answers)
+
+    results = []
+    for score, length in zip(scores.tolist(), lengths.tolist()):
+        if length == 0 or score <= zero:
+            results.append((0.0, f"No overlap with the expected answer (similarity {score:.2f})."))
+        elif score >= full and min(length, teacher_length) >= MIN_LENGTH_RATIO * max(length, teacher_length):
+            results.append((marks, f"Matches the expected answer (similarity {score:.2f})."))
+        else:
+            results.append(None)
+    return results
@@ -1,3 +1,1049 @@
-from django.test import TestCase
+import json
+import os
+import random
+import tempfile
+import threading
+from collections import Counter
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.timezone import now
+
+from accounts.models import Classroom
+from assignments.answer_types import classify_answer, grade_locally
+from assignments.backends import BackendError, FakeModel, FakeResponse, build_model, fake_grade, parse_latency
+from assignments.benchmark.concurrency import run_concurrency_stress
+from assignments.benchmark.parser import legacy_parse_question_bank, make_bank_text
+from assignments.clustering import assignment_clusters, cluster_texts
+from assignments.engine import format_run_stats, grade_submissions, plan_question_batches
+from assignments.grade_stats import rebuild_assignment_stats
+from assignments.grading_queue import (
+    claim_tasks, enqueue_grading_job, renew_leases, requeue_stale_tasks, run_tasks,
+)
+from assignments.benchmark.synthetic import bank_lines, build_question_bank, write_pdf
+from assignments.grader import (
+    GradingError, estimate_tokens, extract_text_from_pdf, grade_answer, grade_question_batch,
+    grade_submission_batch, parse_question_bank, parse_question_bank_pdf,
+)
+from assignments.ingest import (
+    bank_total_marks, ingest_solution, schedule_submission_ingest, solution_bank, submission_banks,
+)
+from assignments.llm_client import ModelConfigurationError, RateLimitedModel
+from assignments.metrics import DB_WRITTEN, MODEL_CALLS, PDF_CACHE
+from assignments.models import (
+    Assignment, AssignmentStats, GradeCache, GradingTask, ParsedQuestion, QuestionFeedback, SimilarityPair,
+    SimilaritySignature, StudentAnswer, StudentSubmission,
+)
+from assignments import pdf_cache
+from assignments.pdf_cache import load_question_bank
+from assignments.plagiarism import index_submission
+from assignments.prescreen import prescreen_answers
+from assignments.utils import (
+    grade_assignment_submissions, grade_single_submission, save_many_question_results, save_question_results,
+)
+
+
+def make_results(count, score=1.5):
+    return [(f"Q{n}", 2.0, score, f"Feedback {n}") for n in range(1, count + 1)]
+
+
+class GradedAssignmentMixin:
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        teacher = User.objects.create(username="teacher", user_type="teacher")
+        classroom = Classroom.objects.create(
+            teacher=teacher, name="DS", subject_name="Data Structures",
+            subject_code="CS201", branch="CSE", batch=2025,
+        )
+        cls.assignment = Assignment.objects.create(
+            title="A1", classroom=classroom, teacher=teacher,
+            question_file="q.pdf", question_solution_file="s.pdf", deadline=now(), total_marks=60,
+        )
+        cls.submissions = [
+            StudentSubmission.objects.create(
+                assignment=cls.assignment,
+                student=User.objects.create(username=f"student{n}"),
+                submitted_file=f"sub{n}.pdf",
+            )
+            for n in range(3)
+        ]
+        rebuild_assignment_stats(cls.assignment)
+
+
+@override_settings(GRADING_PRESCREEN=False, GRADING_CLUSTERING=False, GRADE_CACHE_TTL_DAYS=30)
+class GradeCacheTests(TestCase):
+    teacher = {
+        "Q1": {"question": "", "marks": 5, "answer": "Paging maps fixed-size pages onto frames", "subparts": {}},
+        "Q2": {"question": "", "marks": 5, "answer": "A semaphore counts available resources", "subparts": {}},
+    }
+    students = [
+        {"Q1": {"answer": "Pages are mapped to frames", "subparts": {}},
+         "Q2": {"answer": "It counts resources", "subparts": {}}},
+        {"Q1": {"answer": "Pages are mapped to frames", "subparts": {}},
+         "Q2": {"answer": "A lock with a counter", "subparts": {}}},
+        {"Q1": {"answer": "Memory is split into pages", "subparts": {}},
+         "Q2": {"answer": "Semaphores block waiting threads", "subparts": {}}},
+    ]
+
+    def grade(self):
+        stats = Counter()
+        results = list(grade_submissions(self.teacher, [(None, s) for s in self.students], FakeModel(), stats=stats))
+        return stats, results
+
+    def test_repeated_answers_are_served_from_the_cache(self):
+        first, graded = self.grade()
+        # Two students share a Q1 answer: one model call, and not a cache hit.
+        self.assertEqual((first["cache_hits"], first["cache_misses"], first["llm_calls"]), (0, 5, 5))
+        self.assertEqual(first["duplicate_items"], 1)
+        self.assertEqual(GradeCache.objects.count(), 5)
+
+        second, regraded = self.grade()
+        self.assertEqual((second["cache_hits"], second["duplicate_items"], second["llm_calls"]), (5, 1, 0))
+        self.assertIn("cache hit-rate 100.0% (5/5)", format_run_stats(second))
+        self.assertEqual(regraded, graded)
+        self.assertEqual(set(GradeCache.objects.values_list("hits", flat=True)), {1})
+
+    def test_expired_entries_are_regraded_and_pruned(self):
+        self.grade()
+        GradeCache.objects.update(created_at=now() - timedelta(days=31))
+
+        stats, _ = self.grade()
+        self.assertEqual((stats["cache_misses"], stats["llm_calls"]), (5, 5))
+        self.assertEqual(GradeCache.objects.count(), 5)
+        self.assertFalse(GradeCache.objects.filter(created_at__lt=now() - timedelta(days=30)).exists())
+
+    def test_batched_verdicts_are_cached_apart(self):
+        self.grade()
+        stats = Counter()
+        list(grade_submissions(self.teacher, [(None, s) for s in self.students], FakeModel(), stats=stats,
+                               mode="submission"))
+        self.assertEqual((stats["cache_hits"], stats["cache_misses"]), (0, 5))
+
+
+class CannedModel:
+    """Answers every prompt with the same text."""
+
+    def __init__(self, text):
+        self.text = text
+
+    def generate_content(self, prompt, **kwargs):
+        return FakeResponse(self.text)
+
+
+class ForgetfulModel(FakeModel):
+    """FakeModel that leaves the last item out of every batched answer."""
+
+    def generate_content(self, prompt, **kwargs):
+        response = super().generate_content(prompt, **kwargs)
+        if "(JSON):" in prompt:
+            payload = json.loads(response.text)
+            payload["results"].pop()
+            response = FakeResponse(json.dumps(payload))
+        return response
+
+
+@override_settings(GRADING_PRESCREEN=False, GRADING_CLUSTERING=False)
+class BatchGradingTests(TestCase):
+    items = [
+        {"id": f"Q{n}", "teacher_answer": "Paging maps pages to frames", "student_answer": "Pages go to frames",
+         "marks": 5}
+        for n in range(1, 6)
+    ]
+
+    def test_invalid_entries_are_dropped(self):
+        results = [
+            {"id": "Q1", "score": 4, "feedback": "Good."},
+            {"id": "Q2", "score": 3, "feedback": "Once."},
+            {"id": "Q2", "score": 2, "feedback": "Twice."},
+            {"id": "Q3", "score": 9, "feedback": "Above the maximum."},
+            {"id": "Q4", "score": "n/a", "feedback": "Not a number."},
+            {"id": "Q5", "score": 1},
+            {"id": "Q9", "score": 1, "feedback": "Unknown id."},
+        ]
+        text = "```json\n" + json.dumps({"results": results}) + "\n```"
+        self.assertEqual(grade_submission_batch(self.items, CannedModel(text)), {"Q1": (4.0, "Good.")})
+        self.assertEqual(grade_submission_batch(self.items, CannedModel("4.5\nNot JSON")), {})
+
+    def test_only_unusable_replies_fall_back(self):
+        class BlockedResponse:
+            @property
+            def text(self):
+                raise ValueError("response was blocked")
+
+        class BlockedModel:
+            def generate_content(self, prompt, **kwargs):
+                return BlockedResponse()
+
+        self.assertEqual(grade_submission_batch(self.items, BlockedModel()), {})
+        with self.assertRaises(GradingError):
+            grade_submission_batch(self.items, RejectingModel(500))
+        with self.assertRaises(KeyError):
+            grade_submission_batch([{"id": "Q1"}], FakeModel())
+
+    def test_missing_items_fall_back_to_single_calls(self):
+        teacher = {item["id"]: {"question": "", "marks": 5, "answer": f"{item['teacher_answer']} {item['id']}",
+                                "subparts": {}} for item in self.items[:3]}
+        student = {qid: {"answer": f"Pages go to frames {qid}", "subparts": {}} for qid in teacher}
+
+        stats = Counter()
+        (_, batched), = grade_submissions(teacher, [(None, student)], ForgetfulModel(), stats=stats,
+                                          use_cache=False, mode="submission")
+        self.assertEqual((stats["llm_calls"], stats["batch_fallbacks"]), (2, 1))
+
+        (_, single), = grade_submissions(teacher, [(None, student)], FakeModel(), use_cache=False)
+        self.assertEqual([row[2] for row in batched], [row[2] for row in single])
+        self.assertEqual(batched[-1][3], "Graded by the fake backend.")
+
+
+@override_settings(GRADING_PRESCREEN=False, GRADING_CLUSTERING=False)
+class ClassModeTests(TestCase):
+    teacher_answer = "t" * 36   # 10 tokens, sent once per batch
+
+    def item(self, tokens):
+        return {"teacher_answer": self.teacher_answer, "student_answer": "s" * (4 * (tokens - 1))}
+
+    def sizes(self, batches):
+        return [[estimate_tokens(item["student_answer"]) for item in batch] for batch in batches]
+
+    def test_batches_respect_size_and_token_budget(self):
+        items = [self.item(10) for _ in range(5)]
+        self.assertEqual(self.sizes(plan_question_batches(items, 2, 1000)), [[10, 10], [10, 10], [10]])
+        self.assertEqual(self.sizes(plan_question_batches(items, 10, 40)), [[10, 10, 10], [10, 10]])
+
+        items = [self.item(10), self.item(500), self.item(10), self.item(10)]
+        self.assertEqual(self.sizes(plan_question_batches(items, 10, 100)), [[10], [500], [10, 10]])
+        self.assertEqual(plan_question_batches([], 10, 100), [])
+
+    def test_one_call_per_batch_of_students(self):
+        teacher = {"Q1": {"question": "", "marks": 5, "answer": "Paging maps pages to frames", "subparts": {}}}
+        students = [(None, {"Q1": {"answer": f"Pages and frames, take {n}", "subparts": {}}}) for n in range(5)]
+
+        stats = Counter()
+        graded = list(grade_submissions(teacher, students, FakeModel(), stats=stats, use_cache=False,
+                                        mode="class", batch_size=2))
+        self.assertEqual((stats["llm_calls"], stats["batch_fallbacks"]), (3, 0))
+        single = list(grade_submissions(teacher, students, FakeModel(), use_cache=False))
+        self.assertEqual(graded, single)
+
+    def test_a_failed_fallback_fails_only_its_student(self):
+        class ForgetfulRejectingModel(ForgetfulModel):
+            """Drops the last student of every batch and cannot grade them one by one either."""
+
+            def generate_content(self, prompt, **kwargs):
+                if "(JSON):" not in prompt:
+                    raise BackendError("400 blocked (fake)", code=400)
+                return super().generate_content(prompt, **kwargs)
+
+        teacher = {"Q1": {"question": "", "marks": 5, "answer": "Paging maps pages to frames", "subparts": {}}}
+        students = [(n, {"Q1": {"answer": f"Pages and frames, take {n}", "subparts": {}}}) for n in range(4)]
+        stats, failures = Counter(), {}
+        graded = list(grade_submissions(teacher, students, ForgetfulRejectingModel(), stats=stats,
+                                        failures=failures, use_cache=False, mode="class", batch_size=4))
+
+        self.assertEqual([submission for submission, _ in graded], [0, 1, 2])
+        self.assertEqual(list(failures), [3])
+        self.assertEqual(stats["batch_fallbacks"], 1)
+
+    def test_failed_batch_calls_raise(self):
+        answers = [("s1", "Pages go to frames"), ("s2", "Frames hold pages")]
+        with self.assertRaises(GradingError):
+            grade_question_batch("Paging maps pages to frames", 5, answers, RejectingModel(500))
+        self.assertEqual(grade_question_batch("Paging", 5, answers, CannedModel("Not JSON")), {})
+
+
+class GradingQueueTests(GradedAssignmentMixin, TestCase):
+
+    def test_only_lapsed_leases_are_requeued(self):
+        enqueue_grading_job(self.assignment)
+        slow = claim_tasks("slow-worker", limit=2)
+        crashed, = claim_tasks("crashed-worker", limit=1)
+        GradingTask.objects.update(heartbeat_at=now() - timedelta(seconds=1000))
+
+        renew_leases("slow-worker")
+        self.assertEqual(requeue_stale_tasks(900), 1)
+        statuses = dict(GradingTask.objects.values_list("id", "status"))
+        self.assertEqual([statuses[task.id] for task in slow], ["running", "running"])
+        self.assertEqual(statuses[crashed.id], "pending")
+
+    def enqueue_parsed(self):
+        ParsedQuestion.objects.create(assignment=self.assignment, question_number="Q1", marks=5, answer="LIFO")
+        Assignment.objects.filter(pk=self.assignment.pk).update(parse_status="parsed")
+        for submission in self.submissions:
+            StudentAnswer.objects.create(submission=submission, question_number="Q1", answer="A LIFO list")
+        StudentSubmission.objects.update(parse_status="parsed")
+        enqueue_grading_job(self.assignment)
+
+    def test_a_requeued_task_is_not_finished_by_its_old_worker(self):
+        self.enqueue_parsed()
+        task, *_ = claim_tasks("old-worker", limit=3)
+        GradingTask.objects.filter(pk=task.pk).update(heartbeat_at=now() - timedelta(seconds=1000))
+        requeue_stale_tasks(900)
+        (new,) = [t for t in claim_tasks("new-worker", limit=3) if t.pk == task.pk]
+
+        stats = run_tasks([task], FakeModel())
+        self.assertEqual((stats["tasks_lost"], stats["tasks_done"]), (1, 0))
+        new.refresh_from_db()
+        self.assertEqual((new.status, new.worker), ("running", "new-worker"))
+
+    @override_settings(GRADING_PRESCREEN=False)
+    def test_failed_tasks_are_retried_unowned(self):
+        self.enqueue_parsed()
+        tasks = claim_tasks("worker", limit=3)
+
+        stats = run_tasks(tasks, RejectingModel(400))
+        self.assertEqual((stats["tasks_retried"], stats["tasks_failed"]), (3, 0))
+        self.assertEqual(set(GradingTask.objects.values_list("status", "worker", "finished_at")),
+                         {("pending", "", None)})
+
+    def test_a_rejected_configuration_stops_the_worker(self):
+        self.enqueue_parsed()
+        tasks = claim_tasks("worker", limit=3)
+
+        with self.assertRaises(ModelConfigurationError):
+            run_tasks(tasks, RejectingModel(401))
+        self.assertEqual(set(GradingTask.objects.values_list("status", "attempts")), {("pending", 0)})
+
+
+class GradeDueSubmissionsTests(TestCase):
+
+    @override_settings(GRADING_SERIAL_WRITER=True)
+    def test_save_batch_is_rejected_while_the_writer_batches(self):
+        with self.assertRaisesMessage(CommandError, "GRADING_SERIAL_WRITER"):
+            call_command("grade_due_submissions", save_batch=5)
+
+
+class FakeBackendTests(TestCase):
+
+    def test_latency_specs(self):
+        rng = random.Random(1)
+        self.assertEqual(parse_latency("0.2")(rng), 0.2)
+        self.assertEqual(parse_latency("fixed:0.3")(rng), 0.3)
+        self.assertEqual(parse_latency(None)(rng), 0.0)
+        self.assertTrue(0.1 <= parse_latency("uniform:0.1,0.5")(rng) <= 0.5)
+        self.assertGreaterEqual(parse_latency("normal:0.3,0.1")(rng), 0.0)
+        self.assertGreater(parse_latency("lognormal:-1.5,0.5")(rng), 0.0)
+        self.assertEqual(parse_latency("exp:0")(rng), 0.0)
+        for spec in ("uniform:0.1", "gamma:1,2", "fixed:a"):
+            with self.assertRaises(ValueError):
+                parse_latency(spec)
+
+    def test_grades_are_deterministic(self):
+        prompt = ("Maximum marks = 4\nTeacher's Answer: paging maps pages to frames\n"
+                  "Student's Answer: paging maps pages\nFirst line should contain the score")
+        self.assertEqual(fake_grade(prompt), fake_grade(prompt))
+        self.assertEqual(fake_grade(prompt).split("\n")[0], "2.5")
+
+        batch = 'Items (JSON):\n[{"id": "a", "teacher_answer": "x y", "student_answer": "x y", "max_marks": 2}]\n'
+        self.assertEqual(json.loads(fake_grade(batch))["results"][0]["score"], 2.0)
+
+    def test_injected_errors(self):
+        with self.assertRaises(BackendError) as throttled:
+            FakeModel(throttle_rate=1.0).generate_content("Maximum marks = 1")
+        self.assertEqual(throttled.exception.code, 429)
+
+        with self.assertRaises(BackendError) as failed:
+            FakeModel(error_rate=1.0).generate_content("Maximum marks = 1")
+        self.assertEqual(failed.exception.code, 500)
+
+    def test_build_model(self):
+        model = build_model("fake", "gemini-1.5-flash")
+        self.assertIsInstance(model, FakeModel)
+        self.assertEqual(model.model_name, "fake-gemini-1.5-flash")
+        with self.assertRaises(ValueError):
+            build_model("nope", "gemini-1.5-flash")
+
+
+class QuestionBankParserTests(TestCase):
+
+    def test_roman_subparts_beyond_iii(self):
+        bank = parse_question_bank("\n".join([
+            "Q1. Answer the following: (9 marks)",
+            "(iv) What is a stack? (2 marks)",
+            "(v) What is a queue? (3 marks)",
+            "(ix) What is a heap? (4 marks)",
+            "Ans (ix): A tree ordered by priority",
+            "Last in, first out",
+            "Ans (v):   First in, first out",
+            "Q2. Define paging. (2 marks)",
+            "Ans: Pages map to frames",
+        ]))
+
+        subparts = bank["Q1"]["subparts"]
+        self.assertEqual(list(subparts), ["iv", "v", "ix"])
+        self.assertEqual(subparts["iv"], {"question": "What is a stack?", "marks": 2, "answer": "Last in, first out"})
+        self.assertEqual(subparts["v"]["answer"], "First in, first out")
+        self.assertEqual(subparts["ix"]["answer"], "A tree ordered by priority")
+        self.assertEqual(bank["Q2"]["answer"], "Pages map to frames")
+
+    def test_matches_the_legacy_parser(self):
+        text = make_bank_text(questions=60, subparts=6, answer_lines=3, seed=4)
+        self.assertEqual(parse_question_bank(text), legacy_parse_question_bank(text))
+
+
+class PdfCacheTests(TestCase):
+    sample = Path(settings.BASE_DIR) / "Question_Answers_Teacher.pdf"
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+        pdf_cache.clear_memory_cache()
+        self.addCleanup(pdf_cache.clear_memory_cache)
+
+    def test_memory_tier_keeps_the_most_recently_used_entries(self):
+        with override_settings(PDF_CACHE_MEMORY_ENTRIES=2):
+            for key in ("a", "b"):
+                pdf_cache._memory_put(key, {"bank": key})
+            pdf_cache._memory_get("a")
+            pdf_cache._memory_put("c", {"bank": "c"})
+        self.assertEqual(list(pdf_cache._memory), ["a", "c"])
+
+    def test_disk_tier_evicts_the_oldest_files(self):
+        # Four ~100-byte entries against a 250-byte budget: the two oldest go.
+        with override_settings(PDF_CACHE_DIR=self.dir):
+            for age, key in enumerate(("new", "middle", "old")):
+                pdf_cache._disk_put(key, {"bank": "x" * 90})
+                os.utime(self.dir / f"{key}.json", (1e9 - age, 1e9 - age))
+        with override_settings(PDF_CACHE_DIR=self.dir, PDF_CACHE_MAX_BYTES=250):
+            pdf_cache._disk_put("newest", {"bank": "x" * 90})
+        self.assertEqual(sorted(path.stem for path in self.dir.glob("*.json")), ["new", "newest"])
+
+    def test_a_parser_change_invalidates_entries(self):
+        with override_settings(PDF_CACHE_DIR=self.dir):
+            bank = load_question_bank(self.sample)
+            misses = PDF_CACHE.value(result="miss")
+            self.assertEqual(load_question_bank(self.sample), bank)
+            self.assertEqual(PDF_CACHE.value(result="miss"), misses)
+
+            with mock.patch.object(pdf_cache, "PARSER_VERSION", pdf_cache.PARSER_VERSION + 1):
+                self.assertEqual(load_question_bank(self.sample), bank)
+            self.assertEqual(PDF_CACHE.value(result="miss"), misses + 1)
+        self.assertEqual(len(list(self.dir.glob("*.json"))), 2)
+
+
+class PdfParsingTests(TestCase):
+    SAMPLES = ("Question_Answers_Teacher.pdf", "Question_Answers_Student.pdf", "Question_teachers.pdf")
+
+    def assertStreamsLikeWholeText(self, path):
+        self.assertEqual(parse_question_bank_pdf(path), parse_question_bank(extract_text_from_pdf(path)))
+
+    def test_sample_pdfs(self):
+        for name in self.SAMPLES:
+            with self.subTest(pdf=name):
+                path = Path(settings.BASE_DIR) / name
+                self.assertTrue(parse_question_bank_pdf(path))
+                self.assertStreamsLikeWholeText(path)
+
+    def test_stress_pdf(self):
+        bank = build_question_bank(questions=300, subparts=4, answer_words=80, seed=3)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "stress.pdf"
+            self.assertEqual(write_pdf(path, bank_lines(bank), min_pages=500), 500)
+            parsed = parse_question_bank_pdf(path)
+            self.assertStreamsLikeWholeText(path)
+        self.assertEqual(len(parsed), 300)
+        self.assertEqual(list(parsed["Q3"]["subparts"]), ["i", "ii", "iii", "iv"])
+
+
+class RejectingModel(FakeModel):
+    """FakeModel that fails with HTTP `code` on every prompt containing `marker`."""
+
+    def __init__(self, code, marker=""):
+        super().__init__()
+        self.code = code
+        self.marker = marker
+
+    def generate_content(self, prompt, **kwargs):
+        if self.marker in prompt:
+            raise BackendError(f"{self.code} rejected (fake)", code=self.code)
+        return super().generate_content(prompt, **kwargs)
+
+
+@override_settings(GRADING_PRESCREEN=False, GRADING_CLUSTERING=False)
+class ModelErrorTests(TestCase):
+
+    def test_auth_errors_make_grading_unavailable_without_retries(self):
+        for code in (401, 403):
+            client = RateLimitedModel(RejectingModel(code), backoff_base=0)
+            with self.assertRaises(ModelConfigurationError):
+                grade_answer("Paging", "Pages", 5, client)
+            self.assertEqual(client.stats_snapshot()["requests"], 1)
+        # Unwrapped models too.
+        with self.assertRaises(ModelConfigurationError):
+            grade_answer("Paging", "Pages", 5, RejectingModel(401))
+
+    def test_no_usable_grade_is_an_error_not_a_zero(self):
+        for model in (RejectingModel(400), CannedModel("Well argued"), CannedModel("9\nToo generous")):
+            with self.assertRaises(GradingError):
+                grade_answer("Paging maps pages to frames", "Pages go to frames", 5, model)
+
+    def test_submissions_with_ungradable_answers_are_not_yielded(self):
+        teacher = {"Q1": {"question": "", "marks": 5, "answer": "Paging maps pages to frames", "subparts": {}}}
+        students = [("ok", {"Q1": {"answer": "Pages go to frames", "subparts": {}}}),
+                    ("blocked", {"Q1": {"answer": "BLOCKED content", "subparts": {}}})]
+        stats, failures = Counter(), {}
+        graded = list(grade_submissions(teacher, students, RejectingModel(400, marker="BLOCKED"),
+                                        stats=stats, failures=failures, use_cache=False))
+
+        self.assertEqual([submission for submission, _ in graded], ["ok"])
+        self.assertEqual(list(failures), ["blocked"])
+        self.assertIn("1 left ungraded after grading errors", format_run_stats(stats))
+
+
+class PeakConcurrencyModel(FakeModel):
+    """FakeModel that records how many calls it ever had in flight at once."""
+
+    def __init__(self, latency):
+        super().__init__(latency=latency)
+        self.in_flight = self.peak = 0
+
+    def generate_content(self, prompt, **kwargs):
+        with self.lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        try:
+            return super().generate_content(prompt, **kwargs)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+@override_settings(GRADING_PRESCREEN=False, GRADING_CLUSTERING=False)
+class ClientConcurrencyTests(TestCase):
+
+    def test_results_keep_submission_and_question_order(self):
+        teacher = {f"Q{q}": {"question": "", "marks": 5, "answer": f"Paging maps pages to frames {q}", "subparts": {}}
+                   for q in range(1, 5)}
+        students = [(n, {qid: {"answer": f"Pages go to frames {qid} {n}", "subparts": {}} for qid in teacher})
+                    for n in range(12)]
+
+        serial = list(grade_submissions(teacher, students, FakeModel(), max_in_flight=1, use_cache=False))
+        shuffled = FakeModel(latency="uniform:0,0.02", seed=7)
+        concurrent = list(grade_submissions(teacher, students, shuffled, max_in_flight=16, use_cache=False))
+
+        self.assertEqual([submission for submission, _ in concurrent], list(range(12)))
+        self.assertEqual([[row[0] for row in rows] for _, rows in concurrent], [list(teacher)] * 12)
+        self.assertEqual(concurrent, serial)
+
+    def test_a_run_can_raise_the_shared_client_ceiling(self):
+        model = PeakConcurrencyModel(latency="0.05")
+        client = RateLimitedModel(model, max_concurrency=2)
+        teacher = {"Q1": {"question": "", "marks": 5, "answer": "Paging maps pages to frames", "subparts": {}}}
+        students = [(n, {"Q1": {"answer": f"Pages go to frames {n}", "subparts": {}}}) for n in range(6)]
+
+        list(grade_submissions(teacher, students, client, max_in_flight=6, use_cache=False))
+        self.assertEqual(model.peak, 6)
+
+
+class SaveQuestionResultsTests(GradedAssignmentMixin, TestCase):
+
+    def legacy_save(self, submission, per_question_results):
+        """The per-row write path save_question_results replaced."""
+        for qid, q_max, q_got, q_fb in per_question_results:
+            QuestionFeedback.objects.update_or_create(
+                submission=submission, question_number=qid,
+                defaults={"max_marks": q_max, "obtained_marks": q_got, "feedback": q_fb},
+            )
+        submission.graded = True
+        submission.save(update_fields=["graded", "feedback"])
+        submission.recompute_grade()
+
+    def test_query_count_is_constant_per_submission(self):
+        # savepoint, upsert, submission UPDATE, stats SELECT + UPDATE, release
+        with self.assertNumQueries(6):
+            save_question_results(self.submissions[0], make_results(3))
+        with self.assertNumQueries(6):
+            save_question_results(self.submissions[1], make_results(30))
+
+    def test_legacy_path_grows_with_question_count(self):
+        with CaptureQueriesContext(connection) as legacy:
+            self.legacy_save(self.submissions[0], make_results(30))
+        with CaptureQueriesContext(connection) as bulk:
+            save_question_results(self.submissions[1], make_results(30))
+        self.assertGreaterEqual(len(legacy), 2 * 30)
+        self.assertEqual(len(bulk), 6)
+
+    def test_regrading_updates_rows_in_place(self):
+        submission = self.submissions[0]
+        save_question_results(submission, make_results(3, score=1.0))
+        save_question_results(submission, make_results(3, score=2.0))
+
+        rows = QuestionFeedback.objects.filter(submission=submission)
+        self.assertEqual(rows.count(), 3)
+        self.assertEqual({row.obtained_marks for row in rows}, {2.0})
+
+        submission.refresh_from_db()
+        self.assertTrue(submission.graded)
+        self.assertEqual(submission.grade, 6.0)
+        self.assertEqual(submission.grade, submission.recompute_grade(commit=False))
+
+    def test_many_submissions_share_one_transaction(self):
+        graded = [(submission, make_results(10)) for submission in self.submissions]
+        # savepoint, one upsert for all rows, one bulk UPDATE, stats SELECT + UPDATE, release
+        with self.assertNumQueries(6):
+            save_many_question_results(graded)
+
+        self.assertEqual(QuestionFeedback.objects.count(), 30)
+        for submission in self.submissions:
+            submission.refresh_from_db()
+            self.assertTrue(submission.graded)
+            self.assertEqual(submission.grade, 15.0)
+
+
+class AssignmentStatsTests(GradedAssignmentMixin, TestCase):
+
+    def stats(self):
+        return AssignmentStats.objects.get(assignment=self.assignment)
+
+    def assertMatchesRebuild(self):
+        stats = self.stats()
+        rebuilt = rebuild_assignment_stats(self.assignment)
+        for field in ('count', 'min_grade', 'max_grade', 'histogram'):
+            self.assertEqual(getattr(stats, field), getattr(rebuilt, field), field)
+        self.assertAlmostEqual(stats.total, rebuilt.total)
+        self.assertAlmostEqual(stats.total_squares, rebuilt.total_squares)
+
+    def test_grading_updates_running_stats(self):
+        for submission, score in zip(self.submissions, (1.0, 1.5, 2.0)):
+            save_question_results(submission, make_results(10, score=score))
+
+        stats = self.stats()
+        self.assertEqual(stats.count, 3)
+        self.assertAlmostEqual(stats.mean, 15.0)
+        self.assertEqual((stats.min_grade, stats.max_grade), (10.0, 20.0))
+        self.assertEqual(sum(stats.histogram), 3)
+        self.assertEqual(stats.histogram[2], 1)   # 15/60 falls in the 20–30% bucket
+        self.assertMatchesRebuild()
+
+    def test_regrading_an_extreme_recomputes_min_and_max(self):
+        for submission, score in zip(self.submissions, (1.0, 1.5, 2.0)):
+            save_question_results(submission, make_results(10, score=score))
+        save_question_results(self.submissions[2], make_results(10, score=0.5))
+
+        stats = self.stats()
+        self.assertEqual(stats.count, 3)
+        self.assertEqual((stats.min_grade, stats.max_grade), (5.0, 15.0))
+        self.assertMatchesRebuild()
+
+    def test_total_marks_change_rebuilds_buckets(self):
+        save_question_results(self.submissions[0], make_results(10, score=2.0))
+        Assignment.objects.filter(pk=self.assignment.pk).update(total_marks=20)
+        self.submissions[1].assignment.total_marks = 20
+        save_question_results(self.submissions[1], make_results(10, score=2.0))
+
+        stats = self.stats()
+        self.assertEqual(stats.max_marks, 20)
+        self.assertEqual(stats.histogram[-1], 2)
+
+
+class ViewSubmissionsTests(GradedAssignmentMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        User = get_user_model()
+        cls.submissions += [
+            StudentSubmission.objects.create(
+                assignment=cls.assignment,
+                student=User.objects.create(username=f"late{n}"),
+                submitted_file=f"late{n}.pdf",
+            )
+            for n in range(2)
+        ]
+        start = now()
+        for n, submission in enumerate(cls.submissions):
+            # Two submissions share a timestamp so the id tie-break is exercised.
+            submitted_at = start + timedelta(minutes=n // 2 * 2)
+            StudentSubmission.objects.filter(pk=submission.pk).update(submitted_at=submitted_at)
+        StudentSubmission.objects.filter(pk__in=[s.pk for s in cls.submissions[:2]]).update(graded=True, grade=40)
+
+    def setUp(self):
+        self.client.force_login(self.assignment.teacher)
+
+    def get_page(self, **params):
+        url = reverse("assignments:view_submissions", args=[self.assignment.pk])
+        return self.client.get(url, {"per_page": 2, **params})
+
+    def test_keyset_pages_cover_every_submission_once(self):
+        seen = []
+        response = self.get_page()
+        while True:
+            seen += [s.pk for s in response.context["submissions"]]
+            cursor = response.context["next_cursor"]
+            if not cursor:
+                break
+            response = self.get_page(after=cursor)
+        self.assertEqual(seen, [s.pk for s in self.submissions])
+
+        back = self.get_page(before=response.context["prev_cursor"])
+        self.assertEqual([s.pk for s in back.context["submissions"]], seen[2:4])
+
+    def test_page_is_seven_queries(self):
+        # session, user and student profile, assignment (+ stats), one page of
+        # submissions with their students, the near-duplicate clusters, the
+        # similar pairs
+        with self.assertNumQueries(7):
+            response = self.get_page()
+        self.assertContains(response, "Next")
+
+    def test_filters_run_in_sql(self):
+        response = self.get_page(status="ungraded", per_page=50)
+        self.assertEqual(len(response.context["submissions"]), 3)
+        response = self.get_page(min_score=30, per_page=50)
+        self.assertEqual({s.pk for s in response.context["submissions"]}, {s.pk for s in self.submissions[:2]})
+        response = self.get_page(max_score=30, per_page=50)
+        self.assertEqual(list(response.context["submissions"]), [])
+
+
+@override_settings(INGEST_IN_BACKGROUND=False)
+class IngestTests(GradedAssignmentMixin, TestCase):
+    solution = "assignments/solutions/Question_Answers_Teacher.pdf"
+    answers = "assignments/submissions/Question_Answers_Student.pdf"
+
+    def test_solution_rows_rebuild_the_parsed_bank(self):
+        self.assignment.question_solution_file = self.solution
+        bank = ingest_solution(self.assignment)
+
+        assignment = Assignment.objects.get(pk=self.assignment.pk)
+        self.assertEqual(assignment.parse_status, "parsed")
+        self.assertEqual(assignment.total_marks, bank_total_marks(bank))
+        self.assertTrue(ParsedQuestion.objects.filter(assignment=assignment).exists())
+        with self.assertNumQueries(1):
+            self.assertEqual(solution_bank(assignment), bank)
+        self.assertEqual(bank, load_question_bank(self.assignment.question_solution_file.path))
+
+    def test_upload_is_ingested_on_commit_and_graded_from_rows(self):
+        submission = self.submissions[0]
+        submission.submitted_file = self.answers
+        submission.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            schedule_submission_ingest(submission)
+
+        submission.refresh_from_db()
+        self.assertEqual(submission.parse_status, "parsed")
+        expected = load_question_bank(submission.submitted_file.path)
+        with self.assertNumQueries(1):
+            bank, = submission_banks([submission])
+        for qid, question in expected.items():
+            self.assertEqual(bank[qid]["answer"], question["answer"])
+            for sub_id, sub in question["subparts"].items():
+                self.assertEqual(bank[qid]["subparts"][sub_id]["answer"], sub["answer"])
+
+    def test_unreadable_upload_is_reported_not_graded(self):
+        submission = self.submissions[0]
+        submission.submitted_file = "assignments/submissions/missing.pdf"
+        submission.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            schedule_submission_ingest(submission)
+
+        submission.refresh_from_db()
+        self.assertEqual(submission.parse_status, "failed")
+        self.assertIn("Could not read the PDF", submission.parse_error)
+        self.assertEqual(submission_banks([submission]), [None])
+        self.assertFalse(StudentAnswer.objects.filter(submission=submission).exists())
+
+
+class LocalFastPathTests(TestCase):
+
+    def test_classifier(self):
+        cases = {
+            "B": "mcq", "(c)": "mcq", "d) Binary search": "mcq", "Option A": "mcq",
+            "9.81 m/s^2": "numeric", "42 ± 0.5": "numeric", "-3.5": "numeric",
+            "True": "boolean", "no": "boolean",
+            "stack, queue, deque": "keywords",
+            "e.g. a stack": "free", "A stack is a LIFO structure": "free",
+        }
+        for answer, expected in cases.items():
+            self.assertEqual(classify_answer(answer, 3), expected, answer)
+        self.assertEqual(classify_answer("O(n log n)", 1, is_objective=True), "exact")
+        self.assertEqual(classify_answer("O(n log n)", 1), "free")
+
+    def test_classifier_leaves_multi_mark_prose_to_the_model(self):
+        for answer in ("First, sort the array; then, binary search", "b) because the stack overflows"):
+            for marks in (2, 5):
+                self.assertEqual(classify_answer(answer, marks), "free", (answer, marks))
+        self.assertEqual(classify_answer("c) Binary search", 5), "free")
+        self.assertEqual(classify_answer("stack, queue, deque", 5), "free")
+        self.assertEqual(classify_answer("c) Search a sorted array by repeatedly halving it", 2), "free")
+
+    def test_local_grades(self):
+        self.assertEqual(grade_locally("d) Binary search", "(D)", 2)[0], 2)
+        self.assertEqual(grade_locally("d) Binary search", "binary search", 2)[0], 2)
+        self.assertEqual(grade_locally("9.81 m/s^2", "g = 9.8 m/s2", 2)[0], 2)
+        self.assertEqual(grade_locally("9.81 m/s^2", "9.81 km", 2)[0], 0)
+        self.assertEqual(grade_locally("42 ± 0.5", "about 43", 2)[0], 0)
+        self.assertIsNone(grade_locally("42", "42 (see step 3)", 2))
+        self.assertEqual(grade_locally("True", "T, because ...", 1)[0], 1)
+        self.assertEqual(grade_locally("stack, queue, deque", "a Stack or a queue", 3)[0], 2.0)
+        self.assertEqual(grade_locally("Anything at all", "  ", 5), (0.0, "No answer given."))
+        self.assertIsNone(grade_locally("A stack is a LIFO structure", "LIFO list", 5))
+
+    def test_engine_sends_only_free_form_answers_to_the_model(self):
+        teacher = {
+            "Q1": {"question": "", "marks": 2, "answer": "b", "subparts": {}},
+            "Q2": {"question": "", "marks": 2, "answer": "128 KB", "subparts": {}},
+            "Q3": {"question": "", "marks": 5, "answer": "Explain paging in detail", "subparts": {}},
+            "Q4": {"question": "", "marks": 5, "answer": "Explain segmentation", "subparts": {}},
+        }
+        student = {
+            "Q1": {"answer": "(b)", "subparts": {}},
+            "Q2": {"answer": "128 KB", "subparts": {}},
+            "Q3": {"answer": "Paging splits memory into pages", "subparts": {}},
+        }
+        stats = Counter()
+        (_, rows), = grade_submissions(teacher, [(None, student)], FakeModel(), stats=stats, use_cache=False)
+
+        self.assertEqual((stats["items"], stats["local_items"], stats["llm_calls"]), (4, 3, 1))
+        self.assertEqual(stats["local_blank"], 1)
+        self.assertEqual([row[2] for row in rows[:2]], [2, 2])
+        self.assertIn("3 = 75.0% graded locally", format_run_stats(stats))
+
+    @override_settings(GRADING_PRESCREEN=False)
+    def test_one_mark_main_questions_go_to_the_model(self):
+        teacher = {
+            "Q1": {"question": "", "marks": 1, "answer": "A stack is last in, first out", "subparts": {}},
+            "Q2": {"question": "", "marks": 2, "answer": "", "subparts": {
+                "i": {"question": "", "marks": 1, "answer": "LIFO"},
+            }},
+        }
+        student = {
+            "Q1": {"answer": "Stacks are LIFO", "subparts": {}},
+            "Q2": {"answer": "", "subparts": {"i": {"answer": "lifo"}}},
+        }
+        stats = Counter()
+        (_, rows), = grade_submissions(teacher, [(None, student)], FakeModel(), stats=stats, use_cache=False)
+
+        self.assertEqual((stats["local_exact"], stats["llm_calls"]), (1, 1))
+        self.assertEqual(rows[1][2], 1)
+
+    def test_prescreen_settles_only_the_extremes(self):
+        teacher = "A deadlock needs mutual exclusion, hold and wait, no preemption and circular wait"
+        answers = [
+            "A deadlock needs mutual exclusion, hold and wait, no preemption and circular wait.",
+            "The CPU scheduler picks the next process",
+            "",
+            "Deadlock happens with circular wait between processes",
+        ]
+        results = prescreen_answers(teacher, answers, 4)
+        self.assertEqual([r and r[0] for r in results], [4, 0.0, 0.0, None])
+
+        stats = Counter()
+        bank = {"Q1": {"question": "", "marks": 4, "answer": teacher, "subparts": {}}}
+        students = [(None, {"Q1": {"answer": answer, "subparts": {}}}) for answer in answers]
+        list(grade_submissions(bank, students, FakeModel(), stats=stats, use_cache=False))
+        self.assertEqual((stats["local_prescreen_full"], stats["local_prescreen_zero"]), (1, 1))
+        self.assertEqual(stats["llm_calls"], 1)
+
+
+class SingleSubmissionTests(GradedAssignmentMixin, TestCase):
+
+    def test_single_submissions_are_not_prescreened(self):
+        # A one-student TF-IDF corpus says nothing; the model grades it.
+        teacher = {"Q1": {"question": "", "marks": 4, "answer": "Paging maps pages to frames", "subparts": {}}}
+        submission = self.submissions[0]
+        StudentAnswer.objects.create(submission=submission, question_number="Q1", answer="Paging maps pages to frames")
+        StudentSubmission.objects.filter(pk=submission.pk).update(parse_status="parsed")
+        submission.refresh_from_db()
+
+        grade_single_submission(submission, model=CannedModel("3\nClose."), teacher_data=teacher)
+        submission.refresh_from_db()
+        self.assertEqual(submission.grade, 3)
+
+
+class AnswerClusteringTests(GradedAssignmentMixin, TestCase):
+    teacher_answer = "Merge sort splits the array in halves, sorts each half and merges them in linear time"
+
+    def test_reworded_copies_cluster_around_the_first_answer(self):
+        answers = [
+            "Merge sort splits the array into halves, sorts each half and merges them in linear time.",
+            "A hash table maps every key to a bucket with a hash function and resolves collisions by chaining",
+            "merge sort splits the array into halves; sorts each half, and merges them in linear time",
+            "",
+            "The hash table maps every key to a bucket with a hash function and resolves collisions by chaining.",
+        ]
+        self.assertEqual(cluster_texts(answers), [0, 1, 0, 3, 1])
+
+        # One inserted negation flips the meaning; long answers are never clustered.
+        answer = answers[0].rstrip(".") + ", so it needs extra memory for the merged output"
+        self.assertEqual(cluster_texts([answer, answer + " too"]), [0, 0])
+        self.assertEqual(cluster_texts([answer, answer.replace("needs extra", "needs no extra")]), [0, 1])
+        long_answer = " ".join([answer] * 2)
+        self.assertEqual(cluster_texts([long_answer, long_answer + " too"]), [0, 1])
+
+        # 2,000 answers: 100 distinct ones, each reworded 20 times.
+        bases = [" ".join(f"term{n}x{k}" for k in range(36)) for n in range(100)]
+        answers = [f"{base} copy{copy}" for copy in range(20) for base in bases]
+        labels = cluster_texts(answers)
+        self.assertEqual(len(set(labels)), 100)
+        self.assertTrue(all(labels[n] == n % 100 for n in range(len(answers))))
+
+    def test_one_model_call_per_cluster_and_clusters_are_listed(self):
+        answers = [
+            "Merge sort halves the array, sorts both halves recursively and merges them",
+            "Merge sort halves the array, sorts both halves recursively and merges them.",
+            "merge sort halves the array; sorts both halves recursively, and merges them",
+        ]
+        teacher = {"Q1": {"question": "", "marks": 5, "answer": self.teacher_answer, "subparts": {}}}
+        for submission, answer in zip(self.submissions, answers):
+            StudentAnswer.objects.create(submission=submission, question_number="Q1", answer=answer)
+        StudentSubmission.objects.update(parse_status="parsed")
+        submissions = list(StudentSubmission.objects.filter(assignment=self.assignment).order_by("id"))
+        ParsedQuestion.objects.create(assignment=self.assignment, question_number="Q1", marks=5,
+                                      answer=self.teacher_answer)
+        Assignment.objects.filter(pk=self.assignment.pk).update(parse_status="parsed")
+        self.assignment.refresh_from_db()
+
+        stats = grade_assignment_submissions(self.assignment, submissions, model=FakeModel(), use_cache=False)
+        self.assertEqual((stats["llm_calls"], stats["clustered_items"]), (1, 2))
+        self.assertEqual(stats["graded_submissions"], 3)
+        # Members reuse the representative's grade; that is not a cache hit.
+        self.assertEqual((stats["cache_hits"], stats["cache_misses"], stats["duplicate_items"]), (0, 1, 0))
+        grades = {s.grade for s in StudentSubmission.objects.filter(assignment=self.assignment)}
+        self.assertEqual(len(grades), 1)
+
+        url = reverse("assignments:view_submissions", args=[self.assignment.pk])
+        self.client.force_login(self.submissions[0].student)
+        self.assertEqual(self.client.get(url).context["clusters"], [])
+
+        self.client.force_login(self.assignment.teacher)
+        response = self.client.get(url)
+        (question, representative, members), = response.context["clusters"]
+        self.assertEqual((question, representative.username), ("Q1", "student0"))
+        self.assertEqual([m.username for m in members], ["student1", "student2"])
+        self.assertFalse(response.context["clusters_truncated"])
+
+        # The page lists a bounded number of grouped answers.
+        (_, _, members), = assignment_clusters(self.assignment, limit=1)
+        self.assertEqual([m.username for m in members], ["student1"])
+
+
+class SimilarityIndexTests(GradedAssignmentMixin, TestCase):
+    essay = ("A binary search tree keeps smaller keys in the left subtree and larger keys in the right "
+             "subtree so lookups take time proportional to the height of the tree")
+
+    def bank(self, *answers):
+        return {f"Q{n}": {"answer": answer, "subparts": {}} for n, answer in enumerate(answers, 1)}
+
+    def test_copies_are_paired_as_submissions_arrive(self):
+        first, second, third = self.submissions
+        index_submission(first, self.bank(self.essay, "Hashing maps keys to buckets"))
+        index_submission(second, self.bank("Heaps are complete trees where every parent beats its children", "no"))
+        pairs = index_submission(third, self.bank(self.essay.replace("of the tree", "of the trie"), "Hashing maps keys to buckets"))
+
+        self.assertEqual({(p.first_id, p.scope) for p in pairs}, {(first.pk, ""), (first.pk, "Q1")})
+        self.assertTrue(all(p.similarity >= 0.75 for p in pairs))
+
+        # Only the assignment's teacher sees the report; it names students.
+        url = reverse("assignments:view_submissions", args=[self.assignment.pk])
+        self.assertEqual(self.client.get(url).status_code, 302)
+        other_teacher = get_user_model().objects.create(username="other", user_type="teacher")
+        for user in (first.student, other_teacher):
+            self.client.force_login(user)
+            self.assertEqual(self.client.get(url).context["similar_pairs"], [])
+        self.client.force_login(self.assignment.teacher)
+        self.assertEqual(len(self.client.get(url).context["similar_pairs"]), 2)
+
+        # Re-indexing a submission replaces its signatures and pairs.
+        index_submission(third, self.bank("Something else entirely, written by the student on their own"))
+        self.assertFalse(SimilarityPair.objects.exists())
+        self.assertEqual(SimilaritySignature.objects.filter(submission=third).count(), 2)
+
+        self.assertEqual(self.client.get(url).context["similar_pairs"], [])
+
+    def test_resubmissions_are_not_paired_with_the_same_student(self):
+        first, second, _ = self.submissions
+        index_submission(first, self.bank(self.essay))
+        resubmission = StudentSubmission.objects.create(
+            assignment=self.assignment, student=first.student, submitted_file=first.submitted_file,
+        )
+        self.assertEqual(index_submission(resubmission, self.bank(self.essay)), [])
+
+        pairs = index_submission(second, self.bank(self.essay))
+        self.assertEqual({p.first_id for p in pairs}, {first.pk, resubmission.pk})
+
+
+class MetricsTests(GradedAssignmentMixin, TestCase):
+
+    def test_grading_phases_are_exported(self):
+        calls = MODEL_CALLS.value(kind="single", outcome="ok")
+        written = DB_WRITTEN.value(path="single")
+        score, _ = grade_answer("Paging maps pages to frames", "Pages go to frames", 5, FakeModel())
+        save_question_results(self.submissions[0], [("Q1", 5.0, score, "ok")])
+        self.assertEqual(MODEL_CALLS.value(kind="single", outcome="ok"), calls + 1)
+        self.assertEqual(DB_WRITTEN.value(path="single"), written + 1)
+
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response["Content-Type"], "text/plain; version=0.0.4; charset=utf-8")
+        body = response.content.decode()
+        self.assertIn('grading_model_call_seconds_bucket{kind="single",le="+Inf"}', body)
+        self.assertIn('grading_model_tokens_total{kind="single",direction="prompt"}', body)
+        self.assertIn("# TYPE grading_db_write_seconds histogram", body)
+        self.assertIn("# TYPE dashboard_cache_requests_total counter", body)
+
+    def test_metrics_are_not_public(self):
+        response = self.client.get(reverse("metrics"), REMOTE_ADDR="203.0.113.9")
+        self.assertEqual(response.status_code, 403)
+
+
+class ConcurrentClaimTests(TransactionTestCase):
+
+    def test_each_task_is_claimed_by_exactly_one_worker(self):
+        GradedAssignmentMixin.setUpTestData.__func__(self)
+        User = get_user_model()
+        StudentSubmission.objects.bulk_create(
+            StudentSubmission(assignment=self.assignment, student=User.objects.create(username=f"queued{n}"),
+                              submitted_file=f"queued{n}.pdf")
+            for n in range(57)
+        )
+        enqueue_grading_job(self.assignment)
+        claimed = {}
+
+        def work(name):
+            # claim_tasks also returns the worker's earlier, still running tasks.
+            mine = claimed.setdefault(name, [])
+            try:
+                while new := [task.pk for task in claim_tasks(name, limit=4) if task.pk not in mine]:
+                    mine.extend(new)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=work, args=(f"worker{n}",)) for n in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        ids = [pk for pks in claimed.values() for pk in pks]
+        self.assertEqual(len(ids), 60)
+        self.assertEqual(set(ids), set(GradingTask.objects.values_list("id", flat=True)))
+        self.assertGreater(sum(1 for pks in claimed.values() if pks), 1)
+        for name, pks in claimed.items():
+            self.assertEqual(GradingTask.objects.filter(pk__in=pks, worker=name, status="running").count(), len(pks))
+
+
+class SQLiteConcurrencyTests(TransactionTestCase):
+
+    def setUp(self):
+        # WAL is opt-in (SQLITE_WAL); the journal mode sticks to the test database file.
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode=WAL")
+
+    def test_readers_and_graders_run_together_without_lock_errors(self):
+        report = run_concurrency_stress(readers=3, graders=4, submissions=40, batch_size=8)
+
+        self.assertEqual(report["read_lock_errors"] + report["write_lock_errors"], 0)
+        self.assertEqual(report["other_errors"], 0)
+        self.assertGreater(report["reads"], 0)
+        self.assertEqual((report["writes"], report["graded"], report["stats_count"]), (40, 40, 40))
+        self.assertEqual(report["writer_stats"]["submissions"], 40)
+        self.assertEqual(report["database"]["journal_mode"], "wal")
@@ -1,23 +1,48 @@
-from assignments.models import StudentSubmission
-from assignments.grader import extract_text_from_pdf, parse_question_bank, grade_answer
-from langchain_google_genai.chat_models import ChatGoogleGenerativeAI
+from collections import Counter
+from contextlib import contextmanager
 
+from django.conf import settings
+from django.db import transaction
+from django.utils.timezone import now
 
-def grade_single_submission(submission: StudentSubmission):
+from accounts.dashboard_cache import bump_for_submissions
+from assignments.models import StudentSubmission, QuestionFeedback
+from assignments.answer_types import grade_locally
+from assignments.clustering import store_answer_clusters
+from assignments.db_writer import get_grade_writer
+from assignments.engine import grade_submissions
+from assignments.grade_stats import record_grade_changes
+from assignments.grader import grade_answer, get_grading_model
+from assignments.metrics import DB_WRITE_ERRORS, DB_WRITE_SECONDS, DB_WRITTEN
+from assignments.ingest import solution_bank, submission_bank, submission_banks
+
+
+def _grade_one(t_ans, s_ans, marks, model, is_objective=False):
+    # Checkable answer types and blank answers never reach the model. There is
+    # no TF-IDF prescreen here: its IDF needs the whole class's answers.
+    if settings.GRADING_LOCAL_FAST_PATH:
+        local = grade_locally(t_ans, s_ans, marks, is_objective=is_objective)
+        if local is not None:
+            return local
+    return grade_answer(t_ans, s_ans, marks, model, is_objective)
+
+
+def grade_single_submission(submission: StudentSubmission, model=None, teacher_data=None):
     """
     Grades one StudentSubmission object and updates it with total marks, feedback, and graded status.
+    Pass `model` and `teacher_data` when grading many submissions so they are built only once.
     """
 
-    # Extract teacher's solution from assignment
-    teacher_text = extract_text_from_pdf(submission.assignment.question_solution_file.path)
-    teacher_data = parse_question_bank(teacher_text)
-    
+    # Teacher's solution, from the rows stored when it was uploaded
+    if teacher_data is None:
+        teacher_data = solution_bank(submission.assignment)
+
     # Initialize your AI grading model (or whatever grading logic you have)
-    model = ChatGoogleGenerativeAI(model='models/gemini-2.0-flash-thinking-exp')
+    if model is None:
+        model = get_grading_model()
 
-    # Extract student's submitted answers
-    student_text = extract_text_from_pdf(submission.submitted_file.path)
-    student_data = parse_question_bank(student_text)
+    # Student's answers, likewise
+    student_data = submission_bank(submission)
 
     total_score = 0
     feedback_parts = []
@@ -32,18 +57,167 @@ def grade_single_submission(submission: StudentSubmission):
                 t_ans = sub_q['answer']
                 s_ans = s_data.get('subparts', {}).get(sub_id, {}).get('answer', '')
                 is_obj = sub_q['marks'] == 1
-                score, fb = grade_answer(t_ans, s_ans, sub_q['marks'], model, is_obj)
+                score, fb = _grade_one(t_ans, s_ans, sub_q['marks'], model, is_obj)
                 total_score += score
                 feedback_parts.append(f"Q{qid}({sub_id}): {fb}")
         else:
             t_ans = q_data['answer']
             s_ans = s_data.get('answer', '')
-            score, fb = grade_answer(t_ans, s_ans, q_data['marks'], model)
+            score, fb = _grade_one(t_ans, s_ans, q_data['marks'], model)
             total_score += score
             feedback_parts.append(f"Q{qid}: {fb}")
 
     # Save results in the submission object
+    previous = _previous_grade(submission)
     submission.grade = total_score
     submission.feedback = "\n\n".join(feedback_parts)
     submission.graded = True
-    submission.save()
+    with transaction.atomic():
+        submission.save()
+        record_grade_changes([(submission, previous)])
+
+
+def _feedback_rows(submission, per_question_results):
+    return [
+        QuestionFeedback(
+            submission      = submission,
+            question_number = qid,
+            max_marks       = q_max,
+            obtained_marks  = q_got,
+            feedback        = q_fb,
+        )
+        for qid, q_max, q_got, q_fb in per_question_results
+    ]
+
+
+def _upsert_feedback(rows):
+    QuestionFeedback.objects.bulk_create(
+        rows,
+        update_conflicts = True,
+        unique_fields    = ["submission", "question_number"],
+        update_fields    = ["max_marks", "obtained_marks", "feedback"],
+    )
+
+
+def _mark_graded(submission, per_question_results, stamp):
+    # Total comes from the results in hand instead of a SUM over the table.
+    submission.grade    = sum(q_got for _, _, q_got, _ in per_question_results)
+    submission.feedback = "Overall feedback auto-generated on " + stamp.strftime("%d %b %Y, %H:%M")
+    submission.graded   = True
+
+
+def _previous_grade(submission):
+    return submission.grade if submission.graded else None
+
+
+@contextmanager
+def _timed_write(path, submissions):
+    """Record the write phase metrics for a transaction of `submissions` graded submissions."""
+    try:
+        with DB_WRITE_SECONDS.time(path=path):
+            yield
+    except Exception:
+        DB_WRITE_ERRORS.inc(path=path)
+        raise
+    DB_WRITTEN.inc(submissions, path=path)
+
+
+def save_question_results(submission: StudentSubmission, per_question_results):
+    """
+    Write one graded submission in a single transaction: one upsert for
+    all its QuestionFeedback rows, one UPDATE for the summary fields and
+    total, and the assignment's stats update, however many questions there are.
+    """
+    previous = _previous_grade(submission)
+    _mark_graded(submission, per_question_results, now())
+    with _timed_write("single", 1):
+        with transaction.atomic():
+            _upsert_feedback(_feedback_rows(submission, per_question_results))
+            submission.save(update_fields=["graded", "feedback", "grade"])
+            record_grade_changes([(submission, previous)])
+
+
+def save_many_question_results(graded):
+    """
+    Like save_question_results for a list of (submission, per_question_results)
+    pairs, all in one transaction with a constant number of queries.
+    """
+    graded = list(graded)
+    if not graded:
+        return
+    stamp = now()
+    rows = []
+    changes = []
+    for submission, per_question_results in graded:
+        changes.append((submission, _previous_grade(submission)))
+        _mark_graded(submission, per_question_results, stamp)
+        rows += _feedback_rows(submission, per_question_results)
+
+    with _timed_write("batch", len(graded)):
+        with transaction.atomic():
+            _upsert_feedback(rows)
+            StudentSubmission.objects.bulk_update(
+                [submission for submission, _ in graded], ["graded", "feedback", "grade"]
+            )
+            record_grade_changes(changes)
+            # bulk_update sends no post_save, so invalidate the dashboards here.
+            bump_for_submissions(submission for submission, _ in graded)
+
+
+def grade_assignment_submissions(assignment, submissions, model=None, stats=None, teacher_data=None,
+                                 parse_workers=None, save_batch_size=1, **engine_options):
+    """
+    Grade `submissions` of one assignment with the grading engine and save
+    them as their results come in: through the shared GradeWriter when it is
+    enabled (which batches commits itself, so `save_batch_size` is unused),
+    otherwise `save_batch_size` submissions per transaction.
+    Answers come from the ingested StudentAnswer rows; PDFs not ingested yet
+    are parsed by `parse_workers` processes, and submissions whose PDF cannot
+    be read are skipped. Extra keyword arguments (mode, max_in_flight, batch_size, ...) are passed to
+    grade_submissions. Returns the run's stats Counter; stats['graded_submissions'] counts the
+    submissions actually graded.
+    """
+    if stats is None:
+        stats = Counter()
+
+    if teacher_data is None:
+        teacher_data = solution_bank(assignment)
+    submissions = list(submissions)
+    student_banks = [
+        (submission, bank)
+        for submission, bank in zip(submissions, submission_banks(submissions, parse_workers))
+        if bank is not None
+    ]
+    stats['unreadable_submissions'] += len(submissions) - len(student_banks)
+    if not student_banks:
+        return stats
+
+    if model is None:
+        model = get_grading_model()
+
+    writer = get_grade_writer()
+    pending = []
+    futures = []
+    clusters = {}
+    try:
+        for graded in grade_submissions(teacher_data, student_banks, model, stats=stats,
+                                        clusters=clusters, **engine_options):
+            stats['graded_submissions'] += 1
+            if writer is not None:
+                futures.append(writer.submit(*graded))
+                continue
+            pending.append(graded)
+            if len(pending) >= max(1, save_batch_size or 1):
+                batch, pending = pending, []
+                save_many_question_results(batch)
+        store_answer_clusters([submission.pk for submission, _ in student_banks], {
+            question: {member.pk: rep.pk for member, rep in members.items()}
+            for question, members in clusters.items()
+        })
+    finally:
+        # Keep what was graded even if the model became unavailable midway.
+        save_many_question_results(pending)
+        for future in futures:
+            future.result()
+
+    return stats
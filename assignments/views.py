@@ -1,12 +1,18 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
+from django.db.models import Q
 from .models import Assignment, StudentSubmission
 from .forms import AssignmentCreateForm, SubmissionForm, QuestionFeedbackFormSet
 from accounts.models import Classroom
-from assignments.grader import extract_text_from_pdf, parse_question_bank, grade_answer
+from assignments.clustering import assignment_clusters
+from assignments.grade_stats import record_grade_changes
+from assignments.ingest import schedule_solution_ingest, schedule_submission_ingest
+from assignments.pdf_cache import load_question_bank
 from accounts.views import calculate_total_marks   # ← your helper
 from django.http import HttpResponseForbidden
 import os
+from datetime import datetime
 
 @login_required
 def edit_submission_marks(request, submission_id):
@@ -21,8 +27,12 @@ def edit_submission_marks(request, submission_id):
     if request.method == "POST":
         formset = QuestionFeedbackFormSet(request.POST, queryset=queryset)
         if formset.is_valid():
-            formset.save()
-            submission.recompute_grade()
+            previous = submission.grade if submission.graded else None
+            with transaction.atomic():
+                formset.save()
+                submission.recompute_grade()
+                if submission.graded:
+                    record_grade_changes([(submission, previous)])
             return redirect('assignments:view_submissions', assignment_id=submission.assignment.id)
         else:
             print("Formset errors:", formset.errors)
@@ -43,11 +53,14 @@ def update_assignment(request, pk):
     if request.method == 'POST':
         form = AssignmentCreateForm(request.POST, request.FILES, instance=assignment)
         if form.is_valid():
-            form.save()
-            
+            assignment = form.save(commit=False)
+            if 'question_solution_file' in request.FILES:
+                # Re-parsed in the background; total_marks is set from it.
+                assignment.parse_status = 'pending'
+                assignment.parse_error = ''
+            assignment.save()
             if 'question_solution_file' in request.FILES:
-                assignment.total_marks = calculate_total_marks(assignment)
-                assignment.save()
+                schedule_solution_ingest(assignment)
             return redirect('classroom_detail', pk=assignment.classroom.pk)
     else:
         form = AssignmentCreateForm(instance=assignment)
@@ -71,10 +84,9 @@ def create_assignment(request, classroom_id):
             assignment.classroom = classroom             # from URL param
             assignment.save()                            # get PK first
 
-            # ── Calculate & store total marks (solution PDF required) ──
+            # ── Parse the solution PDF in the background; that also stores total marks ──
             if assignment.question_solution_file:
-                assignment.total_marks = calculate_total_marks(assignment)
-                assignment.save(update_fields=["total_marks"])
+                schedule_solution_ingest(assignment)
 
             return redirect("accounts:classroom_detail", pk=classroom.pk)
     else:
@@ -95,32 +107,138 @@ def submit_assignment(request, assignment_id):
             submission = form.save(commit=False)
             submission.student = request.user
             submission.assignment = assignment
-            submission.save()
-            print(submission.submitted_file.path)
+            with transaction.atomic():
+                # A resubmission replaces an upload that could not be read.
+                StudentSubmission.objects.filter(
+                    assignment=assignment, student=request.user, parse_status='failed',
+                ).delete()
+                submission.save()
+                schedule_submission_ingest(submission)
             return redirect('accounts:student_dashboard')  # or show a submission confirmation
     else:
         form = SubmissionForm()
     return render(request, 'submit_assignment.html', {'form': form, 'assignment': assignment})
 
-def view_submissions(request, assignment_id):
-    assignment = get_object_or_404(Assignment, id=assignment_id)
-    submissions = assignment.submissions.all()
+SUBMISSIONS_PAGE_SIZE = 50
+MAX_SUBMISSIONS_PAGE_SIZE = 200
+SIMILAR_PAIRS_SHOWN = 50
+CLUSTER_ANSWERS_SHOWN = 200
+
+
+def _encode_cursor(submission):
+    return f"{submission.submitted_at.isoformat()}_{submission.id}"
+
+
+def _decode_cursor(value):
+    try:
+        stamp, pk = value.rsplit('_', 1)
+        return datetime.fromisoformat(stamp), int(pk)
+    except (AttributeError, ValueError):
+        return None
+
+
+def _parse_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
 
-    total_marks = calculate_total_marks(assignment)
+def keyset_page(queryset, after=None, before=None, page_size=SUBMISSIONS_PAGE_SIZE):
+    """
+    One page of `queryset` in (submitted_at, id) order, starting after the
+    `after` cursor or ending before the `before` cursor. Unlike OFFSET the
+    cost does not grow with the page number. Returns (rows, has_prev, has_next).
+    """
+    cursor = _decode_cursor(before) if before else _decode_cursor(after) if after else None
+    if cursor is None:
+        rows = list(queryset.order_by('submitted_at', 'id')[:page_size + 1])
+        return rows[:page_size], False, len(rows) > page_size
+
+    stamp, pk = cursor
+    if before:
+        rows = list(
+            queryset.filter(Q(submitted_at__lt=stamp) | Q(submitted_at=stamp, id__lt=pk))
+            .order_by('-submitted_at', '-id')[:page_size + 1]
+        )
+        return rows[:page_size][::-1], len(rows) > page_size, True
+
+    rows = list(
+        queryset.filter(Q(submitted_at__gt=stamp) | Q(submitted_at=stamp, id__gt=pk))
+        .order_by('submitted_at', 'id')[:page_size + 1]
+    )
+    return rows[:page_size], True, len(rows) > page_size
+
+
+@login_required
+def view_submissions(request, assignment_id):
+    assignment = get_object_or_404(Assignment.objects.select_related('stats'), id=assignment_id)
+
+    # Parse the solution PDF only for assignments saved before total_marks was stored.
+    if not assignment.total_marks and assignment.question_solution_file:
+        assignment.total_marks = calculate_total_marks(assignment)
+        if assignment.total_marks:
+            assignment.save(update_fields=['total_marks'])
+    total_marks = assignment.total_marks
     is_student = hasattr(request.user, 'student_profile')
+    is_teacher = request.user.pk == assignment.teacher_id
+    stats = getattr(assignment, 'stats', None)
+
+    # ── Filters (all applied in SQL) ──
+    status = request.GET.get('status', '')
+    min_score = _parse_float(request.GET.get('min_score'))
+    max_score = _parse_float(request.GET.get('max_score'))
+
+    submissions = assignment.submissions.select_related('student')
+    if status == 'graded':
+        submissions = submissions.filter(graded=True)
+    elif status == 'ungraded':
+        submissions = submissions.filter(graded=False)
+    if min_score is not None:
+        submissions = submissions.filter(graded=True, grade__gte=min_score)
+    if max_score is not None:
+        submissions = submissions.filter(graded=True, grade__lte=max_score)
+
+    try:
+        page_size = min(max(int(request.GET.get('per_page', SUBMISSIONS_PAGE_SIZE)), 1), MAX_SUBMISSIONS_PAGE_SIZE)
+    except ValueError:
+        page_size = SUBMISSIONS_PAGE_SIZE
+    page, has_prev, has_next = keyset_page(
+        submissions, after=request.GET.get('after'), before=request.GET.get('before'), page_size=page_size,
+    )
+
+    # Query string for the pager links, minus the cursors.
+    filters = request.GET.copy()
+    for key in ('after', 'before'):
+        filters.pop(key, None)
+
+    # Answers graded together as near-duplicates, for the assignment's teacher only.
+    clusters = assignment_clusters(assignment, limit=CLUSTER_ANSWERS_SHOWN) if is_teacher else []
 
     return render(request, 'view_submissions.html', {
         'assignment': assignment,
-        'submissions': submissions,
+        'submissions': page,
         'total_marks': total_marks,
         'is_student': is_student,
+        'stats': stats,
+        'status': status,
+        'min_score': request.GET.get('min_score', ''),
+        'max_score': request.GET.get('max_score', ''),
+        'filter_query': filters.urlencode(),
+        'prev_cursor': _encode_cursor(page[0]) if has_prev and page else None,
+        'next_cursor': _encode_cursor(page[-1]) if has_next and page else None,
+        'clusters': clusters,
+        'clusters_truncated': sum(len(members) for _, _, members in clusters) >= CLUSTER_ANSWERS_SHOWN,
+        'cluster_answers_shown': CLUSTER_ANSWERS_SHOWN,
+        'similar_pairs': list(
+            assignment.similarity_pairs.select_related('first__student', 'second__student')[:SIMILAR_PAIRS_SHOWN]
+        ) if is_teacher else [],
     })
 
 def calculate_total_marks(assignment):
     solution_pdf_path = assignment.question_solution_file.path
     try:
-        text = extract_text_from_pdf(solution_pdf_path)
-        parsed = parse_question_bank(text)
+        parsed = load_question_bank(solution_pdf_path)
 
         total_marks = 0
         for qid, qdata in parsed.items():
@@ -83,10 +83,30 @@ WSGI_APPLICATION = 'autograder.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# SQLite concurrency: with SQLITE_WAL=1, every connection switches to WAL
+# journaling with synchronous=NORMAL, so dashboards keep reading while graders
+# write. It is off by default because switching rewrites the database file,
+# and db.sqlite3 is checked in; turn it on where graders and dashboards share
+# a deployed database. Writers take the lock when their transaction begins
+# (IMMEDIATE, Django 5.1+) and wait up to SQLITE_BUSY_TIMEOUT seconds for it
+# instead of failing with "database is locked". Tests use a file database so
+# threads share it.
+
+SQLITE_WAL = os.getenv("SQLITE_WAL", "0") == "1"
+SQLITE_BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", "20"))
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'timeout': SQLITE_BUSY_TIMEOUT,
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL' if SQLITE_WAL else '',
+        },
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
@@ -132,3 +152,140 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+
+
+# Grading engine
+# Maximum number of model calls the grading engine keeps in flight at once.
+# Set to 1 to fall back to the old one-call-at-a-time behaviour.
+
+GRADING_MAX_IN_FLIGHT = int(os.getenv("GRADING_MAX_IN_FLIGHT", "8"))
+
+# How uncached answers are sent to the model: "question" (one call per
+# question / sub-part), "submission" (one structured call per submission) or
+# "class" (one call per question for a batch of students).
+GRADING_MODE = os.getenv("GRADING_MODE", "question")
+
+# "class" mode: at most GRADING_BATCH_SIZE students per call, and fewer if the
+# estimated prompt would exceed GRADING_BATCH_TOKEN_BUDGET tokens.
+GRADING_BATCH_SIZE = int(os.getenv("GRADING_BATCH_SIZE", "10"))
+GRADING_BATCH_TOKEN_BUDGET = int(os.getenv("GRADING_BATCH_TOKEN_BUDGET", "6000"))
+
+# Local fast path (assignments/answer_types.py): MCQ, numeric, true/false,
+# keyword-list and 1-mark answers, and blank student answers, are graded
+# without the model. Numbers without an explicit "±" tolerance must match
+# within GRADING_NUMERIC_TOLERANCE (relative).
+
+GRADING_LOCAL_FAST_PATH = os.getenv("GRADING_LOCAL_FAST_PATH", "1") == "1"
+GRADING_NUMERIC_TOLERANCE = float(os.getenv("GRADING_NUMERIC_TOLERANCE", "0.01"))
+
+# TF-IDF prescreen (assignments/prescreen.py): free-form answers at least
+# PRESCREEN_FULL_SIMILARITY (cosine) similar to the teacher answer get full
+# marks, those at most PRESCREEN_ZERO_SIMILARITY get zero, without the model.
+
+GRADING_PRESCREEN = os.getenv("GRADING_PRESCREEN", "1") == "1"
+PRESCREEN_FULL_SIMILARITY = float(os.getenv("PRESCREEN_FULL_SIMILARITY", "0.95"))
+PRESCREEN_ZERO_SIMILARITY = float(os.getenv("PRESCREEN_ZERO_SIMILARITY", "0.05"))
+
+# Near-duplicate clustering (assignments/clustering.py): free-form answers to
+# a question whose estimated Jaccard similarity (character shingles) to a
+# cluster's first answer is at least CLUSTER_SIMILARITY share its grade.
+# Answers longer than CLUSTER_MAX_WORDS words are always graded on their own:
+# one inserted "not" hardly changes a long answer's shingles.
+
+GRADING_CLUSTERING = os.getenv("GRADING_CLUSTERING", "1") == "1"
+CLUSTER_SIMILARITY = float(os.getenv("CLUSTER_SIMILARITY", "0.9"))
+CLUSTER_MAX_WORDS = int(os.getenv("CLUSTER_MAX_WORDS", "40"))
+
+# Similarity index for copied submissions (assignments/plagiarism.py): pairs
+# of submissions, or of answers with at least PLAGIARISM_MIN_WORDS words,
+# estimated at least PLAGIARISM_SIMILARITY similar are reported.
+
+PLAGIARISM_INDEX = os.getenv("PLAGIARISM_INDEX", "1") == "1"
+PLAGIARISM_SIMILARITY = float(os.getenv("PLAGIARISM_SIMILARITY", "0.75"))
+PLAGIARISM_MIN_WORDS = int(os.getenv("PLAGIARISM_MIN_WORDS", "8"))
+
+
+# Parsed-PDF cache (assignments/pdf_cache.py)
+# Parsed question banks are keyed on the file's SHA-256 and kept both in
+# memory and as JSON files on disk, outside the publicly served MEDIA_ROOT.
+
+PDF_CACHE_DIR = BASE_DIR / 'cache' / 'pdf'
+PDF_CACHE_MAX_BYTES = int(os.getenv("PDF_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+PDF_CACHE_MEMORY_ENTRIES = int(os.getenv("PDF_CACHE_MEMORY_ENTRIES", "256"))
+
+
+# Grade cache (assignments/grade_cache.py)
+# Model verdicts for identical (teacher answer, student answer, marks) tuples
+# are reused for GRADE_CACHE_TTL_DAYS; the table is trimmed to
+# GRADE_CACHE_MAX_ENTRIES least-recently-used rows after each grading run.
+
+GRADE_CACHE_TTL_DAYS = int(os.getenv("GRADE_CACHE_TTL_DAYS", "30"))
+GRADE_CACHE_MAX_ENTRIES = int(os.getenv("GRADE_CACHE_MAX_ENTRIES", "100000"))
+
+
+# Model client limits (assignments/llm_client.py)
+# 0 disables a rate limit. Retryable errors (429 / 5xx / timeouts) are retried
+# with exponential backoff; after GRADING_BREAKER_THRESHOLD calls in a row
+# fail, grading pauses for GRADING_BREAKER_COOLDOWN seconds.
+
+GRADING_REQUESTS_PER_MINUTE = int(os.getenv("GRADING_REQUESTS_PER_MINUTE", "0"))
+GRADING_TOKENS_PER_MINUTE = int(os.getenv("GRADING_TOKENS_PER_MINUTE", "0"))
+GRADING_MAX_RETRIES = int(os.getenv("GRADING_MAX_RETRIES", "5"))
+GRADING_BACKOFF_BASE = float(os.getenv("GRADING_BACKOFF_BASE", "1.0"))
+GRADING_BACKOFF_MAX = float(os.getenv("GRADING_BACKOFF_MAX", "60"))
+GRADING_BREAKER_THRESHOLD = int(os.getenv("GRADING_BREAKER_THRESHOLD", "5"))
+GRADING_BREAKER_COOLDOWN = float(os.getenv("GRADING_BREAKER_COOLDOWN", "60"))
+
+
+# Grading backend (assignments/backends.py)
+# "gemini" for the real model; "fake" (in-process) or "http" (a server such as
+# `manage.py run_fake_llm_server` at GRADING_BACKEND_URL) for load testing.
+# FAKE_LLM_LATENCY is a spec like "0.2", "uniform:0.1,0.5" or "lognormal:-1.5,0.5".
+
+GRADING_BACKEND = os.getenv("GRADING_BACKEND", "gemini")
+GRADING_BACKEND_URL = os.getenv("GRADING_BACKEND_URL", "http://127.0.0.1:8765/")
+FAKE_LLM_LATENCY = os.getenv("FAKE_LLM_LATENCY", "0")
+FAKE_LLM_ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+FAKE_LLM_THROTTLE_RATE = float(os.getenv("FAKE_LLM_THROTTLE_RATE", "0"))
+FAKE_LLM_SEED = os.getenv("FAKE_LLM_SEED") or None
+
+
+# Grade writer (assignments/db_writer.py)
+# With GRADING_SERIAL_WRITER on, grading results from every thread of a
+# process are committed by one writer thread, up to GRADING_WRITER_BATCH
+# submissions per transaction.
+
+GRADING_SERIAL_WRITER = os.getenv("GRADING_SERIAL_WRITER", "1") == "1"
+GRADING_WRITER_BATCH = int(os.getenv("GRADING_WRITER_BATCH", "50"))
+
+
+# Upload ingestion (assignments/ingest.py)
+# Uploaded submission and solution PDFs are parsed into rows right after
+# upload, by INGEST_WORKERS background threads per web process (or inline
+# with INGEST_IN_BACKGROUND=0).
+
+INGEST_IN_BACKGROUND = os.getenv("INGEST_IN_BACKGROUND", "1") == "1"
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+
+
+# Dashboard cache (accounts/dashboard_cache.py)
+# Dashboard data is cached per user / classroom for up to DASHBOARD_CACHE_TTL
+# seconds (0 disables it) and invalidated by model signals. The default file
+# cache is shared by the web and grading worker processes; a locmem cache
+# only sees invalidations from its own process. It lives outside MEDIA_ROOT,
+# which is served as static files.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv("CACHE_BACKEND", 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv("CACHE_LOCATION", str(BASE_DIR / 'cache' / 'django')),
+    }
+}
+DASHBOARD_CACHE_TTL = int(os.getenv("DASHBOARD_CACHE_TTL", "300"))
+
+
+# Metrics (assignments/metrics.py)
+# /metrics serves this process's grading metrics in the Prometheus text format
+# to staff users and to requests from METRICS_ALLOWED_IPS (comma-separated).
+
+METRICS_ALLOWED_IPS = [ip.strip() for ip in os.getenv("METRICS_ALLOWED_IPS", "127.0.0.1,::1").split(",") if ip.strip()]
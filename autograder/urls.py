@@ -16,10 +16,11 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from .views import home
+from .views import home, metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics, name='metrics'),
     path('', include('accounts.urls')),
     path('assignments/', include('assignments.urls')),
     # path('', home, name='home'),  # Homepage
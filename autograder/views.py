@@ -1,4 +1,20 @@
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
 from django.shortcuts import render
 
 def home(request):
     return render(request, 'home.html')
+
+
+def metrics(request):
+    """Grading metrics of this process in the Prometheus text format, for scrapers and staff."""
+    # The instrumented modules register their metrics and collectors on import.
+    import accounts.dashboard_cache  # noqa: F401
+    import assignments.db_writer  # noqa: F401
+    import assignments.engine  # noqa: F401
+    import assignments.pdf_cache  # noqa: F401
+    from assignments.metrics import render as render_metrics
+
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS and not request.user.is_staff:
+        return HttpResponseForbidden("Metrics are only served to allowed addresses and staff.")
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')